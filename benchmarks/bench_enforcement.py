@@ -0,0 +1,100 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+"""benchmarks the overhead of type and shape enforcement against the number of
+items in a batch
+
+The legacy per-datum checking loop is reproduced here so it can be compared
+against the compiled validators used by `Block._check_batches`, with and
+without enforcement sampling.
+
+Example:
+    $ python benchmarks/bench_enforcement.py
+"""
+import logging
+import timeit
+
+import numpy as np
+import imagepypelines as ip
+from imagepypelines.core.Data import Data
+
+
+class Checked(ip.Block):
+    """a block with type and shape enforcement on its input"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+        self.enforce('a', types=(np.ndarray,int), shapes=((None,3), (3,3)))
+
+    def process(self, a):
+        return a
+
+
+def legacy_check(block, data_container, arg_name='a'):
+    """the per-datum checking loop that the compiled validators replaced"""
+    for datum in data_container:
+        arg_types = block.types.get(arg_name, None)
+        if not (arg_types is None):
+            if not isinstance(datum, arg_types):
+                raise ip.BlockError("invalid type")
+
+        arg_shapes = block.shapes.get(arg_name, None)
+        if not (arg_shapes is None):
+            shape_fn = block.shape_fns.get( type(datum), None )
+            if shape_fn is None:
+                continue
+            datum_shape = shape_fn(datum)
+            if datum_shape is None:
+                continue
+
+            ndim_okay = False
+            axes_okay = True
+            for arg_shape in arg_shapes:
+                if len(arg_shape) != len(datum_shape):
+                    continue
+                ndim_okay = True
+                for arg_ax,d_ax in zip(arg_shape,datum_shape):
+                    if arg_ax is None:
+                        continue
+                    axes_okay = (axes_okay and (arg_ax == d_ax))
+
+            if not (axes_okay and ndim_okay):
+                raise ip.BlockError("invalid shape")
+
+
+def main(n_items=(100, 1000, 10000, 100000), sample=16, repeat=5):
+    logging.disable(logging.INFO)
+    block = Checked()
+
+    datasets = {
+        'arrays' : lambda n: [np.ones((3,3)) for _ in range(n)],
+        'ints' : lambda n: list(range(n)),
+        }
+
+    header = "{:>8} | {:>8} | {:>12} | {:>14} | {:>8} | {:>13}"
+    print( header.format('data', 'items', 'legacy (ms)', 'compiled (ms)',
+                            'speedup', 'sampled (ms)') )
+    for name,make in datasets.items():
+        for n in n_items:
+            items = make(n)
+            data = Data(items)
+
+            legacy = timeit.timeit(lambda: legacy_check(block, items),
+                                    number=repeat) / repeat
+            compiled = timeit.timeit(lambda: block._check_batches(data),
+                                    number=repeat) / repeat
+            sampled = timeit.timeit(lambda: block._check_batches(data, sample=sample),
+                                    number=repeat) / repeat
+
+            print( header.format(name,
+                                    n,
+                                    round(legacy * 1e3, 3),
+                                    round(compiled * 1e3, 3),
+                                    round(legacy / compiled, 1),
+                                    round(sampled * 1e3, 3)) )
+
+
+if __name__ == "__main__":
+    main()
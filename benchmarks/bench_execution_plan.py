@@ -0,0 +1,65 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+"""benchmarks the per-call cost of fetching the Pipeline execution order
+
+The cached ExecutionPlan should cost the same no matter how large the graph
+is, whereas rebuilding a line graph scales with the number of edges.
+
+Example:
+    $ python benchmarks/bench_execution_plan.py
+"""
+import logging
+import timeit
+
+import networkx as nx
+import imagepypelines as ip
+
+
+class Passthrough(ip.Block):
+    """returns its input unchanged"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        return a
+
+
+def chain_pipeline(n_nodes):
+    """builds a pipeline that is a single chain of `n_nodes` blocks"""
+    tasks = {'v0' : ip.Input(0)}
+    block = Passthrough()
+    for i in range(1, n_nodes):
+        tasks['v%s' % i] = (block, 'v%s' % (i-1))
+    return ip.Pipeline(tasks, name='Chain%s' % n_nodes)
+
+
+def main(node_counts=(10, 30, 100, 300), repeat=200):
+    logging.disable(logging.INFO)
+
+    header = "{:>8} | {:>18} | {:>18} | {:>18}"
+    print( header.format('nodes', 'line graph (us)', 'cached plan (us)', 'process (us)') )
+    for n_nodes in node_counts:
+        pipeline = chain_pipeline(n_nodes)
+        # compile the plan up front so only the per-call lookup is measured
+        pipeline.execution_plan
+
+        rebuild = timeit.timeit(
+                    lambda: tuple(nx.topological_sort(nx.line_graph(pipeline.graph))),
+                    number=repeat) / repeat
+        cached = timeit.timeit(lambda: pipeline.execution_order,
+                                number=repeat) / repeat
+        process = timeit.timeit(lambda: pipeline.process([0]),
+                                number=repeat) / repeat
+
+        print( header.format(n_nodes,
+                            round(rebuild * 1e6, 2),
+                            round(cached * 1e6, 2),
+                            round(process * 1e6, 2)) )
+
+
+if __name__ == "__main__":
+    main()
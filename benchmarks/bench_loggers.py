@@ -0,0 +1,67 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+"""soak test for the logger registry, building and processing many short lived
+pipelines the way a service building a pipeline per request would
+
+The number of registered loggers and the traced memory should stay flat rather
+than growing with the number of pipelines built.
+
+Example:
+    $ python benchmarks/bench_loggers.py
+"""
+import gc
+import logging
+import time
+import tracemalloc
+
+import imagepypelines as ip
+
+
+class Double(ip.Block):
+    """doubles its input"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        return a * 2
+
+
+def build_and_process():
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (Double(), 'x'),
+            'z' : (Double(), 'y'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Soak')
+    pipeline.process([1])
+
+
+def main(n_pipelines=100000, report_every=10000):
+    logging.disable(logging.INFO)
+    manager = logging.Logger.manager
+
+    build_and_process()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    header = "{:>10} | {:>9} | {:>16} | {:>9}"
+    print( header.format('pipelines', 'loggers', 'memory delta (kB)', 'time (s)') )
+    start = time.perf_counter()
+    for i in range(1, n_pipelines + 1):
+        build_and_process()
+        if i % report_every == 0:
+            gc.collect()
+            current = tracemalloc.get_traced_memory()[0]
+            print( header.format(i,
+                                    len(manager.loggerDict),
+                                    round((current - baseline) / 1e3, 1),
+                                    round(time.perf_counter() - start, 1)) )
+
+
+if __name__ == "__main__":
+    main()
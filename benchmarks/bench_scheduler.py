@@ -0,0 +1,113 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+"""benchmarks the node scheduler on fan-in heavy graphs
+
+Every block in a lattice of `width` x `depth` blocks consumes two blocks from
+the previous layer. The legacy edge-walking engine is reproduced here so block
+invocations and runtimes can be compared against `Pipeline._compute`.
+
+Example:
+    $ python benchmarks/bench_scheduler.py
+"""
+import logging
+import timeit
+
+import numpy as np
+import imagepypelines as ip
+from imagepypelines.core.Data import Data
+
+
+class CountedAdd(ip.Block):
+    """adds two arrays and counts how many times it's run"""
+    n_calls = 0
+
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a, b):
+        CountedAdd.n_calls += 1
+        return a + b
+
+
+def lattice_pipeline(width, depth):
+    """builds a lattice where each block fans in from two upstream blocks"""
+    tasks = {'x' : ip.Input(0), 'y' : ip.Input(1)}
+    block = CountedAdd()
+    prev = ['x' if (j % 2) else 'y' for j in range(width)]
+    for i in range(depth):
+        layer = []
+        for j in range(width):
+            var = 'v%s_%s' % (i,j)
+            tasks[var] = (block, prev[j], prev[(j+1) % width])
+            layer.append(var)
+        prev = layer
+    return ip.Pipeline(tasks, name='Lattice%sx%s' % (width,depth))
+
+
+def legacy_compute(pipeline):
+    """the edge-walking engine that `Pipeline._compute` replaced"""
+    graph = pipeline.graph
+    for node_a, node_b, edge_idx in pipeline.execution_order:
+        block_a = graph.nodes[node_a]['block']
+        block_b = graph.nodes[node_b]['block']
+        edge = graph.edges[node_a, node_b, edge_idx]
+        if graph.in_degree(node_a) == 0:
+            edge['data'] = Data( block_a._pipeline_process(logger=pipeline.logger, force_skip=False)[0] )
+
+        in_edges = [e[2] for e in graph.in_edges(node_b, data=True)]
+        if all((e['data'] is not None) for e in in_edges):
+            arg_data_dict = {e['in_index'] : e['data'] for e in in_edges}
+            args = [arg_data_dict[k] for k in sorted( arg_data_dict.keys() )]
+            outputs = block_b._pipeline_process(*args,
+                                                logger=pipeline.logger,
+                                                force_skip=False)
+            for _,_,out_edge in graph.out_edges(node_b, data=True):
+                out_edge['data'] = Data( outputs[out_edge['out_index']] )
+
+
+def run_legacy(pipeline, x, y):
+    pipeline.clear()
+    pipeline._inputs['x'].load(x)
+    pipeline._inputs['y'].load(y)
+    legacy_compute(pipeline)
+    pipeline.clear()
+
+
+def main(shapes=((4,4), (8,8), (16,8), (16,16)), repeat=5):
+    logging.disable(logging.INFO)
+    x = np.ones((16,64,64))
+    y = np.ones((16,64,64))
+
+    header = "{:>10} | {:>7} | {:>14} | {:>14} | {:>12} | {:>12}"
+    print( header.format('lattice', 'blocks', 'legacy calls', 'node calls',
+                            'legacy (ms)', 'node (ms)') )
+    for width,depth in shapes:
+        pipeline = lattice_pipeline(width, depth)
+
+        CountedAdd.n_calls = 0
+        run_legacy(pipeline, x, y)
+        legacy_calls = CountedAdd.n_calls
+
+        CountedAdd.n_calls = 0
+        pipeline.process(x, y)
+        node_calls = CountedAdd.n_calls
+
+        legacy = timeit.timeit(lambda: run_legacy(pipeline, x, y),
+                                number=repeat) / repeat
+        node = timeit.timeit(lambda: pipeline.process(x, y),
+                                number=repeat) / repeat
+
+        print( header.format('%sx%s' % (width,depth),
+                                width * depth,
+                                legacy_calls,
+                                node_calls,
+                                round(legacy * 1e3, 2),
+                                round(node * 1e3, 2)) )
+
+
+if __name__ == "__main__":
+    main()
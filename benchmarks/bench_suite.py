@@ -0,0 +1,293 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+"""benchmark suite for the hot paths of the pipeline engine
+
+Covers graph construction (`Pipeline.__init__` and `Pipeline.update`),
+reachability queries (`get_predecessors` and `get_successors`), processing with "each" and "all" blocks, type and shape enforcement
+(`Block._check_batches`), serialization (`save`, `load` and `to_bytes` with
+and without encryption) and `Pipeline.deepcopy`. Data is synthetic and
+image-shaped.
+
+Results are printed and written to a JSON file. Pass the results of an earlier
+run with --compare to print how much slower or faster every benchmark is.
+
+Example:
+    $ python benchmarks/bench_suite.py --output before.json
+    $ python benchmarks/bench_suite.py --output after.json --compare before.json
+    $ # smaller sizes for a quick check
+    $ python benchmarks/bench_suite.py --quick
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import imagepypelines as ip
+from imagepypelines.core.Data import Data
+
+
+IMAGE_SHAPE = (256, 256, 3)
+"""shape of the synthetic images"""
+
+PASSWD = 'benchmark'
+"""password used for the encrypted serialization benchmarks"""
+
+
+################################################################################
+#                               blocks
+################################################################################
+class Passthrough(ip.Block):
+    """returns its input unchanged"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        return a
+
+
+class Brighten(ip.Block):
+    """adds a constant to every image, one image at a time"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+        self.enforce('img', types=(np.ndarray,), shapes=((None,None,3),))
+
+    def process(self, img):
+        return img + 1
+
+
+class BrightenAll(ip.Block):
+    """adds a constant to every image, all images at once"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+        self.enforce('imgs',
+                        types=(np.ndarray,),
+                        shapes=((None,None,3),),
+                        containers=(np.ndarray,))
+
+    def process(self, imgs):
+        return imgs + 1
+
+
+class Subtract(ip.Block):
+    """subtracts a stored background image, so the block has a payload to
+    serialize"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+        self.background = np.random.rand(*IMAGE_SHAPE)
+
+    def process(self, img):
+        return img - self.background
+
+
+################################################################################
+#                               graphs
+################################################################################
+def line_tasks(n_nodes):
+    """a chain of n_nodes passthrough blocks"""
+    tasks = {'x0' : ip.Input(0)}
+    for i in range(1, n_nodes):
+        tasks['x%s' % i] = (Passthrough(), 'x%s' % (i-1))
+    return tasks
+
+
+def image_pipeline(n_blocks=8):
+    """a chain of blocks which each store an image"""
+    tasks = {'x0' : ip.Input(0)}
+    for i in range(1, n_blocks + 1):
+        tasks['x%s' % i] = (Subtract(), 'x%s' % (i-1))
+    return ip.Pipeline(tasks, name='Images')
+
+
+def images(n_items):
+    """a stack of synthetic images"""
+    return np.random.rand(n_items, *IMAGE_SHAPE)
+
+
+################################################################################
+#                               benchmarks
+################################################################################
+def measure(fn, repeat, number=1, setup=None):
+    """times a function
+
+    Args:
+        fn(function): the function to time
+        repeat(int): number of times to repeat the measurement
+        number(int): number of calls per measurement
+        setup(function,None): called before every measurement, not timed
+
+    Returns:
+        dict: the 'mean' and 'min' seconds per call over the measurements
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        times.append( timeit.timeit(fn, number=number) / number )
+    return {'mean' : sum(times) / len(times), 'min' : min(times)}
+
+
+def bench_construction(sizes, repeat):
+    for n in sizes:
+        tasks = line_tasks(n)
+        yield ('construction', {'n_nodes' : n},
+                measure(lambda: ip.Pipeline(tasks, name='Line'), repeat))
+
+        # adding one block to an existing graph
+        pipeline = ip.Pipeline(tasks, name='Line')
+        state = {}
+        def setup():
+            state['pipeline'] = pipeline.copy()
+        def update():
+            state['pipeline'].update({'extra' : (Passthrough(), 'x%s' % (n-1))})
+        yield ('update', {'n_nodes' : n}, measure(update, repeat, setup=setup))
+
+        # queries on a freshly built index, then on the cached one
+        def query():
+            pipeline.get_predecessors('x%s' % (n-1))
+            pipeline.get_successors('x0')
+        yield ('reachability', {'n_nodes' : n, 'cached' : False},
+                measure(query, repeat, setup=pipeline._invalidate))
+        yield ('reachability', {'n_nodes' : n, 'cached' : True},
+                measure(query, repeat, number=10))
+
+
+def bench_process(item_counts, repeat):
+    each = ip.Pipeline({'x' : ip.Input(0), 'y' : (Brighten(), 'x')}, name='Each')
+    every = ip.Pipeline({'x' : ip.Input(0), 'y' : (BrightenAll(), 'x')}, name='All')
+    for n in item_counts:
+        data = images(n)
+        yield ('process', {'batch_type' : 'each', 'n_items' : n},
+                measure(lambda: each.process(data), repeat))
+        yield ('process', {'batch_type' : 'all', 'n_items' : n},
+                measure(lambda: every.process(data), repeat))
+
+
+def bench_enforcement(item_counts, repeat):
+    block = Brighten()
+    for n in item_counts:
+        data = Data( [np.empty(IMAGE_SHAPE)] * n )
+        yield ('check_batches', {'n_items' : n},
+                measure(lambda: block._check_batches(data), repeat, number=10))
+
+
+def bench_serialization(repeat):
+    pipeline = image_pipeline()
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'pipeline.pck')
+        for passwd in (None, PASSWD):
+            params = {'encrypted' : passwd is not None}
+            yield ('to_bytes', params,
+                    measure(lambda: pipeline.to_bytes(passwd), repeat))
+            yield ('save', params,
+                    measure(lambda: pipeline.save(filename, passwd), repeat))
+            yield ('load', params,
+                    measure(lambda: ip.Pipeline.load(filename, passwd), repeat))
+            if passwd:
+                # every key derivation is paid for again
+                yield ('load', dict(params, cached_key=False),
+                        measure(lambda: ip.Pipeline.load(filename, passwd),
+                                repeat,
+                                setup=ip.clear_passgen_cache))
+
+
+def bench_deepcopy(repeat):
+    pipeline = image_pipeline()
+    yield ('deepcopy', {'n_blocks' : 8}, measure(pipeline.deepcopy, repeat))
+
+
+################################################################################
+def run(quick=False, repeat=5):
+    """runs every benchmark
+
+    Args:
+        quick(bool): whether or not to use smaller sizes
+        repeat(int): number of measurements for every benchmark
+
+    Returns:
+        :obj:`list` of dict: the results of every benchmark
+    """
+    if quick:
+        sizes, item_counts = (10, 100), (1, 10)
+    else:
+        sizes, item_counts = (10, 100, 1000, 10000), (1, 10, 100)
+
+    benchmarks = [bench_construction(sizes, repeat),
+                    bench_process(item_counts, repeat),
+                    bench_enforcement(item_counts, repeat),
+                    bench_serialization(repeat),
+                    bench_deepcopy(repeat)]
+
+    results = []
+    for benchmark in benchmarks:
+        for name,params,times in benchmark:
+            results.append({'name' : name, 'params' : params,
+                            'mean' : times['mean'], 'min' : times['min']})
+            print_result(results[-1])
+    return results
+
+
+def result_key(result):
+    """key to match results between runs"""
+    return (result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def print_result(result, baseline=None):
+    params = ', '.join('{}={}'.format(k,v) for k,v in result['params'].items())
+    line = "{:>14} | {:<30} | {:>12} ms".format(result['name'],
+                                                params,
+                                                round(result['min'] * 1e3, 3))
+    if baseline is not None:
+        line += " | {:>6}x baseline".format(round(result['min'] / baseline['min'], 2))
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='file to write the JSON results to')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of an earlier run to compare against')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measurements for every benchmark')
+    parser.add_argument('--quick', action='store_true',
+                        help='use smaller graphs and fewer items')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = run(args.quick, args.repeat)
+
+    output = {
+            'meta' : {
+                'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'imagepypelines' : ip.__version__,
+                'python' : platform.python_version(),
+                'numpy' : np.__version__,
+                'platform' : platform.platform(),
+                'quick' : args.quick,
+                'repeat' : args.repeat,
+                },
+            'results' : results,
+            }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print("results written to '{}'".format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result_key(r) : r for r in json.load(f)['results']}
+        print("\ncompared to '{}' (fastest run)".format(args.compare))
+        for result in results:
+            print_result(result, baseline.get(result_key(result), None))
+
+
+if __name__ == "__main__":
+    main()
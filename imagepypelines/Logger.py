@@ -6,8 +6,13 @@
 # Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
 #
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from termcolor import colored
+import atexit
+import queue
 import sys
+import threading
+import weakref
 
 # --------- enable terminal colors if we are in on a windows system ---------
 import os
@@ -43,10 +48,74 @@ ENABLE_LOG_COLOR = True
 color codes, True by default"""
 
 
+LOG_FORMAT = '%(asctime)s | %(name)s [ %(levelname)8s ]: %(message)s'
+"""Module variable controlling the format of our log records"""
+
 MASTER_LOGGER = None
 """logging.Logger subclass that is the root of all loggers instantiated in
 ImagePypelines"""
 
+_CONFIG_LOCK = threading.Lock()
+_TRACKED_LOCK = threading.Lock()
+_TRACKED = {}
+"""number of living owners tracking each logger name, see track_logger"""
+_LOG_QUEUE = None
+_QUEUE_HANDLER = None
+_QUEUE_LISTENER = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+    def prepare(self, record):
+        # records only travel through an in-process queue, so they don't have
+        # to be formatted or made picklable by the processing threads
+        return record
+
+
+def _reaches_handler(logger):
+    """checks if records from the given logger propagate to one of the handlers
+    we've added. handlers that users add to the root logger are ignored"""
+    while logger:
+        for handler in logger.handlers:
+            if getattr(handler, '_imagepypelines', False):
+                return True
+        if not logger.propagate:
+            break
+        logger = logger.parent
+    return False
+
+
+def _configure(logger):
+    """adds a handler to the logger the first time we see it, returns it"""
+    if not getattr(logger, '_configured', False):
+        with _CONFIG_LOCK:
+            if not getattr(logger, '_configured', False):
+                # only add a handler if the logger's records won't reach one
+                # otherwise, or else every line is written twice
+                if not _reaches_handler(logger):
+                    logger.addHandler( _make_handler() )
+                logger._configured = True
+    return logger
+
+
+def _get_configured(name):
+    """fetches or creates the named logger and configures it, used when
+    unpickling loggers that may have been released since they were pickled"""
+    return _configure( logging.getLogger(name) )
+
+
+def _make_handler():
+    """creates the handler for a newly configured logger. this is the shared
+    queue handler if queued logging is enabled, otherwise a new StreamHandler
+    """
+    if _QUEUE_HANDLER is not None:
+        return _QUEUE_HANDLER
+
+    handler = logging.StreamHandler()
+    handler.setFormatter( logging.Formatter(LOG_FORMAT) )
+    handler._imagepypelines = True
+    return handler
+
 # Define our new special Logger class that can be pickled
 # (like the loggers of python 3.7)
 class ImagepypelinesLogger( logging.getLoggerClass() ):
@@ -81,21 +150,15 @@ class ImagepypelinesLogger( logging.getLoggerClass() ):
         return super().critical(msg, *args, **kwargs)
 
     def getChild(self,*args,**kwargs):
-        # make a formatter for the child logger
-        ch = logging.StreamHandler()
-        formatter = logging.Formatter(
-                            '%(asctime)s | %(name)s [ %(levelname)8s ]: %(message)s')
-        ch.setFormatter(formatter)
-
-        child = super().getChild(*args,**kwargs)
-        child.addHandler(ch)
-        return child
+        # the manager caches loggers by name, so the same child is returned
+        # every time. It's only configured the first time we see it
+        return _configure( super().getChild(*args,**kwargs) )
 
     # JEFF: modified from here https://github.com/python/cpython/blob/ca7b504a4d4c3a5fde1ee4607b9501c2bab6e743/Lib/logging/__init__.py
     def __reduce__(self):
         if self.name == 'ImagePypelines':
             return make_master, (self.level,)
-        return logging.getLogger, (self.name,)
+        return _get_configured, (self.name,)
 
 
 def make_master(level=logging.DEBUG):
@@ -105,13 +168,9 @@ def make_master(level=logging.DEBUG):
         return MASTER_LOGGER
 
     # create our ImagePypelines master logger
-    ch = logging.StreamHandler()
-    formatter = logging.Formatter(
-                        '%(asctime)s | %(name)s [ %(levelname)8s ]: %(message)s')
-    ch.setFormatter(formatter)
-
     master = ImagepypelinesLogger('ImagePypelines')
-    master.addHandler(ch)
+    master.addHandler( _make_handler() )
+    master._configured = True
     master.setLevel(level)
 
     # set our subclass as the root of all child loggers
@@ -139,5 +198,128 @@ def get_logger(name, log_level=logging.INFO):
     return child
 
 
+def track_logger(owner, logger):
+    """releases the logger from python's logging registry once its owner is
+    garbage collected.
+
+    python's logging.Manager never frees a logger, and every Block and Pipeline
+    has a logger with a unique name. Without this, a process that builds many
+    blocks would accumulate loggers forever. Copies of an owner can share its
+    logger, so a logger is only released once every owner tracking it is gone
+
+    Args:
+        owner(object): the Block or Pipeline using this logger
+        logger(logging.Logger): the logger to release along with the owner
+
+    Returns:
+        logging.Logger: the logger passed in
+    """
+    names = owner.__dict__.get('_logger_names', None)
+    if names is None:
+        names = owner.__dict__['_logger_names'] = set()
+        # the finalizer only references the set of names, not the owner
+        weakref.finalize(owner, release_loggers, names)
+    if logger.name not in names:
+        names.add(logger.name)
+        with _TRACKED_LOCK:
+            _TRACKED[logger.name] = _TRACKED.get(logger.name, 0) + 1
+    return logger
+
+
+def release_loggers(names):
+    """removes the named loggers from python's logging registry so they can
+    be garbage collected, unless another owner is still tracking them. Anything
+    still holding one of them can keep using it
+
+    Args:
+        names(iterable of str): the full names of the loggers to release
+    """
+    released = []
+    with _TRACKED_LOCK:
+        for name in list(names):
+            n_owners = _TRACKED.pop(name, 0) - 1
+            if n_owners > 0:
+                _TRACKED[name] = n_owners
+            else:
+                released.append(name)
+
+    manager = logging.Logger.manager
+    with logging._lock:
+        for name in released:
+            logger = manager.loggerDict.get(name, None)
+            # placeholders are left alone, they hold loggers still in use
+            if not isinstance(logger, logging.Logger):
+                continue
+            del manager.loggerDict[name]
+
+            # placeholders standing in for missing ancestors also reference
+            # the logger, up until the first real logger
+            parent_name = name.rpartition('.')[0]
+            while parent_name:
+                parent = manager.loggerDict.get(parent_name, None)
+                if not isinstance(parent, logging.PlaceHolder):
+                    break
+                parent.loggerMap.pop(logger, None)
+                if not parent.loggerMap:
+                    del manager.loggerDict[parent_name]
+                parent_name = parent_name.rpartition('.')[0]
+
+
+def _swap_handlers():
+    """replaces the handlers we've added to our loggers with new ones, used
+    when switching queued logging on or off"""
+    loggers = [MASTER_LOGGER] + list(logging.Logger.manager.loggerDict.values())
+    for logger in loggers:
+        if not isinstance(logger, ImagepypelinesLogger):
+            continue
+        for handler in list(logger.handlers):
+            if getattr(handler, '_imagepypelines', False):
+                logger.removeHandler(handler)
+                logger.addHandler( _make_handler() )
+
+
+def enable_log_queue():
+    """routes all ImagePypelines log records through a queue, so formatting and
+    terminal I/O happen on a background listener thread instead of the threads
+    processing data
+
+    Returns:
+        logging.handlers.QueueListener: the listener writing the records
+    """
+    global _LOG_QUEUE, _QUEUE_HANDLER, _QUEUE_LISTENER
+    with _CONFIG_LOCK:
+        if _QUEUE_LISTENER is None:
+            # SimpleQueue is cheaper, but requires python 3.7+
+            _LOG_QUEUE = getattr(queue, 'SimpleQueue', queue.Queue)()
+            _QUEUE_HANDLER = _DeferredQueueHandler(_LOG_QUEUE)
+            _QUEUE_HANDLER._imagepypelines = True
+
+            stream = logging.StreamHandler()
+            stream.setFormatter( logging.Formatter(LOG_FORMAT) )
+            _QUEUE_LISTENER = QueueListener(_LOG_QUEUE, stream,
+                                                respect_handler_level=True)
+            _QUEUE_LISTENER.start()
+            _swap_handlers()
+
+    return _QUEUE_LISTENER
+
+
+def disable_log_queue():
+    """writes any queued log records and returns to logging directly from the
+    calling threads"""
+    global _LOG_QUEUE, _QUEUE_HANDLER, _QUEUE_LISTENER
+    with _CONFIG_LOCK:
+        if _QUEUE_LISTENER is not None:
+            # stop() blocks until every queued record has been written
+            _QUEUE_LISTENER.stop()
+            _LOG_QUEUE = None
+            _QUEUE_HANDLER = None
+            _QUEUE_LISTENER = None
+            _swap_handlers()
+
+# don't lose queued records at interpreter exit
+atexit.register(disable_log_queue)
+
+
 
 # END
@@ -20,6 +20,7 @@ session_uuid = uuid4().hex
 # ----------- Setup the Root ImagePypelines Logger ---------------
 # import the master logger
 from .Logger import MASTER_LOGGER, get_logger, ImagepypelinesLogger
+from .Logger import enable_log_queue, disable_log_queue
 # import master logger convienence function
 # NOTE: import logging constants our users can modify to change color behavior
 
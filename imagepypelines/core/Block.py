@@ -4,19 +4,31 @@
 # @github: https://github.com/jmaggio14/imagepypelines
 #
 # Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
-from ..Logger import get_logger
+from ..Logger import get_logger, track_logger
 from ..Logger import ImagepypelinesLogger
 from .constants import NUMPY_TYPES, UUID_ORDER
 from .Exceptions import BlockError
 from .arg_checking import DEFAULT_SHAPE_FUNCS, HOMOGENUS_CONTAINERS
+from .arg_checking import numpy_shape, SAMPLED_CONTAINERS
+from .caching import BlockCache, DEFAULT_CACHE_BYTES, new_hash, update_hash
+from .caching import update_code_hash, Unhashable
+from .util import run_coroutine
 
 from uuid import uuid4
 from abc import ABCMeta, abstractmethod
+import asyncio
 from itertools import chain
 import inspect
 import copy
+import time
+import random
 import numpy as np
 
+MAX_CACHED_SHAPES = 1024
+"""maximum number of datum shapes whose validity is cached by each compiled
+validator"""
+
+
 class Block(metaclass=ABCMeta):
     """a contained algorithmic element used to construct pipelines. This class
     is designed to be inherited from, or used in the form of one of its child
@@ -31,7 +43,8 @@ class Block(metaclass=ABCMeta):
         name(str): user specified name for this pipeline, used to generate
             the unique id. defaults to the name of your subclass
         batch_type(str, int): the size of the batch fed into your process
-            function. Will be an integer, "all", or "each"
+            function. Will be an integer, "all", or "each". An integer means
+            the data is split into consecutive batches of that many items
         logger(:obj:`ImagepypelinesLogger`): Logger object for this block. When
             run in a pipeline this logger is temporaily replaced with a child of
             the Pipeline's logger
@@ -40,6 +53,10 @@ class Block(metaclass=ABCMeta):
             arguments for this block's process function. Only defined if the
             property `block.args` is accessed.
         skip_enforcement(bool): whether or not to enforce type and shape checking
+        enforcement_sample(int,None): if set, only this many items at the
+            start of large list or tuple batches and as many randomly chosen
+            items are type and shape checked. If None, then the Pipeline's
+            `enforcement_sample` is used. 0 checks every item
         types(:obj:`dict`): Dictionary of input types. If arg doesn't exist
             as a key, or if the value is None, then no checking is done
         shapes(:obj:`dict`): Dictionary of input shapes. If arg doesn't exist
@@ -49,9 +66,56 @@ class Block(metaclass=ABCMeta):
             *if batch_type is "each", then the container is irrelevant and can
             be safely ignored!*
         shape_fns(:obj:`dict`): Dictionary of shape functions to retrieve. If
-            type(arg_datum) doesn't exist as a key, or if the value is None,
-            then no checking is done.
+            type(arg_datum) or one of its base classes doesn't exist as a key,
+            or if the value is None, then no checking is done.
+        _enforcement_version(int): incremented whenever the validators are
+            compiled, used by Pipelines to detect enforcement changes
+        _validators(:obj:`tuple` of :obj:`function`,None): compiled type,
+            shape and container checks for every argument. None if they haven't
+            been compiled since the enforcement settings last changed. Changes
+            made directly to `types`, `shapes`, `containers` or `shape_fns`
+            after the block is added to a Pipeline must be followed by a call to
+            `enforce` or `_compile_validators`
+        cache(:obj:`BlockCache`,None): cache of previously computed outputs,
+            None if caching isn't enabled. see `Block.enable_cache`
+        _fingerprint(bytes,Unhashable,None): cached digest of the block's
+            class, code and parameters, used for cache and checkpoint keys.
+            The error if the parameters can't be hashed, or None if it must be
+            recomputed
+
+    Note:
+        Every instance attribute that isn't listed in `_RUNTIME_ATTRS` is
+        treated as a parameter and included in the block's fingerprint. Its
+        digest is computed once, and recomputed when a parameter is assigned
+        outside of processing. Attributes assigned while the block is
+        processing (e.g. counters) don't change the fingerprint of that
+        instance, but subclasses must still add them to `_RUNTIME_ATTRS` so
+        that new instances match saved checkpoints. Parameters modified in
+        place (e.g. `self.lut[0] = 1`) must be reassigned for the change to
+        be detected
     """
+    _RUNTIME_ATTRS = frozenset(['uuid',
+                                'name',
+                                'logger',
+                                'tags',
+                                'cache',
+                                'skip_enforcement',
+                                'enforcement_sample',
+                                'types',
+                                'shapes',
+                                'containers',
+                                'shape_fns',
+                                '_arg_spec',
+                                '_enforcement_version',
+                                '_validators',
+                                '_sampling_logged',
+                                '_logger_names',
+                                '_fingerprint',
+                                '_processing'])
+    """attributes which don't affect the outputs of the block, so they're
+    left out of its fingerprint. Subclasses which keep runtime state, such as
+    counters updated in `process`, should add those attribute names"""
+
     def __init__(self,
                     name=None,
                     batch_type="all",
@@ -64,10 +128,14 @@ class Block(metaclass=ABCMeta):
             name(str,None): the name of this block - how it will show up in the
                 graph.
             batch_type(str, int): the type of the batch processing for your
-                process function. Either "all" or "each". "all" means that all
-                argument data will be passed into to your function at once,
-                "each" means that each argument datum will be passed in
-                individually
+                process function. Either "all", "each" or an integer. "all"
+                means that all argument data will be passed into to your
+                function at once, "each" means that each argument datum will be
+                passed in individually, and an integer means that consecutive
+                batches of that many items will be passed in. The outputs of
+                every batch are concatenated back together. If "each" is used
+                with numpy array inputs, then array outputs are stacked into a
+                single array
             types(:obj:`dict`,None): Dictionary of input types. If arg doesn't
                 exist as a key, or if the value is None, then no checking is
                 done. If not provided, then will default to args as keys, None
@@ -84,6 +152,8 @@ class Block(metaclass=ABCMeta):
                 be safely ignored!*
         """
         assert (batch_type in ["all","each"] or isinstance(batch_type,int))
+        if isinstance(batch_type, int) and (batch_type < 1):
+            raise BlockError("integer batch_type must be positive")
 
         # setup absolutely unique id for this block
         self.uuid = uuid4().hex
@@ -95,7 +165,7 @@ class Block(metaclass=ABCMeta):
         self.batch_type = batch_type
 
         # this will be defined in _pipeline_pair
-        self.logger = get_logger( self.id )
+        self.logger = track_logger(self, get_logger( self.id ))
 
         # setup initial tags
         self.tags = set()
@@ -103,9 +173,16 @@ class Block(metaclass=ABCMeta):
         # FullArgSpec for this block, defined in self.args
         self._arg_spec = None
 
+        # output caching is opt-in, see enable_cache
+        self.cache = None
+        # parameters assigned while this is set don't reset the fingerprint
+        self._processing = False
+
         # TYPE AND SHAPE CHECKING VARS
         # ----------------------------------------------------------------------
         self.skip_enforcement = False
+        self.enforcement_sample = None
+        self._sampling_logged = False
 
         # types
         if types is None:
@@ -133,6 +210,11 @@ class Block(metaclass=ABCMeta):
 
         self.shape_fns = DEFAULT_SHAPE_FUNCS.copy()
 
+        # compiled the first time enforcement is run
+        self._validators = None
+        # incremented every time the enforcement settings are compiled
+        self._enforcement_version = 0
+
         super(Block,self).__init__() # for metaclass?
 
 
@@ -141,6 +223,8 @@ class Block(metaclass=ABCMeta):
     ############################################################################
     @abstractmethod
     def process(self, *data_batches):
+        """processes a batch of data. This may be defined as a coroutine
+        (`async def`) for I/O bound blocks"""
         pass
 
     ############################################################################
@@ -256,169 +340,519 @@ class Block(metaclass=ABCMeta):
         self.shapes[arg] = shapes
         self.containers[arg] = containers
 
+        self._compile_validators()
+        return self
+
+    ############################################################################
+    def enable_cache(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """caches the outputs of this block in memory, so that data it has
+        already processed isn't processed again.
+
+        Outputs are cached under a hash of the input data's content and of the
+        block itself (its class, batch_type and process function). Entries are
+        evicted based on their size and how long they took to compute once the
+        cache is full, see :obj:`BlockCache`.
+
+        Warning:
+            Only use caching for blocks whose outputs depend solely on their
+            inputs. Cached outputs aren't copied, so downstream blocks must not
+            modify them in place. Worker processes of the "processes" executor
+            keep their own separate caches
+
+        Args:
+            max_bytes(int): maximum total size of the cached outputs. defaults
+                to 256MB
+
+        Returns:
+            :obj:`Block`: this block
+        """
+        self.cache = BlockCache(max_bytes)
+        return self
+
+    ############################################################################
+    def disable_cache(self):
+        """stops caching the outputs of this block and drops the cache
+
+        Returns:
+            :obj:`Block`: this block
+        """
+        self.cache = None
         return self
 
     ############################################################################
     #                 called internally or by Pipeline
     ############################################################################
-    def _pipeline_process(self, *data, logger, force_skip):
+    def _pipeline_process(self, *data, logger, force_skip, sample=None, stats=None):
         """batches and processes data through the block's process function. This
         function is called by Pipeline, and not intended to be called by the
         user.
 
+        Coroutine blocks (where `process` is defined with `async def`) are run
+        to completion in a new event loop. Use `Pipeline.aprocess` to run them
+        inside of an existing event loop instead.
+
+        Args:
+            *data: Variable length list of data
+            logger(:obj:`ImagepypelinesLogger`): parent pipeline logger, which
+                will be used to create a new child block logger
+            force_skip(bool): whether or not to check batch types and shapes
+            sample(int,None): the pipeline's enforcement sample size, see
+                `Block.enforcement_sample`. defaults to None
+            stats(dict,None): if provided, the seconds spent checking types
+                and shapes are added to its 'enforcement' key. defaults to None
+
+        Returns:
+            (tuple): variable length tuple containing processed data
+        """
+        if self.is_coroutine:
+            return run_coroutine( self._apipeline_process(*data,
+                                                            logger=logger,
+                                                            force_skip=force_skip,
+                                                            sample=sample,
+                                                            stats=stats) )
+
+        key, outputs = self._cache_lookup(data, logger)
+        if outputs is not None:
+            return outputs
+
+        start = time.perf_counter()
+        self._processing = True
+        try:
+            self._prepare(data, logger, force_skip, sample, stats)
+            outs = (self._make_tuple( self.process(*batch) ) for batch in self._batches(data))
+            outputs = self._collect(outs, data)
+        finally:
+            self._processing = False
+
+        if key is not None:
+            self.cache.put(key, outputs, time.perf_counter() - start)
+        return outputs
+
+    ############################################################################
+    async def _apipeline_process(self, *data, logger, force_skip, sample=None, stats=None):
+        """coroutine version of `_pipeline_process` for blocks whose `process`
+        function is a coroutine. If the batch_type is "each", then every datum
+        is processed concurrently. This function is called by Pipeline, and not
+        intended to be called by the user.
+
         Args:
             *data: Variable length list of data
             logger(:obj:`ImagepypelinesLogger`): parent pipeline logger, which
                 will be used to create a new child block logger
             force_skip(bool): whether or not to check batch types and shapes
+            sample(int,None): the pipeline's enforcement sample size, see
+                `Block.enforcement_sample`. defaults to None
+            stats(dict,None): if provided, the seconds spent checking types
+                and shapes are added to its 'enforcement' key. defaults to None
 
         Returns:
             (tuple): variable length tuple containing processed data
         """
+        key, outputs = self._cache_lookup(data, logger)
+        if outputs is not None:
+            return outputs
+
+        start = time.perf_counter()
+        self._processing = True
+        try:
+            self._prepare(data, logger, force_skip, sample, stats)
+            outs = await asyncio.gather(*(self.process(*batch) for batch in self._batches(data)))
+            outputs = self._collect([self._make_tuple(out) for out in outs], data)
+        finally:
+            self._processing = False
+
+        if key is not None:
+            self.cache.put(key, outputs, time.perf_counter() - start)
+        return outputs
+
+    ############################################################################
+    def _cache_lookup(self, data, logger):
+        """looks up the outputs for the given data in the cache
+
+        Args:
+            data(:obj:`tuple` of :obj:`Data`): the input data for this block
+            logger(:obj:`ImagepypelinesLogger`): parent pipeline logger
+
+        Returns:
+            (tuple): tuple containing:
+
+                str: the cache key for the data, None if caching is disabled or
+                    the data can't be hashed
+                tuple: the cached outputs, None if they aren't in the cache
+        """
+        if self.cache is None:
+            return None, None
+
+        h = new_hash()
+        try:
+            self._update_fingerprint(h)
+            for d in data:
+                update_hash(h, d.data)
+        except Unhashable as e:
+            self.logger.debug("unable to hash inputs for caching: {}".format(e))
+            return None, None
+
+        key = h.hexdigest()
+        outputs = self.cache.get(key)
+        if outputs is not None:
+            self._pair_logger(logger)
+            self.logger.debug("using cached outputs")
+        return key, outputs
+
+    ############################################################################
+    def _update_fingerprint(self, h):
+        """updates the hash object with everything about this block which
+        determines its outputs. Used to compute cache keys
+
+        The block's digest is cached until one of its parameters is assigned,
+        see the note on :obj:`Block`
+
+        Args:
+            h(:obj:`hashlib.blake2b`): the hash object to update
+
+        Raises:
+            Unhashable: if the block's parameters can't be hashed
+        """
+        if self._fingerprint is None:
+            own = new_hash()
+            try:
+                self._compute_fingerprint(own)
+                self._fingerprint = own.digest()
+            except Unhashable as e:
+                # don't try again until the parameters change
+                self._fingerprint = e
+
+        if isinstance(self._fingerprint, Unhashable):
+            raise self._fingerprint
+        h.update(self._fingerprint)
+
+    ############################################################################
+    def _compute_fingerprint(self, h):
+        """updates the hash object with the block's class, batch_type, process
+        function and every instance attribute not in `_RUNTIME_ATTRS`, so
+        blocks of the same class with different parameters have different
+        fingerprints
+
+        Args:
+            h(:obj:`hashlib.blake2b`): the hash object to update
+
+        Raises:
+            Unhashable: if the block's parameters can't be hashed
+        """
+        cls = self.__class__
+        update_hash(h, "{}.{}".format(cls.__module__, cls.__qualname__))
+        update_hash(h, self.batch_type)
+        update_code_hash(h, self.process.__func__.__code__)
+
+        params = sorted((k,v) for k,v in self.__dict__.items()
+                            if k not in self._RUNTIME_ATTRS)
+        update_hash(h, params)
+
+    ############################################################################
+    def _prepare(self, data, logger, force_skip, sample=None, stats=None):
+        """pairs the logger, checks the data and runs preprocess before any
+        batches are processed
+
+        Args:
+            data(:obj:`tuple` of :obj:`Data`): the input data for this block
+            logger(:obj:`ImagepypelinesLogger`): parent pipeline logger
+            force_skip(bool): whether or not to check batch types and shapes
+            sample(int,None): the pipeline's enforcement sample size
+            stats(dict,None): dictionary to add the enforcement time to
+        """
         self._pair_logger(logger)
-        # NOTE: add type checking here
 
         # check data partity (same n_items for every data)
         # this still works even if len(data) is 0
         if not all(data[0].n_items == d.n_items for d in data):
-            msg = "Invalid data lengths! all data must have the same"\
+            msg = "Invalid data lengths! all data must have the same "\
                     + "number of items. {}"
             # this adds a list ("input_name.n_items"=)
-            msg.format(",".join("{}.n_items={}".format(d.n_items) for i,d in zip(self.inputs,data)))
+            msg = msg.format(",".join("{}.n_items={}".format(arg, d.n_items) for arg,d in zip(self.args,data)))
             self.logger.error(msg)
             raise RuntimeError(msg)
 
         # run preprocess
         self.preprocess()
 
+        # --------- CHECKING  ---------
+        # check the batches before processing. root blocks don't have any
+        # data to check
+        if self.n_args > 0:
+            if not (force_skip or self.skip_enforcement):
+                if self.enforcement_sample is not None:
+                    sample = self.enforcement_sample
+                start = time.perf_counter()
+                self._check_batches(*data, sample=sample)
+                if stats is not None:
+                    stats['enforcement'] += time.perf_counter() - start
+
+    ############################################################################
+    def _batches(self, data):
+        """generates the argument tuples to call the process function with
+
+        Args:
+            data(:obj:`tuple` of :obj:`Data`): the input data for this block
+
+        Yields:
+            tuple: the arguments for one call to the process function
+        """
         # root blocks don't need input data, and won't have any data
         # passed in to batch. We only call process once for these
         if self.n_args == 0:
-            # this separate statement is  necessary because we have to ensure
-            # that process is only called once not for every data batch
-            # (only if there are no inputs, ie no batches, into this block)
-            ret = self.process()
-            # put it a tuple if it isn't already
-            if not isinstance(ret, tuple):
-                ret = (ret, )
+            yield tuple()
+
+        # EACH - every batch is a datum
+        elif self.batch_type == "each":
+            for datums in zip(*(d.as_each() for d in data)):
+                yield datums
+
+        # INTEGER - consecutive batches of a fixed size
+        elif isinstance(self.batch_type, int):
+            for batches in zip(*(d.as_batches(self.batch_type) for d in data)):
+                yield batches
 
+        # ALL - process everything at once
         else:
-            # --------- CHECKING  ---------
-            # check the batches before processing
-            if not (force_skip or self.skip_enforcement):
-                self._check_batches(*data)
+            yield tuple(d.as_all() for d in data)
 
-            # --------- ACTUAL PROCESSING ---------
-            # EACH - every batch is a datum
-            if self.batch_type == "each":
-                # construct the batch generators
-                def _process_batches(*data):
-                    batches = (d.as_each() for d in data)
-                    for datums in zip(*batches):
-                        out = self.process(*datums)
-                        # put it a tuple if it isn't already
-                        if not isinstance(out, tuple):
-                            out = (out, )
-                        yield out
-
-                ret = tuple( zip(*_process_batches(*data)) )
-
-            # ALL - process everything at once
-            else:
-                batches = (d.as_all() for d in data)
-                ret = self.process(*batches)
-                # put it a tuple if it isn't already
-                if not isinstance(ret, tuple):
-                    ret = (ret, )
-
-        return ret
-
-    ############################################################################
-    def _check_batches(self, *data):
-        """checks argument batches to verify if they are the correct type and shapes
+    ############################################################################
+    def _collect(self, outs, data):
+        """reassembles the outputs of every process call into one output per
+        task output
+
+        Args:
+            outs(:obj:`iterable` of :obj:`tuple`): the outputs of every call to
+                the process function, in the order of the batches
+            data(:obj:`tuple` of :obj:`Data`): the input data for this block
+
+        Returns:
+            (tuple): variable length tuple containing processed data
         """
-        all_data = (d.as_all() for d in data)
-        # FOR EVERY ARG AND BATCH
-        # ======================================================================
-        for arg_name,data_container in zip(self.args, all_data):
-            # ---------- CONTAINER CHECK ----------
-            # we have to check the container if datums aren't passed in individually
-            if self.batch_type == "all":
-                okay_containers = self.containers.get(arg_name,None)
-                if okay_containers is not None:
-                    # check the container type is valid
-                    if not isinstance(data_container, okay_containers):
-                        msg = "invalid container for '{}'. must be {}, not {}. (you can disable this check with the 'skip_enforcement' keyword)"
-                        msg = msg.format(arg_name, okay_containers, type(batch))
-                        self.logger.error(msg)
-                        raise BlockError(msg)
+        if self.n_args > 0:
+            if self.batch_type == "each":
+                # array inputs produce array outputs
+                if any(isinstance(d.data, np.ndarray) for d in data):
+                    return self._stack_each(outs, data[0].n_items)
+                return tuple( zip(*outs) )
+            elif isinstance(self.batch_type, int):
+                return tuple(self._concatenate(batches) for batches in zip(*outs))
+        # root and "all" blocks only call process once
+        return next( iter(outs) )
 
+    ############################################################################
+    @staticmethod
+    def _stack_each(outs, n_items):
+        """writes the outputs of every datum into preallocated arrays as they
+        are computed. The arrays are allocated from the shape and dtype of the
+        first datum's outputs.
 
-            # check if it's a homogenus container
-            # for example if it's a numpy array, we can speed thing sup because
-            # we only have to check the first row
-            if type(data_container) in HOMOGENUS_CONTAINERS:
-                data_container = data_container[0]
+        Outputs that aren't numpy arrays or scalars, or whose shape or dtype
+        changes partway through, fall back to a tuple of outputs.
 
+        Args:
+            outs(:obj:`iterable` of :obj:`tuple`): the outputs of every call to
+                the process function, one per datum
+            n_items(int): the number of datums
 
-            # FOR EVERY DATUM IN THE CONTAINER
-            # ==================================================================
-            for datum in data_container:
-                # ---------------------------------------
-                # TYPE CHECKING
-                # ---------------------------------------
-                # fetch the accepted types for this arg
-                arg_types = self.types.get(arg_name, None)
-                # if arg_types is None, then we will skip all type checking
-                if not (arg_types is None):
-                    if not isinstance(datum, arg_types):
-                        msg = "invalid type for '{}'. must be {}, not {}. (you can disable this check with the 'skip_enforcement' keyword)"
-                        msg = msg.format(arg_name, arg_types, type(batch))
-                        self.logger.error(msg)
-                        raise BlockError(msg)
-
-                # ---------------------------------------
-                # SHAPE CHECKING
-                # ---------------------------------------
-                # fetch the accepted shapes for this arg
-                arg_shapes = self.shapes.get(arg_name, None)
-                # if arg_shapes is None, then we will skip all shape checking
-                if not (arg_shapes is None):
-                    # skip shape checking if we don't have a shape_fn
-                    shape_fn = self.shape_fns.get( type(datum), None )
-                    if shape_fn is None:
+        Returns:
+            (tuple): variable length tuple containing processed data
+        """
+        stacked = None
+        for i,out in enumerate(outs):
+            if stacked is None:
+                stacked = [Block._allocate(o, n_items) for o in out]
+
+            for j,o in enumerate(out):
+                col = stacked[j]
+                if isinstance(col, np.ndarray):
+                    if isinstance(o, (np.ndarray,np.generic)) \
+                        and (o.shape == col.shape[1:]) and (o.dtype == col.dtype):
+                        col[i] = o
                         continue
+                    # this datum doesn't fit in the array
+                    col = stacked[j] = list(col[:i])
+                col.append(o)
+
+        # the block didn't receive any data
+        if stacked is None:
+            return ()
+        return tuple(s if isinstance(s, np.ndarray) else tuple(s) for s in stacked)
+
+    ############################################################################
+    @staticmethod
+    def _allocate(out, n_items):
+        """returns an empty array to stack `n_items` outputs like `out` into,
+        or an empty list if `out` can't be stacked"""
+        if isinstance(out, (np.ndarray,np.generic)) and (out.dtype != object):
+            return np.empty((n_items,) + out.shape, dtype=out.dtype)
+        return []
+
+    ############################################################################
+    def _check_batches(self, *data, sample=None):
+        """checks argument batches to verify if they are the correct type and
+        shapes using the compiled validators
+
+        Args:
+            *data: Variable length list of data
+            sample(int,None): if set, only this many items at the start of large
+                list or tuple batches and as many random items are checked.
+                defaults to None (check every item)
+        """
+        if self._validators is None:
+            self._compile_validators()
+
+        sampled = False
+        for validate,d in zip(self._validators, data):
+            if validate is not None:
+                sampled = validate( d.as_all(), sample ) or sampled
+
+        # let the user know that not everything was checked, but only once
+        if sampled and (not self._sampling_logged):
+            msg = "only checking the first {0} and {0} random items of large" \
+                    + " batches (enforcement_sample={0})"
+            self.logger.info( msg.format(sample) )
+            self._sampling_logged = True
 
-                    # retrieve datum shape
-                    datum_shape = shape_fn(datum)
+    ############################################################################
+    def _compile_validators(self):
+        """compiles the types, shapes and containers of every argument into a
+        validator function, so that enforcement doesn't have to look them up
+        for every datum. Called by `enforce` and when the block is added to a
+        Pipeline
+        """
+        self._validators = tuple(self._compile_validator(arg) for arg in self.args)
+        self._enforcement_version += 1
+
+    ############################################################################
+    def _compile_validator(self, arg_name):
+        """builds the validator for a single argument
+
+        Shape functions and type checks are resolved once per datum type and
+        cached, including for subclasses of the types in `shape_fns`. Shape
+        checks are resolved once per unique shape. Lists of arrays are
+        checked in bulk by validating each unique shape in the list only once.
+        Only the first datum of HOMOGENUS_CONTAINERS is checked, and large
+        SAMPLED_CONTAINERS are spot checked if a sample size is given.
+
+        Args:
+            arg_name(str): the name of the argument
+
+        Returns:
+            function: function which takes the argument's data container and
+                a sample size (or None), and raises a BlockError if it's
+                invalid. It returns whether or not only a sample was checked.
+                None if nothing is enforced for the argument
+        """
+        arg_types = self.types.get(arg_name, None)
+        arg_shapes = self.shapes.get(arg_name, None)
+        # we have to check the container if datums aren't passed in individually
+        okay_containers = None
+        if self.batch_type != "each":
+            okay_containers = self.containers.get(arg_name, None)
 
-                    # FOR ARG SHAPE in all possible arg shapes
-                    # ==========================================================
-                    ndim_okay = False
-                    axes_okay = True
-                    for arg_shape in arg_shapes:
-                        # reject automatically unless at least one shape has
-                        # right number of dimensions
-                        if len(arg_shape) != len(datum_shape):
-                            continue
+        if (arg_types is None) and (arg_shapes is None) and (okay_containers is None):
+            return None
 
-                        ndim_okay = True
+        shape_fns = self.shape_fns
+        fail = self._enforcement_error
+        dispatch = {} # datum type : shape function (or None)
+        valid_shapes = {} # datum shape : whether or not it's valid
 
-                        # otherwise check every axis
-                        for arg_ax,d_ax in zip(arg_shape,datum_shape):
-                            # no need to check if the arg_ax is None (any length)
-                            if arg_ax is None:
-                                continue
-                            # compare every axis length
-                            axes_okay = (axes_okay and (arg_ax == d_ax))
+        # ----------------------------------------------------------------------
+        def lookup(datum_type):
+            """type checks a new datum type and finds its shape function"""
+            if (arg_types is not None) and (not issubclass(datum_type, arg_types)):
+                msg = "invalid type for '{}'. must be {}, not {}."
+                fail( msg.format(arg_name, arg_types, datum_type) )
+
+            shape_fn = None
+            if arg_shapes is not None:
+                for base in datum_type.__mro__:
+                    shape_fn = shape_fns.get(base, None)
+                    if shape_fn is not None:
+                        break
+
+            dispatch[datum_type] = shape_fn
+            return shape_fn
 
-                    # raise a shape error
-                    if not (axes_okay and ndim_okay):
-                        msg = "invalid shape for '{}'. must be {}, not {}"
-                        msg = msg.format(arg_name, arg_shapes, datum_shape)
-                        self.logger.error(msg)
-                        raise BlockError(msg + " (you can disable this check with the 'skip_enforcement' keyword)")
+        # ----------------------------------------------------------------------
+        def check_shape(datum_shape):
+            """checks a datum shape against every acceptable shape"""
+            okay = valid_shapes.get(datum_shape, None)
+            if okay is None:
+                # the shape is okay if it matches any acceptable shape
+                okay = any((len(arg_shape) == len(datum_shape)) \
+                            and all((arg_ax is None) or (arg_ax == d_ax) \
+                                        for arg_ax,d_ax in zip(arg_shape, datum_shape))
+                            for arg_shape in arg_shapes)
+                if len(valid_shapes) < MAX_CACHED_SHAPES:
+                    valid_shapes[datum_shape] = okay
+
+            if not okay:
+                msg = "invalid shape for '{}'. must be {}, not {}."
+                fail( msg.format(arg_name, arg_shapes, datum_shape) )
 
+        # ----------------------------------------------------------------------
+        def validate(data_container, sample=None):
+            # ---------- CONTAINER CHECK ----------
+            if okay_containers is not None:
+                if not isinstance(data_container, okay_containers):
+                    msg = "invalid container for '{}'. must be {}, not {}."
+                    fail( msg.format(arg_name, okay_containers, type(data_container)) )
+
+            # check if it's a homogenus container
+            # for example if it's a numpy array, we can speed thing sup because
+            # we only have to check the first datum
+            sampled = False
+            if type(data_container) in HOMOGENUS_CONTAINERS:
+                data_container = data_container[:1]
+
+            # spot check the start of the container and random items, so that
+            # the cost doesn't depend on the number of items
+            elif sample and (type(data_container) in SAMPLED_CONTAINERS):
+                n_items = len(data_container)
+                if n_items > 2 * sample:
+                    idx = chain(range(sample), random.sample(range(sample, n_items), sample))
+                    data_container = [data_container[i] for i in idx]
+                    sampled = True
+
+            # ---------- TYPE CHECK ----------
+            # only done once for every unique type in the container
+            datum_types = set( map(type, data_container) )
+            fns = set((dispatch[t] if (t in dispatch) else lookup(t)) for t in datum_types)
+
+            # ---------- SHAPE CHECK ----------
+            if arg_shapes is None:
+                return sampled
+
+            # every datum is an array, so check every unique shape once
+            if fns == {numpy_shape}:
+                for datum_shape in set(datum.shape for datum in data_container):
+                    check_shape(datum_shape)
+                return sampled
+
+            for datum in data_container:
+                shape_fn = dispatch[type(datum)]
+                # skip shape checking if we don't have a shape_fn
+                if shape_fn is None:
+                    continue
+                datum_shape = shape_fn(datum)
+                # scalars don't have a shape
+                if datum_shape is None:
+                    continue
+                check_shape(datum_shape)
+
+            return sampled
+
+        return validate
+
+    ############################################################################
+    def _enforcement_error(self, msg):
+        """logs and raises an enforcement error"""
+        msg += " (you can disable this check with the 'skip_enforcement' keyword)"
+        self.logger.error(msg)
+        raise BlockError(msg)
 
     ############################################################################
     def _summary(self):
@@ -461,14 +895,58 @@ class Block(metaclass=ABCMeta):
     ############################################################################
     def _pair_logger(self, pipeline_logger):
         """creates or fetches a new child logger of the pipeline for this block"""
-        self.logger = pipeline_logger.getChild(self.id)
+        # this runs on every call, so skip the lookup if we're already paired
+        if self.logger.parent is not pipeline_logger:
+            self.logger = track_logger(self, pipeline_logger.getChild(self.id))
 
     ############################################################################
     def _unpair_logger(self):
         """restores the original block logger"""
-        self.logger = get_logger(self.id)
+        self.logger = track_logger(self, get_logger(self.id))
+
 
 
+    ############################################################################
+    @staticmethod
+    def _concatenate(batches):
+        """concatenates the per-batch outputs for a single output index back
+        into one container. Arrays are concatenated along the first axis, every
+        other type is concatenated into a list (or a tuple if they're all
+        tuples). Scalars, such as the result of reducing a batch, are one item
+        each and numpy scalars are stacked into an array"""
+        scalars = [Block._is_scalar(b) for b in batches]
+        if all(scalars):
+            if all(isinstance(b, (np.ndarray, np.generic)) for b in batches):
+                return np.asarray(batches)
+            return list(batches)
+        elif any(scalars):
+            batches = [([b] if scalar else b) for b,scalar in zip(batches,scalars)]
+
+        if len(batches) == 1:
+            return batches[0]
+
+        if all(isinstance(b, np.ndarray) for b in batches):
+            return np.concatenate(batches, axis=0)
+
+        joined = list( chain.from_iterable(batches) )
+        if all(isinstance(b, tuple) for b in batches):
+            return tuple(joined)
+        return joined
+
+    ############################################################################
+    @staticmethod
+    def _is_scalar(out):
+        """whether or not a batch output is a single item rather than a
+        container of items"""
+        if isinstance(out, (np.ndarray, np.generic)):
+            return out.ndim == 0
+        if isinstance(out, (str, bytes)):
+            return True
+        try:
+            iter(out)
+        except TypeError:
+            return True
+        return False
 
     ############################################################################
     @staticmethod
@@ -489,15 +967,39 @@ class Block(metaclass=ABCMeta):
     def __repr__(self):
         return self.id
 
+    ############################################################################
+    def __setattr__(self, name, value):
+        """resets the fingerprint when a parameter is assigned outside of
+        processing"""
+        if (name not in self._RUNTIME_ATTRS) and not self.__dict__.get('_processing', False):
+            self.__dict__['_fingerprint'] = None
+        super().__setattr__(name, value)
+
     ############################################################################
     def __getstate__(self):
-        return self.__dict__
+        state = self.__dict__.copy()
+        # validators are closures, they are recompiled when needed
+        state['_validators'] = None
+        state['_fingerprint'] = None
+        state['_processing'] = False
+        # copies track the loggers they use themselves
+        state.pop('_logger_names', None)
+        return state
 
     ############################################################################
     def __setstate__(self, state):
         """resets the uuid in the event of a copy"""
         state['uuid'] = uuid4().hex
+        # blocks pickled before caching or compiled validators existed
+        state.setdefault('cache', None)
+        state.setdefault('_validators', None)
+        state.setdefault('_enforcement_version', 0)
+        state.setdefault('enforcement_sample', None)
+        state.setdefault('_sampling_logged', False)
+        state.setdefault('_fingerprint', None)
+        state.setdefault('_processing', False)
         self.__dict__.update(state)
+        track_logger(self, self.logger)
 
 
     ############################################################################
@@ -521,6 +1023,12 @@ class Block(metaclass=ABCMeta):
         """int: number of arguments for the process function"""
         return len(self.args)
 
+    ############################################################################
+    @property
+    def is_coroutine(self):
+        """bool: whether or not the process function is a coroutine function"""
+        return inspect.iscoroutinefunction(self.process)
+
     ############################################################################
     @property
     def id(self):
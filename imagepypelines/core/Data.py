@@ -6,6 +6,7 @@
 # Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
 #
 import numpy as np
+import itertools
 
 
 class Data(object):
@@ -29,6 +30,9 @@ class Data(object):
             return self.n_items
         elif batch_type == "all":
             return 1
+        elif isinstance(batch_type, int):
+            # ceiling division
+            return -(-self.n_items // batch_type)
 
     ############################################################################
     def as_all(self):
@@ -41,6 +45,28 @@ class Data(object):
         for d in self.data:
             yield d
 
+    ############################################################################
+    def as_batches(self, batch_size):
+        """returns a generator that returns consecutive batches of
+        `batch_size` items. The final batch may be smaller.
+
+        Batches are slices of the raw data when possible (views for numpy
+        arrays), otherwise they're lists.
+
+        Args:
+            batch_size(int): the number of items in each batch
+        """
+        try:
+            for i in range(0, self.n_items, batch_size):
+                yield self.data[i:i+batch_size]
+        except TypeError:
+            # the data can't be sliced
+            items = iter(self.data)
+            batch = list( itertools.islice(items, batch_size) )
+            while batch:
+                yield batch
+                batch = list( itertools.islice(items, batch_size) )
+
     ############################################################################
     def pop(self):
         """returns the data, and then removes it from this object"""
@@ -0,0 +1,356 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+#
+from .Data import Data
+from .Exceptions import PipelineError
+from .block_subclasses import Leaf
+
+from collections import namedtuple
+from types import MappingProxyType
+
+import networkx as nx
+
+
+PlanStep = namedtuple('PlanStep', ['node_id',
+                                    'block',
+                                    'args',
+                                    'outputs',
+                                    'in_edges',
+                                    'out_edges'])
+"""a single compiled task in the ExecutionPlan
+
+Attributes:
+    node_id(str): the id of the task's node in the Pipeline graph
+    block(:obj:`Block`): the block object for this task
+    args(:obj:`tuple` of :obj:`str`): names of the task inputs
+    outputs(:obj:`tuple` of :obj:`str`): names of the task outputs
+    in_edges(:obj:`tuple` of :obj:`dict`): attribute dictionaries of the
+        incoming graph edges, sorted by 'in_index'
+    out_edges(:obj:`tuple` of :obj:`tuple`): (target_node_id, edge_attrs)
+        pairs for every outgoing graph edge
+"""
+
+
+class ExecutionPlan(object):
+    """immutable, precompiled execution order for a Pipeline graph
+
+    The plan is built once from the graph and stored on the Pipeline, so that
+    processing doesn't have to sort the graph or look up edge attributes on
+    every call. It must be rebuilt whenever the graph changes.
+
+    Note:
+        The edge attribute dictionaries referenced in the plan are the same
+        objects stored in the graph, so data written to them by the plan is
+        visible in `Pipeline.graph` and vice versa.
+
+    Attributes:
+        order(:obj:`tuple` of :obj:`str`): topologically sorted node ids
+        edges(:obj:`tuple` of :obj:`tuple`): topologically sorted edges in
+            (node_a, node_b, key) form
+        roots(:obj:`tuple` of :obj:`str`): ids of nodes without any incoming
+            edges
+        steps(:obj:`mappingproxy`): read-only mapping of node ids to their
+            :obj:`PlanStep`
+        var_edges(:obj:`mappingproxy`): read-only mapping of variable names to
+            the attribute dictionaries of every edge that carries them
+    """
+    def __init__(self, graph):
+        """compiles the plan
+
+        Args:
+            graph(:obj:`networkx.MultiDiGraph`): the Pipeline graph to compile
+        """
+        order = tuple( nx.topological_sort(graph) )
+
+        steps = {}
+        edges = []
+        roots = []
+        var_edges = {}
+        for node in order:
+            attrs = graph.nodes[node]
+
+            # incoming edges sorted by the argument index they feed
+            in_edges = sorted((e for _,_,e in graph.in_edges(node, data=True)),
+                                key=lambda e: e['in_index'])
+
+            # outgoing edges in their key form and with their attributes
+            out_edges = []
+            for _,node_b,key,edge in graph.out_edges(node, keys=True, data=True):
+                out_edges.append( (node_b, edge) )
+                var_edges.setdefault(edge['var_name'], []).append(edge)
+                # edges are emitted in the order of their source node, which
+                # is a valid topological sort of the edges themselves
+                edges.append( (node, node_b, key) )
+
+            if len(in_edges) == 0:
+                roots.append(node)
+
+            steps[node] = PlanStep(node_id=node,
+                                    block=attrs['block'],
+                                    args=tuple(attrs['args']),
+                                    outputs=tuple(attrs['outputs']),
+                                    in_edges=tuple(in_edges),
+                                    out_edges=tuple(out_edges))
+
+        self.__dict__['order'] = order
+        self.__dict__['edges'] = tuple(edges)
+        self.__dict__['roots'] = tuple(roots)
+        self.__dict__['steps'] = MappingProxyType(steps)
+        self.__dict__['var_edges'] = MappingProxyType(
+                        {var : tuple(e) for var,e in var_edges.items()} )
+
+    ############################################################################
+    #                               special
+    ############################################################################
+    def __setattr__(self, name, value):
+        raise AttributeError("ExecutionPlan is immutable")
+
+    ############################################################################
+    def __delattr__(self, name):
+        raise AttributeError("ExecutionPlan is immutable")
+
+    ############################################################################
+    def __len__(self):
+        return len(self.order)
+
+    ############################################################################
+    def __iter__(self):
+        """iterates through the PlanSteps in topological order"""
+        for node in self.order:
+            yield self.steps[node]
+
+
+################################################################################
+class ReachabilityIndex(object):
+    """transitive closure of an ExecutionPlan over its nodes and variables,
+    for fast ancestor and descendant queries
+
+    Every node and variable is assigned a bit. Each node stores bitsets of its
+    ancestor nodes, of the variables on the incoming edges of it and all of its
+    ancestors (its predecessors), and of the variables on the outgoing edges of
+    it and all of its descendants (its successors). The bitsets are computed
+    in one iterative pass over the topological order in each direction, so
+    deep graphs can't exceed the recursion limit. Ancestor tests are then a
+    single bit test, and unions of bitsets cost O(V/64).
+
+    Like the plan, the index must be rebuilt whenever the graph changes.
+    """
+    def __init__(self, plan):
+        """builds the index
+
+        Args:
+            plan(:obj:`ExecutionPlan`): plan for the full Pipeline graph
+        """
+        self._vars = [] # variable name for each bit
+        self._var_bits = {} # bit for each variable name
+        self._node_bits = {node : 1 << i for i,node in enumerate(plan.order)}
+        self._ancestors = {}
+        self._preds = {}
+        self._succs = {}
+        self._decoded = {}
+
+        # variables on the incoming edges of every node
+        for node in plan.order:
+            self._ancestors[node] = 0
+            self._preds[node] = self.mask(e['var_name'] for e in plan.steps[node].in_edges)
+
+        # sources precede their targets, so they're complete when pushed
+        for node in plan.order:
+            ancestors = self._ancestors[node] | self._node_bits[node]
+            for node_b,_ in plan.steps[node].out_edges:
+                self._ancestors[node_b] |= ancestors
+                self._preds[node_b] |= self._preds[node]
+
+        # targets follow their sources, so walk backwards for the successors
+        for node in reversed(plan.order):
+            out_edges = plan.steps[node].out_edges
+            succs = self.mask(edge['var_name'] for _,edge in out_edges)
+            for node_b,_ in out_edges:
+                succs |= self._succs[node_b]
+            self._succs[node] = succs
+
+    ############################################################################
+    def mask(self, vars):
+        """returns the bitset for the given variables, assigning new bits to
+        variables that don't have one yet"""
+        mask = 0
+        for var in vars:
+            if var not in self._var_bits:
+                self._var_bits[var] = 1 << len(self._vars)
+                self._vars.append(var)
+            mask |= self._var_bits[var]
+        return mask
+
+    ############################################################################
+    def is_ancestor(self, node_a, node_b):
+        """returns True if node_b can only be computed after node_a"""
+        return bool(self._ancestors[node_b] & self._node_bits[node_a])
+
+    ############################################################################
+    def predecessors(self, node):
+        """returns a frozenset of the variables on the incoming edges of the
+        node and all of its ancestors"""
+        return self._decode('preds', node, self._preds)
+
+    ############################################################################
+    def successors(self, node):
+        """returns a frozenset of the variables on the outgoing edges of the
+        node and all of its descendants. Outputs that no task consumes have no
+        edge, so they're not included"""
+        return self._decode('succs', node, self._succs)
+
+    ############################################################################
+    def _decode(self, kind, node, masks):
+        """converts a node's bitset into a frozenset of variable names, which
+        is cached"""
+        key = (kind, node)
+        if key not in self._decoded:
+            # reversed binary string, so the index of a '1' is its bit
+            bits = bin(masks[node])[:1:-1]
+            found = []
+            i = bits.find('1')
+            while i != -1:
+                found.append(self._vars[i])
+                i = bits.find('1', i+1)
+            self._decoded[key] = frozenset(found)
+        return self._decoded[key]
+
+
+################################################################################
+class Scheduler(object):
+    """tracks which nodes of an ExecutionPlan are ready to run during a single
+    pipeline run.
+
+    Every node keeps a counter of the incoming edges that haven't been
+    populated yet. A node becomes ready once its counter reaches zero, so every
+    node is released exactly once per run no matter how many inputs it has.
+    Outputs are scattered to all outgoing edges of the node at once.
+
+    Every variable also keeps a count of the edges that will consume it. Once
+    the last of them has been processed, the data is dropped from all of the
+    variable's edges, so that peak memory is set by the live working set rather
+    than by every intermediate in the graph. Kept variables are never dropped.
+
+    Attributes:
+        plan(:obj:`ExecutionPlan`): the plan being executed
+        keep(:obj:`frozenset` of :obj:`str`): variables whose data is stored
+            in `results` as soon as they're computed
+        results(dict): the :obj:`Data` for every kept variable that has been
+            computed so far
+        release(bool): whether or not to drop variables once they've been
+            consumed
+        restored(dict): outputs of root nodes which were loaded rather than
+            computed, keyed by node id. These are never sent to an executor
+        waiting(dict): number of unpopulated incoming edges for every node
+        refs(dict): number of unprocessed consumers for every variable
+        n_finished(int): number of nodes that have finished running
+    """
+    def __init__(self, plan, keep=(), release=True, restored=None):
+        """instantiates the Scheduler
+
+        Args:
+            plan(:obj:`ExecutionPlan`): the plan to execute
+            keep(:obj:`iterable` of :obj:`str`): variables to store in
+                `results`, typically the fetched variables. defaults to ()
+            release(bool): whether or not to drop the data of variables that
+                aren't kept once all of their consumers are processed.
+                defaults to True
+            restored(dict,None): already available outputs for some of the
+                plan's root nodes, keyed by node id. defaults to None
+        """
+        self.plan = plan
+        self.keep = frozenset(keep)
+        self.release = release
+        self.restored = {} if restored is None else restored
+        self.results = {}
+        self.waiting = {node : len(step.in_edges) for node,step in plan.steps.items()}
+        self.refs = {var : len(edges) for var,edges in plan.var_edges.items()}
+        self.n_finished = 0
+
+    ############################################################################
+    def start(self):
+        """returns the ids of the nodes which are ready before anything has run.
+        Restored nodes are finished immediately, and the nodes they release
+        are returned in their place
+
+        Returns:
+            :obj:`list` of :obj:`str`: ids of the root nodes
+        """
+        ready = []
+        for node in self.plan.roots:
+            if node in self.restored:
+                ready.extend( self.finish(node, self.restored[node]) )
+            else:
+                ready.append(node)
+        return ready
+
+    ############################################################################
+    def finish(self, node_id, outputs):
+        """scatters the outputs of a node to its outgoing edges and releases
+        any downstream nodes which have all of their inputs
+
+        Args:
+            node_id(str): id of the node that finished running
+            outputs(tuple): the outputs returned by the node's block
+
+        Returns:
+            :obj:`list` of :obj:`str`: ids of nodes that are now ready to run
+        """
+        step = self.plan.steps[node_id]
+        self.n_finished += 1
+
+        # this node is done with its inputs
+        if self.release:
+            self._release_inputs(step)
+
+        # leaves only hold the final edges of the graph, they have no outputs
+        if isinstance(step.block, Leaf):
+            return []
+
+        # make sure the block returned an output for every task output
+        if len(outputs) != len(step.outputs):
+            msg = "{} returned {} outputs, but its task defines {} ({})"
+            msg = msg.format(step.block,
+                                len(outputs),
+                                len(step.outputs),
+                                ', '.join(step.outputs))
+            step.block.logger.error(msg)
+            raise PipelineError(msg)
+
+        # every output is wrapped only once and shared between its edges
+        out_data = [Data(out) for out in outputs]
+        for var,data in zip(step.outputs, out_data):
+            if var in self.keep:
+                self.results[var] = data
+
+        ready = []
+        for node_b,edge in step.out_edges:
+            edge['data'] = out_data[ edge['out_index'] ]
+            self.waiting[node_b] -= 1
+            if self.waiting[node_b] == 0:
+                ready.append(node_b)
+
+        return ready
+
+    ############################################################################
+    def _release_inputs(self, step):
+        """decrements the consumer count of the node's input variables and
+        drops their data if this was the last consumer"""
+        for edge in step.in_edges:
+            var = edge['var_name']
+            self.refs[var] -= 1
+            if (self.refs[var] == 0) and (var not in self.keep):
+                for var_edge in self.plan.var_edges[var]:
+                    var_edge['data'] = None
+
+    ############################################################################
+    @property
+    def done(self):
+        """bool: whether or not every node in the plan has finished"""
+        return self.n_finished == len(self.plan)
+
+# END
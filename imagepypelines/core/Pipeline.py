@@ -4,16 +4,23 @@
 # @github: https://github.com/jmaggio14/imagepypelines
 #
 # Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
-from ..Logger import get_logger, MASTER_LOGGER
+from ..Logger import get_logger, track_logger, MASTER_LOGGER
 from .Block import Block
-from .Data import Data
 from .block_subclasses import Input, Leaf, PipelineBlock
 from .constants import UUID_ORDER
 from .Exceptions import PipelineError
+from .ExecutionPlan import ExecutionPlan, ReachabilityIndex, Scheduler
+from .caching import CheckpointStore, new_hash, update_hash, Unhashable
+from .executors import get_executor, SerialExecutor, ProcessExecutor, AsyncExecutor
+from .profiling import ProfileReport, TraceRecorder, profile_node
+from .serialization import FrameReader, FrameWriter, MAGIC, file_checksum, is_framed
 from .io_tools import passgen
+from .util import get_running_loop
 
 from cryptography.fernet import Fernet
+import asyncio
 import inspect
+import io
 import numpy as np
 from uuid import uuid4
 import networkx as nx
@@ -22,10 +29,24 @@ import pickle
 import hashlib
 import copy
 import itertools
-
-ILLEGAL_VAR_NAMES = ['fetch','skip_enforcement']
+import os
+import time
+import weakref
+from collections import OrderedDict
+
+ILLEGAL_VAR_NAMES = ['fetch',
+                        'skip_enforcement',
+                        'executor',
+                        'max_workers',
+                        'profile',
+                        'trace',
+                        'chunk_size']
 """illegal or reserved names for variables in the graph"""
 
+MAX_CACHED_PLANS = 64
+"""maximum number of pruned execution plans (one per unique fetch) cached on a
+Pipeline"""
+
 class Pipeline(object):
     """processing algorithm manager for simple pipeline construction
 
@@ -49,6 +70,35 @@ class Pipeline(object):
             process function)
         _inputs(dict): dictionary internally to access Input objects used to
             queue data into the pipeline
+        _plan(:obj:`ExecutionPlan`,None): cached execution plan for the graph,
+            None if it hasn't been compiled since the graph last changed
+        _pruned_plans(:obj:`OrderedDict`): cached execution plans which only
+            compute what's required for a fetch, keyed by the frozenset of
+            fetched variables (and of tasks restored from checkpoints)
+        _reachability(:obj:`ReachabilityIndex`,None): cached index of which
+            tasks and variables are upstream or downstream of each other, None
+            if it hasn't been built since the graph last changed
+        _process_executor(:obj:`ProcessExecutor`,None): persistent pool of
+            worker processes, None if it hasn't been started
+        checkpoints(:obj:`CheckpointStore`,None): on-disk store of computed
+            variables, None if checkpointing isn't enabled. see
+            `Pipeline.enable_checkpoints`
+        checkpoint_vars(:obj:`frozenset` of :obj:`str`): variables which are
+            saved to and loaded from the checkpoint store
+        _retained(dict,None): data for every variable computed by the last
+            call to `Pipeline.reprocess`, None if it hasn't been called
+        _aprocess_locks(:obj:`weakref.WeakKeyDictionary`): the lock that
+            serializes `Pipeline.aprocess` calls in each event loop
+        enforcement_sample(int,None): if set, blocks only type and shape check
+            this many items at the start of large list or tuple batches and as
+            many randomly chosen items, so that enforcement costs the same
+            regardless of the batch size. Blocks can override this with their
+            own `enforcement_sample`. None (the default) checks every item
+        profile_report(:obj:`ProfileReport`,None): per-node measurements from
+            every call to `Pipeline.process` that was profiled, None if
+            nothing has been profiled. see `Pipeline.clear_profile`
+        _n_profile_calls(int): number of calls to `Pipeline.process` that
+            requested profiling, used to profile 1 in N calls
 
     Pipeline Graph Information:
         Nodes are dictionaries representing tasks. They contain:
@@ -124,7 +174,7 @@ class Pipeline(object):
         self.name = name # string name - used to generate the id
 
         # build the logger for this pipeline
-        self.logger = get_logger( self.id ) # logging object
+        self.logger = track_logger(self, get_logger( self.id )) # logging object
 
         # GRAPHING
         self.graph = nx.MultiDiGraph() # networkx graph keeping track of tasks
@@ -134,6 +184,19 @@ class Pipeline(object):
         self.indexed_inputs = [] # sorted list of indexed input variable names
         self.keyword_inputs = [] # alphabetically sorted list of unindexed inputs
         self._inputs = {} # dict of input_name: Input_object
+        self._plan = None # compiled execution plan, built on demand
+        self._pruned_plans = OrderedDict() # plans for specific fetches
+        self._process_executor = None # persistent worker processes
+        self.checkpoints = None # on-disk CheckpointStore, see enable_checkpoints
+        self.checkpoint_vars = frozenset() # variables to checkpoint
+        self._retained = None # results of the last reprocess call
+        self._aprocess_locks = weakref.WeakKeyDictionary() # lock per event loop
+        self.enforcement_sample = None # number of items to spot check
+        self._consumers = {} # (block, arg) consuming each var, built on demand
+        self._reachability = None # ancestor/descendant index, built on demand
+        self._compat_cache = {} # cached type, shape and container analysis
+        self.profile_report = None # measurements from profiled process calls
+        self._n_profile_calls = 0 # used to profile 1 in N calls
 
         # If a pipeline is passed in, then retrieve tasks and replicate our
         # pipeline
@@ -151,13 +214,21 @@ class Pipeline(object):
         """updates the pipeline's graph with a dict of tasks
 
         `update` will modify and change many instance variables of the pipeline.
-        Despite its generic name, it can only add tasks to the pipeline, not
-        remove them. `update` is called internally to the pipeline during
+        Despite its generic name, it can only add tasks to the pipeline, use
+        `Pipeline.replace_task` and `Pipeline.remove_task` to change or remove
+        them. `update` is called internally to the pipeline during
         instantiation.
 
+        Only the new tasks and the variables they consume are visited, so
+        building a graph incrementally costs time proportional to the tasks
+        added rather than the size of the graph.
+
         Args:
             tasks(dict): dictionary of tasks to define this pipeline's graph
-
+            predict_compatibility(bool): whether or not to warn about variables
+                that are consumed by blocks with incompatible types or shapes.
+                Only the variables touched by the new tasks are checked.
+                defaults to True
         """
         ########################################################################
         #                           HELPER FUNCTIONS
@@ -220,6 +291,7 @@ class Pipeline(object):
         ########################################################################
         #                    Add all the task nodes to the graph
         ########################################################################
+        new_nodes = []
         # reiterate through the graph definition to define inputs and outputs
         for outputs,task in tasks.items():
             # make a single value into a list to simplify code
@@ -250,6 +322,8 @@ class Pipeline(object):
 
                 # check this task's setup using the block.check_setup function
                 block.check_setup(args)
+                # compile its type and shape checks
+                block._compile_validators()
 
                 # add the task to the graph
                 self.graph.add_node(node_uuid,
@@ -258,44 +332,19 @@ class Pipeline(object):
                                     outputs=outputs,
                                     **block.get_default_node_attrs(),
                                     )
+                new_nodes.append(node_uuid)
 
 
             else: # something other than a block or of tuple (block, var1, var2,...)
                 raise PipelineError("invalid task definition, must be block or tuple: (block, 'var1', 'var2',...)")
 
         ########################################################################
-        #             Draw any new edges required for all block nodes
+        #             Draw the edges into the new task nodes
         ########################################################################
-        # THIRD FOR LOOP - drawing edges
-        for node_b,node_b_attrs in self.graph.nodes(data=True):
-            # draw an edge for every input into this node
-            for in_index, arg_name in enumerate(node_b_attrs['args']):
-                # first we identify an upstream node by looking up what task
-                # created them
-                node_a = self.vars[arg_name]['block_node_id']
-                node_a_attrs = self.graph.nodes[ node_a ]
-
-                # draw the edge FOR THIS INPUT from node_a to node_b
-                block_arg_name = node_b_attrs['block'].args[in_index]
-                out_index = node_a_attrs['outputs'].index(arg_name)
-
-                # edge key is {var_name}:{out_index}-->{in_index}
-                edge_key = "{}:{}-->{}".format(arg_name, out_index, in_index)
-
-                # draw the edge if it doesn't already exist
-                if not self.graph.has_edge(node_a,node_b,edge_key):
-                    self.graph.add_edge(node_a,
-                                        node_b,
-                                        # key
-                                        key=edge_key,
-                                        # attributes
-                                        var_name = arg_name, # name assigned in graph definition
-                                        out_index = out_index,
-                                        in_index = in_index,
-                                        name = block_arg_name, # name of node_b's process argument at the index
-                                        data = None, # none is a placeholder value. it will be populated
-                                        )
-
+        # existing nodes already have all of their input edges, because the
+        # variables they consume had to exist when they were added
+        for node_b in new_nodes:
+            self._draw_in_edges(node_b)
 
         ########################################################################
         #             Draw 'leaves' on tasks with no output edges
@@ -303,83 +352,22 @@ class Pipeline(object):
         ########################################################################
         # this is required so we can store data on end edges - otherwise the final
         # nodes of our pipeline won't have output edges, so we can't store data
-        # on those edges
-
-        # make a list of nodes without outgoing edges
-        end_nodes = []
-        for node,attrs in self.graph.nodes(data=True):
-            # if the node already has outputs, we don't need a leaf out of it
-            if self.graph.out_degree(node) > 0:
-                continue
-            # if the end node is a Leaf already, then we don't need another leaf
-            elif isinstance(attrs['block'],Leaf):
-                    continue
-            else:
-                end_nodes.append( (node,attrs) )
-
-        for node,node_attrs in end_nodes:
-            # this is a final node of the pipeline, so we need to draw a
-            # leaf for each of its output edges
-            for i,end_name in enumerate(node_attrs['outputs']):
-                # add the leaf
-                leaf = Leaf(end_name)
-                leaf_uuid = leaf.name + uuid4().hex + '-node'
-                self.graph.add_node(leaf_uuid,
-                                    block=leaf,
-                                    args=(end_name,),
-                                    outputs=(end_name,),
-                                    **leaf.get_default_node_attrs()
-                                    )
-
-                # edge key is {var_name}:{out_index}-->{in_index}
-                edge_key = "{}:{}-->{}".format(end_name, i, 0)
-                # draw the edge to the leaf
-                # no need to check if it exists, because we just created the Leaf
-                self.graph.add_edge(node,
-                                    leaf_uuid,
-                                    var_name=end_name, # name assigned in graph definition
-                                    out_index=i,
-                                    in_index=0,
-                                    name=end_name, # name of node_b's process argument at the index
-                                    data=None)
-
-
+        # on those edges. Only new nodes can be missing their outgoing edges
+        for node in new_nodes:
+            self._draw_leaves(node)
 
         ########################################################################
         #                   create input list & requirements
         ########################################################################
-        # reset old index tracking lists
-        self.indexed_inputs = []
-        self.keyword_inputs = []
-        # sort the inputs into keyword and indexed
-        for inpt_name, inpt in self._inputs.items():
-            # check if the input index is defined
-            if isinstance(inpt.index,int):
-                self.indexed_inputs.append(inpt_name)
-            else:
-                self.keyword_inputs.append(inpt_name)
-
-        # sort the positonal inputs by index
-        self.indexed_inputs.sort(key=lambda x: self._inputs[x].index)
-        # sort keyword only inputs alphabetically
-        self.keyword_inputs.sort()
-
-
-        # check to make sure an input index isn't defined twice
-        indices_used = [self._inputs[x].index for x in self.indexed_inputs]
-        if len(set(indices_used)) != len(indices_used):
-            # Note: add more verbose error message
-            msg = "Input indices cannot be reused"
-            self.logger.error(msg)
-            raise PipelineError(msg)
+        self._sort_inputs()
 
-        # check to make sure input indexes are consecutive (don't skip)
-        if len(indices_used) > 0:
-            if max(indices_used) + 1 != len(indices_used):
-                # Note: add more verbose error message
-                msg = "Input indices must be consecutive"
-                self.logger.error(msg)
-                raise PipelineError(msg)
+        # the graph has changed. only the new nodes and the variables they
+        # consume are affected
+        touched = set()
+        for node in new_nodes:
+            touched.update( self.graph.nodes[node]['args'] )
+            touched.update( self.graph.nodes[node]['outputs'] )
+        self._invalidate(nodes=new_nodes, vars=touched)
 
         # log the current pipeline status
         msg = "{} tasks set up; process arguments are ({})".format(len(tasks), ', '.join(self.args))
@@ -388,7 +376,7 @@ class Pipeline(object):
 
         if predict_compatibility:
             # check to make sure there are compatible types
-            for var in self.vars.keys():
+            for var in sorted(touched):
                 # check if there are compatible types
                 if self.get_types_for(var) == tuple():
                     msg = "PREDICTED INCOMPATIBILITY : no compatible types for '%s'" % var
@@ -399,77 +387,540 @@ class Pipeline(object):
                     self.logger.warning(msg)
 
     ############################################################################
-    def process(self, *pos_data, fetch=None, skip_enforcement=False, **kwdata):
+    def replace_task(self, outputs, task):
+        """replaces the task that computes the given variables with a new one,
+        which computes the same variables. Only the replaced task and the
+        variables it consumes are visited
+
+        Args:
+            outputs(str,tuple): the variable, or tuple of every variable,
+                computed by the task to replace. This is identical to the key
+                used for the task in the task dictionary
+            task(tuple,:obj:`Block`): the new task, a block followed by the
+                names of the variables it consumes
+
+        Example:
+            >>> pipeline.replace_task('blurred', (ip.blockify()(blur), 'image'))
+        """
+        node = self._get_task_node(outputs)
+        if not isinstance(task, (tuple,list)):
+            task = (task,)
+        block, args = task[0], tuple(task[1:])
+
+        if not isinstance(block, Block):
+            raise TypeError("first value in any graph definition tuple must be a Block")
+        if isinstance(block, Input) or isinstance(self.graph.nodes[node]['block'], Input):
+            msg = "Inputs cannot be replaced, see `Pipeline.assign_input_index`"
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        attrs = self.graph.nodes[node]
+        for arg in args:
+            if arg not in self.vars:
+                msg = "'%s' is not a variable in this pipeline" % arg
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            # the new task can't consume its own outputs
+            src = self.vars[arg]['block_node_id']
+            if (src == node) or self.reachability.is_ancestor(node, src):
+                msg = "replacing '{}' would create a cycle through '{}'".format(
+                                                    ', '.join(attrs['outputs']), arg)
+                self.logger.error(msg)
+                raise PipelineError(msg)
+
+        block.check_setup(args)
+        block._compile_validators()
+
+        touched = set(attrs['args']).union(args).union(attrs['outputs'])
+        # swap the block and redraw its inputs
+        self.graph.remove_edges_from( list(self.graph.in_edges(node, keys=True)) )
+        attrs.update( block.get_default_node_attrs() )
+        attrs['block'] = block
+        attrs['args'] = args
+        for output in attrs['outputs']:
+            self.vars[output]['block'] = block
+        self._draw_in_edges(node)
+
+        # tasks that only fed the old task may need leaves now
+        for src in self._source_nodes(touched.difference(args)):
+            self._draw_leaves(src)
+
+        self._invalidate(nodes=(node,), vars=touched)
+        self.logger.info("replaced the task for ({})".format(', '.join(attrs['outputs'])))
+
+    ############################################################################
+    def remove_task(self, outputs):
+        """removes the task that computes the given variables. The variables
+        can't be consumed by any other tasks. If the task is an Input, the
+        indices of the remaining indexed inputs are shifted down to fill the
+        gap. Only the removed task and its neighbors are visited
+
+        Args:
+            outputs(str,tuple): the variable, or tuple of every variable,
+                computed by the task to remove. This is identical to the key
+                used for the task in the task dictionary
+        """
+        node = self._get_task_node(outputs)
+        attrs = self.graph.nodes[node]
+
+        # make sure nothing else needs this task
+        dependents = set()
+        leaves = []
+        for _,node_b in self.graph.out_edges(node):
+            if isinstance(self.graph.nodes[node_b]['block'], Leaf):
+                leaves.append(node_b)
+            else:
+                dependents.update( self.graph.nodes[node_b]['outputs'] )
+        if dependents:
+            msg = "cannot remove the task for ({}), it's required to compute {}"
+            msg = msg.format(', '.join(attrs['outputs']), ', '.join(sorted(dependents)))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        # remove the task and its leaves
+        block = attrs['block']
+        args = attrs['args']
+        outputs = attrs['outputs']
+        self.graph.remove_nodes_from(leaves + [node])
+        for output in outputs:
+            del self.vars[output]
+
+        if isinstance(block, Input):
+            del self._inputs[outputs[0]]
+            # keep the indices consecutive
+            if isinstance(block.index, int):
+                for inpt in self._inputs.values():
+                    if isinstance(inpt.index, int) and (inpt.index > block.index):
+                        inpt.set_index(inpt.index - 1)
+            self._sort_inputs()
+
+        # tasks that only fed this task need leaves now
+        for src in self._source_nodes(args):
+            self._draw_leaves(src)
+
+        self._invalidate(nodes=[node] + leaves, vars=set(args).union(outputs))
+        self.logger.info("removed the task for ({})".format(', '.join(outputs)))
+
+    ############################################################################
+    def process(self,
+                    *pos_data,
+                    fetch=None,
+                    skip_enforcement=False,
+                    executor="serial",
+                    max_workers=None,
+                    profile=False,
+                    trace=None,
+                    **kwdata):
         """processes input data through the pipeline
 
         process first resets this pipeline, before loading input data into the
         graph and processing it.
 
-        Note:
-            The argument list for the Pipeline can be found with `Pipeline.args`
+        Args:
+            *pos_data: data for the indexed inputs of the pipeline
+            fetch(:obj:`list` of :obj:`str`,None): variables to return, all
+                variables are returned if left as None. Only the blocks
+                required to compute the fetched variables are run, and
+                variables that aren't fetched are released as soon as every
+                block that needs them has run
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in every block. defaults to False
+            executor(str): how to run the graph. "serial" runs one block at
+                a time, "threads" runs independent branches of the graph
+                concurrently in a thread pool and "processes" runs them in a
+                pool of persistent worker processes (see `Pipeline.pool_stats`
+                and `Pipeline.shutdown`). defaults to "serial"
+            max_workers(int,None): maximum number of workers for parallel
+                executors. defaults to None
+            profile(bool,int): whether or not to measure the time spent in
+                every block, see `Pipeline.profile_report`. If an integer N,
+                then only 1 in every N calls is profiled so profiling can be
+                left on in production. defaults to False
+            trace(str,None): if provided, a timeline of when every block ran
+                and in which process and thread is saved to this file. It's a
+                Chrome Trace Event Format JSON file which can be opened in
+                `chrome://tracing` or https://ui.perfetto.dev. defaults to None
+            **kwdata: data for the keyword inputs of the pipeline
+
+        Returns:
+            dict: the fetched variable names and their data
 
-            MUST ADD FETCHES DOCUMENTATIONS
+        Note:
+            The argument list for the Pipeline can be found with `Pipeline.args`.
+            Pipelines with coroutine blocks must be run with `Pipeline.aprocess`
+            inside of a running event loop
+
+        Example:
+            >>> pipeline.process(images, profile=True)
+            >>> print(pipeline.profile_report)
+            >>> # save a timeline to view in chrome://tracing
+            >>> pipeline.process(images, executor="threads", trace="trace.json")
         """
         # reset all leftover data in this graph
         self.clear()
 
-        # setup fetches
+        # setup fetches and the plan that only computes them
         if fetch is None:
             fetch = self.vars.keys()
+        fetch = tuple(fetch)
+        plan = self._get_plan(fetch)
 
         # --------------------------------------------------------------
         # STORING INPUTS - inside the input nodes
         # --------------------------------------------------------------
-        all_inputs = self.args
-        # store positonal arguments fed in
-        ## NOTE: need error checking here (number of inputs, etc)
-        for i,data in enumerate(pos_data):
-            inpt = self._inputs[ all_inputs[i] ]
-            # check if the data has already been loaded
-            if inpt.loaded:
-                msg = "'%s' has already been loaded" % self.indexed_inputs[i]
-                self.logger.error(msg)
-                raise PipelineError(msg)
-            inpt.load(data)
+        self._load_inputs(pos_data, kwdata)
 
-        # store keyword arguments fed in
-        ## NOTE: need error checking here (number of inputs, etc)
-        for key, val in kwdata.items():
-            inpt = self._inputs[key]
-            # check if the data has already been loaded
-            if inpt.loaded:
-                msg = "'%s' has already been loaded" % key
-                self.logger.error(msg)
-                raise PipelineError(msg)
-            inpt.load(val)
-
-        # check to make sure all inputs are loaded
-        data_loaded = True
-        for key,inpt in self._inputs.items():
-            if not inpt.loaded:
-                msg = "data for \"%s\" must be provided" % key
-                self.logger.error(msg)
-                data_loaded = False
-
-        if not data_loaded:
-            raise PipelineError("insufficient input data provided")
+        # load any available checkpoints instead of computing their tasks
+        plan, restored, to_save = self._restore_checkpoints(plan, fetch)
 
         # --------------------------------------------------------------
         # PROCESS
         # --------------------------------------------------------------
-        self._compute(skip_enforcement)
+        profiler = self._get_profiler(profile)
+        tracer = None if (trace is None) else TraceRecorder(self.id)
+        start = time.perf_counter()
+        try:
+            results = self._compute(plan,
+                                    skip_enforcement,
+                                    executor,
+                                    max_workers,
+                                    keep=fetch + tuple(to_save),
+                                    restored=restored,
+                                    profiler=profiler,
+                                    tracer=tracer)
+        finally:
+            # a partial trace is still useful if a block failed
+            if tracer is not None:
+                tracer.save(trace)
+        if profiler is not None:
+            profiler.wall += time.perf_counter() - start
+
+        self._save_checkpoints(results, to_save)
 
         # populate the output dictionary
-        fetch_dict = {}
-        for _,_,edge in self.graph.edges(data=True):
-            if edge['var_name'] in fetch:
-                fetch_dict[ edge['var_name'] ] = edge['data'].grab()
+        fetch_dict = {var : results[var].grab() for var in fetch}
 
         # clear the graph of data to reduce memory footprint
         self.clear()
 
         return fetch_dict
 
+    ############################################################################
+    def reprocess(self,
+                    fetch=None,
+                    skip_enforcement=False,
+                    executor="serial",
+                    max_workers=None,
+                    **changed_inputs):
+        """incrementally processes the pipeline, only recomputing the variables
+        which depend on the inputs that changed since the last call
+
+        The data for every variable is retained between calls. Only tasks
+        downstream of the changed inputs are run, and every one of their
+        outputs is recomputed. Everything else is served from the retained
+        data. This is
+        intended for interactive tuning, where only one input changes at a
+        time.
+
+        Note:
+            Every input must be provided the first time `reprocess` is called.
+            The retained data is discarded when the graph changes, or by
+            `Pipeline.clear_retained`
+
+        Args:
+            fetch(:obj:`list` of :obj:`str`,None): variables to return, all
+                variables are returned if left as None. Every variable that
+                depends on a changed input is recomputed regardless
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in every block. defaults to False
+            executor(str): how to run the graph, see `Pipeline.process`.
+                defaults to "serial"
+            max_workers(int,None): maximum number of workers for parallel
+                executors. defaults to None
+            **changed_inputs: new data for the inputs that changed, keyed by
+                input name
+
+        Returns:
+            dict: the fetched variable names and their data
+
+        Example:
+            >>> pipeline.reprocess(image=image, threshold=0.5)
+            >>> # only the tasks downstream of 'threshold' are run again
+            >>> pipeline.reprocess(threshold=0.6)
+        """
+        if fetch is None:
+            fetch = self.vars.keys()
+        fetch = tuple(fetch)
+
+        unknown = [var for var in fetch if var not in self.vars]
+        if unknown:
+            msg = "cannot fetch unknown variables: {}".format(', '.join(unknown))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        for name in changed_inputs:
+            if name not in self._inputs:
+                msg = "'%s' is not an input of this pipeline" % name
+                self.logger.error(msg)
+                raise PipelineError(msg)
+
+        # find the variables which must be recomputed
+        if self._retained is None:
+            missing = [name for name in self._inputs if name not in changed_inputs]
+            if missing:
+                msg = "every input must be provided the first time reprocess" \
+                        + " is called. missing: {}".format(', '.join(missing))
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            dirty = set(self.vars)
+        else:
+            # successors only follow edges, so they miss outputs that aren't
+            # consumed. every output of a downstream task is recomputed
+            downstream = set(changed_inputs)
+            for name in changed_inputs:
+                downstream.update( self.get_successors(name) )
+            nodes = set(self.vars[var]['block_node_id'] for var in downstream)
+            dirty = set()
+            for node in nodes:
+                dirty.update(self.graph.nodes[node]['outputs'])
+
+        if dirty:
+            self.clear()
+            for name,data in changed_inputs.items():
+                self._inputs[name].load(data)
+
+            # tasks upstream of the dirty tasks output the retained data
+            steps = self.execution_plan.steps
+            required = set(self.vars[var]['block_node_id'] for var in dirty)
+            restored = {}
+            for node in required:
+                for edge in steps[node].in_edges:
+                    src = self.vars[ edge['var_name'] ]['block_node_id']
+                    if (src not in required) and (src not in restored):
+                        restored[src] = tuple(self._retained[var] for var in steps[src].outputs)
+
+            plan = self._get_restored_plan(required, restored)
+            results = self._compute(plan,
+                                    skip_enforcement,
+                                    executor,
+                                    max_workers,
+                                    keep=dirty,
+                                    restored=restored)
+
+            retained = {} if (self._retained is None) else self._retained
+            retained.update( (var,data.grab()) for var,data in results.items() )
+            self._retained = retained
+            self.clear()
+
+        return {var : self._retained[var] for var in fetch}
+
+    ############################################################################
+    def clear_retained(self):
+        """discards the data retained by `Pipeline.reprocess`"""
+        self._retained = None
+
+    ############################################################################
+    def clear_profile(self):
+        """discards the measurements in `Pipeline.profile_report`"""
+        self.profile_report = None
+        self._n_profile_calls = 0
+
+    ############################################################################
+    async def aprocess(self,
+                        *pos_data,
+                        fetch=None,
+                        skip_enforcement=False,
+                        max_workers=None,
+                        **kwdata):
+        """coroutine which processes input data through the pipeline without
+        blocking the event loop
+
+        Blocks whose process function is a coroutine (`async def`) are awaited
+        in the event loop, so that I/O bound blocks overlap with each other.
+        All other blocks are offloaded to an executor. Independent branches of
+        the graph run concurrently.
+
+        Note:
+            The data for a run is stored in the pipeline's graph and Input
+            blocks, so concurrent calls on the same pipeline are serialized:
+            each call waits for the previous ones to finish. Use a copy of the
+            pipeline for each call that should run in parallel
+
+        Args:
+            *pos_data: data for the indexed inputs of the pipeline
+            fetch(:obj:`list` of :obj:`str`,None): variables to return, all
+                variables are returned if left as None
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in every block. defaults to False
+            max_workers(int,None): maximum number of threads to run
+                non-coroutine blocks with. If None, then they're run in the
+                event loop's default executor. defaults to None
+            **kwdata: data for the keyword inputs of the pipeline
+
+        Returns:
+            dict: the fetched variable names and their data
+
+        Example:
+            >>> fetched = await pipeline.aprocess(urls, fetch=['images'])
+        """
+        async with self._aprocess_lock():
+            # reset all leftover data in this graph
+            self.clear()
+
+            if fetch is None:
+                fetch = self.vars.keys()
+            fetch = tuple(fetch)
+            plan = self._get_plan(fetch)
+
+            self._load_inputs(pos_data, kwdata)
+            plan, restored, to_save = self._restore_checkpoints(plan, fetch)
+
+            scheduler = Scheduler(plan, fetch + tuple(to_save), restored=restored)
+            runner = AsyncExecutor(max_workers)
+            await runner.run(scheduler,
+                            lambda node_id: self._run_node(node_id, skip_enforcement),
+                            lambda node_id: self._arun_node(node_id, skip_enforcement))
+            self._check_finished(scheduler)
+            self._save_checkpoints(scheduler.results, to_save)
+
+            fetch_dict = {var : scheduler.results[var].grab() for var in fetch}
+
+            # clear the graph of data to reduce memory footprint
+            self.clear()
+
+        return fetch_dict
+
+    ############################################################################
+    def process_stream(self,
+                        *pos_iters,
+                        chunk_size=64,
+                        fetch=None,
+                        skip_enforcement=False,
+                        executor="serial",
+                        max_workers=None,
+                        **kw_iters):
+        """processes unbounded iterables through the pipeline in fixed-size
+        chunks, so that memory is bounded by the chunk size instead of by the
+        size of the dataset
+
+        Every input is fed with an iterable (e.g. a generator of images read
+        from disk or from a camera). `chunk_size` items are pulled from every
+        input at a time, processed, and the fetched variables for that chunk
+        are yielded before the next chunk is pulled.
+
+        Args:
+            *pos_iters: iterables for the indexed inputs of the pipeline
+            chunk_size(int): number of items to pull from every input for each
+                chunk. The final chunk may be smaller. defaults to 64
+            fetch(:obj:`list` of :obj:`str`,None): variables to return, all
+                variables are returned if left as None
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in every block. defaults to False
+            executor(str): how to run the graph, see `Pipeline.process`.
+                defaults to "serial"
+            max_workers(int,None): maximum number of workers for parallel
+                executors. defaults to None
+            **kw_iters: iterables for the keyword inputs of the pipeline
+
+        Returns:
+            generator: yields a dict of the fetched variable names and their
+                data for each chunk. The arguments are checked when
+                `process_stream` is called, before any chunk is pulled
+
+        Example:
+            >>> for fetched in pipeline.process_stream(image_generator(),
+            ...                                         chunk_size=32):
+            ...     save(fetched['processed'])
+        """
+        if not (isinstance(chunk_size, int) and chunk_size > 0):
+            msg = "chunk_size must be a positive integer, not %s" % chunk_size
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        if len(pos_iters) > len(self.args):
+            msg = "{} inputs provided, but the pipeline only takes {} ({})"
+            msg = msg.format(len(pos_iters), self.n_args, ', '.join(self.args))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        # pair every iterable with the name of the input it feeds
+        iterators = {name : iter(it) for name,it in zip(self.args, pos_iters)}
+        for name,it in kw_iters.items():
+            if name not in self._inputs:
+                msg = "'%s' is not an input of this pipeline" % name
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            if name in iterators:
+                msg = "'%s' has already been provided" % name
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            iterators[name] = iter(it)
+
+        if len(iterators) == 0:
+            msg = "at least one input iterable must be provided"
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        missing = [name for name in self._inputs if name not in iterators]
+        if missing:
+            msg = "input iterables must be provided for every input." \
+                    + " missing: {}".format(', '.join(missing))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        # raises for unknown fetches
+        if fetch is not None:
+            fetch = tuple(fetch)
+            self._get_plan(fetch)
+
+        return self._stream(iterators,
+                            chunk_size,
+                            fetch,
+                            skip_enforcement,
+                            executor,
+                            max_workers)
+
+    ############################################################################
+    def _stream(self,
+                iterators,
+                chunk_size,
+                fetch,
+                skip_enforcement,
+                executor,
+                max_workers):
+        """generator which pulls and processes chunks for `process_stream`
+
+        Args:
+            iterators(dict): iterators for every input, keyed by input name.
+                The other arguments are the same as `process_stream`
+
+        Yields:
+            dict: the fetched variable names and their data for each chunk
+        """
+        while True:
+            # pull the next chunk from every input
+            chunks = {name : list( itertools.islice(it, chunk_size) )
+                            for name,it in iterators.items()}
+
+            lengths = set( len(c) for c in chunks.values() )
+            # every input is exhausted
+            if lengths == {0}:
+                return
+
+            if len(lengths) != 1:
+                msg = "input iterables must all be the same length, but they" \
+                        + " ran out at different points ({})"
+                msg = msg.format(', '.join("{}={}".format(name,len(c))
+                                                for name,c in chunks.items()))
+                self.logger.error(msg)
+                raise PipelineError(msg)
+
+            yield self.process(fetch=fetch,
+                                skip_enforcement=skip_enforcement,
+                                executor=executor,
+                                max_workers=max_workers,
+                                **chunks)
+
     ############################################################################
     def asblock(self, *fetches):
         """generates a block that runs this pipeline internally
@@ -493,6 +944,74 @@ class Pipeline(object):
         for inpt in self._inputs.values():
             inpt.unload()
 
+    ############################################################################
+    def enable_checkpoints(self, directory, vars=None, max_bytes=None):
+        """saves variables to disk when they're computed, and loads them
+        instead of recomputing them in later runs.
+
+        Checkpoints are keyed by a fingerprint of the variable's upstream
+        graph: the content of the input data it depends on, and the class,
+        batch_type, process code and parameters of every block between them
+        (including the function and preset kwargs of blockified functions).
+        Changing a block's code, its parameters or the input data produces a
+        new fingerprint, so stale checkpoints are never loaded.
+
+        A task is loaded from checkpoints instead of being run when all of its
+        outputs have one, in which case none of the tasks upstream of it are
+        run either. Arrays are loaded as read-only memory maps.
+
+        Warning:
+            Block attributes which hold runtime state rather than parameters
+            must be listed in the block's `_RUNTIME_ATTRS`, otherwise new
+            instances won't match the saved checkpoints. Parameters modified
+            in place aren't detected, see the note on :obj:`Block`
+
+        Args:
+            directory(str): the directory to store checkpoints in. It can be
+                shared between pipelines and processes
+            vars(:obj:`list` of :obj:`str`,None): the variables to checkpoint.
+                defaults to every variable that isn't an input
+            max_bytes(int,None): maximum total size of the checkpoint
+                directory, the least recently used checkpoints are removed
+                once it's exceeded. defaults to None (unlimited)
+
+        Returns:
+            :obj:`CheckpointStore`: the checkpoint store
+        """
+        if vars is None:
+            vars = [var for var in self.vars if var not in self._inputs]
+
+        unknown = [var for var in vars if var not in self.vars]
+        if unknown:
+            msg = "cannot checkpoint unknown variables: {}".format(', '.join(unknown))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        inputs = [var for var in vars if var in self._inputs]
+        if inputs:
+            msg = "inputs cannot be checkpointed: {}".format(', '.join(inputs))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        self.checkpoints = CheckpointStore(directory, max_bytes)
+        self.checkpoint_vars = frozenset(vars)
+        return self.checkpoints
+
+    ############################################################################
+    def disable_checkpoints(self):
+        """stops saving and loading checkpoints. Existing checkpoint files are
+        left on disk"""
+        self.checkpoints = None
+        self.checkpoint_vars = frozenset()
+
+    ############################################################################
+    def shutdown(self):
+        """stops the worker processes used by the "processes" executor. They
+        will be restarted the next time they're needed"""
+        if self._process_executor is not None:
+            self._process_executor.shutdown()
+            self._process_executor = None
+
     ############################################################################
     def draw(self, show=True, ax=None):
         # visualize(self, show, ax)
@@ -504,6 +1023,10 @@ class Pipeline(object):
         """pickles and saves a copy of the  pipeline to the given filename.
         Pipeline can be optionally encrypted
 
+        The pipeline is pickled straight to the file in frames, so it's never
+        held in memory as a single buffer. The file is written next to
+        `filename` and moved into place once it's complete
+
         Args:
             filename(str): the filename to save the pickled pipeline to
             passwd(str): password to encrypt the pickled pipeline with if
@@ -514,10 +1037,15 @@ class Pipeline(object):
         Returns:
             str: the sha256 checksum for the saved file
         """
-        encoded, checksum = self.to_bytes(passwd, protocol)
-        # write the file contents
-        with open(filename, 'wb') as f:
-            f.write(encoded)
+        partial = filename + '.partial'
+        try:
+            with open(partial, 'wb') as f:
+                checksum = self._write(f, passwd, protocol)
+            os.replace(partial, filename)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
 
         return checksum
 
@@ -526,6 +1054,9 @@ class Pipeline(object):
     def load(cls, filename, passwd=None, checksum=None, name=None):
         """loads the pipeline from the given file
 
+        Files are read one frame at a time. Files saved by older versions of
+        imagepypelines are detected and read in full
+
         Args:
             filename(str): the filename to load the pickled pipeline from
             passwd(str): password to decrypt the pickled pipeline with, defaults
@@ -545,16 +1076,28 @@ class Pipeline(object):
             for more information about pickle security, see:
             https://docs.python.org/3.8/library/pickle.html
         """
-        # fetch the raw file contents
-        with open(filename,'rb') as f:
-            raw_bytes = f.read()
+        # check the whole file before anything is unpickled
+        if checksum:
+            fchecksum = file_checksum(filename)
+            if fchecksum != checksum:
+                msg = "'%s' checksum doesn't match" % filename
+                MASTER_LOGGER.error(msg)
+                raise PipelineError(msg)
 
-        return cls.from_bytes(raw_bytes, passwd, checksum, name)
+        with open(filename, 'rb') as f:
+            pipeline = cls._read(f, passwd)
+
+        # rename it if desired
+        if name is not None:
+            pipeline.rename(name)
+
+        return pipeline
 
     ############################################################################
     def to_bytes(self, passwd=None, protocol=pickle.HIGHEST_PROTOCOL):
         """pickles a copy of the pipeline, and returns the raw bytes. Can be
-        optionally encrypted
+        optionally encrypted. The bytes are identical in format to the
+        contents of a file written by `save`
 
         Args:
             passwd(str): password to encrypt the pickled pipeline with if
@@ -568,17 +1111,9 @@ class Pipeline(object):
                 bytes: the pickled and optionally encrypted pipeline
                 str: the sha256 checksum for the raw bytes
         """
-        # pickle the pipeline
-        raw_bytes = pickle.dumps(self.copy(), protocol=protocol)
-
-        # encrypt the pipeline if passwd is provided
-        if passwd:
-            fernet = Fernet( passgen(passwd) )
-            encoded = fernet.encrypt(raw_bytes)
-        else:
-            encoded = raw_bytes
-
-        return encoded, hashlib.sha256(encoded).hexdigest()
+        buffer = io.BytesIO()
+        checksum = self._write(buffer, passwd, protocol)
+        return buffer.getvalue(), checksum
 
     ############################################################################
     @staticmethod
@@ -604,23 +1139,15 @@ class Pipeline(object):
             for more information about pickle security, see:
             https://docs.python.org/3.8/library/pickle.html
         """
-        # check the file checksum if provided
+        # check the bytes checksum if provided
         if checksum:
             fchecksum = hashlib.sha256(raw_bytes).hexdigest()
             if fchecksum != checksum:
-                msg = "'%s'checksum doesn't match" % filename
+                msg = "pipeline bytes checksum doesn't match"
                 MASTER_LOGGER.error(msg)
-                PipelineError(msg)
-
-        # decrypt the file contents if passwd is provided
-        if passwd:
-            fernet = Fernet( passgen(passwd) )
-            decoded = fernet.decrypt(raw_bytes)
-        else:
-            decoded = raw_bytes
+                raise PipelineError(msg)
 
-        # load the pipeline
-        pipeline = pickle.loads(decoded)
+        pipeline = Pipeline._read(io.BytesIO(raw_bytes), passwd)
 
         # rename it if desired
         if name is not None:
@@ -628,6 +1155,40 @@ class Pipeline(object):
 
         return pipeline
 
+    ############################################################################
+    def _write(self, f, passwd, protocol):
+        """pickles a copy of the pipeline into a binary file object as a
+        series of frames, encrypted if a password is given
+
+        Returns:
+            str: the sha256 checksum of everything written
+        """
+        writer = FrameWriter(f, passwd)
+        pickle.dump(self.copy(), writer, protocol=protocol)
+        writer.close()
+        return writer.checksum
+
+    ############################################################################
+    @staticmethod
+    def _read(f, passwd):
+        """unpickles a pipeline from a binary file object, in either the framed
+        format or the legacy whole-buffer format"""
+        prefix = f.read( len(MAGIC) )
+        f.seek(0)
+
+        # legacy files are a raw pickle or a single Fernet token
+        if not is_framed(prefix):
+            raw_bytes = f.read()
+            if passwd:
+                fernet = Fernet( passgen(passwd) )
+                raw_bytes = fernet.decrypt(raw_bytes)
+            return pickle.loads(raw_bytes)
+
+        reader = FrameReader(f, passwd)
+        pipeline = pickle.load(reader)
+        reader.close()
+        return pipeline
+
     ############################################################################
     def copy(self, name=None):
         """returns a copy of the Pipeline, but not a copy of the blocks"""
@@ -664,43 +1225,605 @@ class Pipeline(object):
     ############################################################################
     #                               internal
     ############################################################################
-    def _compute(self, skip_enforcement=False):
-        """executes the graph tasks. Relies on Input data being preloaded"""
-        for node_a, node_b, edge_idx in self.execution_order:
-            # get actual objects instead of just graph ids
-            block_a = self.graph.nodes[node_a]['block']
-            block_b = self.graph.nodes[node_b]['block']
-            edge = self.graph.edges[node_a, node_b, edge_idx]
-
-            # check if node_a is a root node (no incoming edges)
-            # these nodes can be computed and the edge populated
-            # immmediately because they have no predecessors
-            # NOTE: this will currently break if a root has more than one
-            # output - JM
-            if self.graph.in_degree(node_a) == 0:
-                # no arg data is needed
-                # import pdb; pdb.set_trace()
-                edge['data'] = Data( block_a._pipeline_process(logger=self.logger, force_skip=skip_enforcement)[0] )
-
-            # compute this node if all the data is queued
-            in_edges = self.graph.in_edges(node_b, data=True)
-            if all((e[2]['data'] is not None) for e in in_edges):
-                # fetch input data for this node
-                in_edges = [e[2] for e in self.graph.in_edges(node_b, data=True)]
-                arg_data_dict = {e['in_index'] : e['data'] for e in in_edges}
-                args = [arg_data_dict[k] for k in sorted( arg_data_dict.keys() )]
-
-                # assign the task outputs to their appropriate edge
-                outputs = block_b._pipeline_process(*args,
-                                                        logger=self.logger,
-                                                        force_skip=skip_enforcement)
-                # populate upstream edges with the data we need
-                # get the output names
-                out_edges = [e[2] for e in self.graph.out_edges(node_b, data=True)]
-                # NEED ERROR CHECKING HERE
-                # (psuedo) if n_out == n_expected_out
-                for out_edge in out_edges:
-                    out_edge['data'] = Data( outputs[out_edge['out_index']] )
+    def _compute(self,
+                    plan,
+                    skip_enforcement=False,
+                    executor="serial",
+                    max_workers=None,
+                    keep=(),
+                    restored=None,
+                    profiler=None,
+                    tracer=None):
+        """executes the graph tasks. Relies on Input data being preloaded
+
+        Nodes are run as soon as all of their inputs are available, so every
+        block runs exactly once per call and its outputs are scattered to all
+        of its outgoing edges.
+
+        Args:
+            plan(:obj:`ExecutionPlan`): the plan to execute, either the full
+                execution plan or one pruned for a fetch
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in every block
+            executor(str): name of the executor to run the nodes with
+            max_workers(int,None): maximum number of workers for parallel
+                executors
+            keep(:obj:`iterable` of :obj:`str`): variables to return data for
+            restored(dict,None): outputs of nodes loaded from checkpoints,
+                keyed by node id
+            profiler(:obj:`ProfileReport`,None): report to add measurements
+                for every node to, nodes aren't profiled if None
+            tracer(:obj:`TraceRecorder`,None): recorder to add when every node
+                started and finished to, nodes aren't traced if None
+
+        Returns:
+            dict: the :obj:`Data` for every variable in keep
+        """
+        if executor == SerialExecutor.name:
+            self._check_no_event_loop(plan)
+
+        scheduler = Scheduler(plan, keep, restored=restored)
+        if executor == ProcessExecutor.name:
+            runner = self._get_process_executor(max_workers)
+        else:
+            runner = get_executor(executor, max_workers, self.logger)
+
+        runner.run(scheduler,
+                    lambda node_id: self._run_node(node_id,
+                                                    skip_enforcement,
+                                                    profiler,
+                                                    tracer),
+                    skip_enforcement,
+                    self.enforcement_sample,
+                    profiler,
+                    tracer)
+        self._check_finished(scheduler)
+        return scheduler.results
+
+    ############################################################################
+    def _aprocess_lock(self):
+        """fetches the lock which serializes `aprocess` calls in the running
+        event loop. asyncio locks can only be used in a single loop, so there
+        is one for every loop the pipeline is run in"""
+        loop = get_running_loop()
+        lock = self._aprocess_locks.get(loop, None)
+        if lock is None:
+            lock = self._aprocess_locks[loop] = asyncio.Lock()
+        return lock
+
+    ############################################################################
+    def _check_no_event_loop(self, plan):
+        """makes sure coroutine blocks won't be run inside of a running event
+        loop. The serial executor runs them in a new event loop in the calling
+        thread, which isn't possible if that thread is running a loop
+
+        Args:
+            plan(:obj:`ExecutionPlan`): the plan about to be executed
+
+        Raises:
+            PipelineError: if the plan has coroutine blocks and an event loop
+                is running in this thread
+        """
+        if get_running_loop() is None:
+            return
+
+        if any(step.block.is_coroutine for step in plan):
+            msg = "cannot run coroutine blocks with process() inside of a" \
+                    + " running event loop, use 'await pipeline.aprocess(...)'" \
+                    + " instead"
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+    ############################################################################
+    def _check_finished(self, scheduler):
+        """makes sure the executor ran every node in the plan
+
+        Args:
+            scheduler(:obj:`Scheduler`): the scheduler used for the run
+
+        Raises:
+            PipelineError: if any node didn't finish
+        """
+        if not scheduler.done:
+            msg = "the executor stopped after {} of {} tasks finished"
+            msg = msg.format(scheduler.n_finished, len(scheduler.plan))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+    ############################################################################
+    def _get_profiler(self, profile):
+        """fetches the report to add measurements to if this call should be
+        profiled
+
+        Args:
+            profile(bool,int): the profile argument to `Pipeline.process`
+
+        Returns:
+            :obj:`ProfileReport`: the report for this pipeline, None if this
+                call isn't profiled
+        """
+        if not profile:
+            return None
+
+        every = 1 if (profile is True) else int(profile)
+        self._n_profile_calls += 1
+        if (self._n_profile_calls - 1) % every != 0:
+            return None
+
+        if self.profile_report is None:
+            self.profile_report = ProfileReport()
+        self.profile_report.n_runs += 1
+        return self.profile_report
+
+    ############################################################################
+    def _get_plan(self, fetch):
+        """fetches the execution plan which only computes what is required for
+        the given fetch. Plans are cached per unique set of fetched variables
+
+        Args:
+            fetch(:obj:`iterable` of :obj:`str`): the variables to compute
+
+        Returns:
+            :obj:`ExecutionPlan`: plan for the minimal subgraph that computes
+                the fetched variables
+        """
+        key = frozenset(fetch)
+        if key in self._pruned_plans:
+            return self._pruned_plans[key]
+
+        unknown = [var for var in key if var not in self.vars]
+        if unknown:
+            msg = "cannot fetch unknown variables: {}".format(', '.join(unknown))
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        # every node that produces a fetch or one of its predecessors
+        required = set()
+        for var in key:
+            required.add( self.vars[var]['block_node_id'] )
+            for pred in self.get_predecessors(var):
+                required.add( self.vars[pred]['block_node_id'] )
+
+        # avoid compiling a separate plan if nothing can be pruned
+        if len(required) == len(self.execution_plan) - self._n_leaves():
+            plan = self.execution_plan
+        else:
+            plan = ExecutionPlan( self.graph.subgraph(required) )
+
+        self._pruned_plans[key] = plan
+        if len(self._pruned_plans) > MAX_CACHED_PLANS:
+            self._pruned_plans.popitem(last=False)
+        return plan
+
+    ############################################################################
+    def _restore_checkpoints(self, plan, fetch):
+        """loads the checkpoints needed to compute the fetch, and prunes the
+        tasks that no longer need to run from the plan. Relies on Input data
+        being preloaded
+
+        Args:
+            plan(:obj:`ExecutionPlan`): the plan for the fetch
+            fetch(:obj:`tuple` of :obj:`str`): the variables to compute
+
+        Returns:
+            (tuple): tuple containing:
+
+                :obj:`ExecutionPlan`: the plan with restored tasks as roots
+                dict: outputs of the restored tasks, keyed by node id
+                dict: fingerprints of the variables to save once computed
+        """
+        if self.checkpoints is None:
+            return plan, {}, {}
+
+        fingerprints = self._fingerprint_vars(plan)
+
+        # walk upstream from the fetches, stopping at restorable tasks
+        restored = {}
+        required = set()
+        stack = [self.vars[var]['block_node_id'] for var in fetch]
+        while stack:
+            node = stack.pop()
+            if (node in required) or (node in restored):
+                continue
+
+            step = plan.steps[node]
+            outputs = self._load_checkpoint(step, fingerprints)
+            if outputs is not None:
+                restored[node] = outputs
+                continue
+
+            required.add(node)
+            stack.extend(self.vars[e['var_name']]['block_node_id'] for e in step.in_edges)
+
+        # checkpoint computed variables that haven't been saved yet
+        to_save = {}
+        for var in self.checkpoint_vars:
+            key = fingerprints.get(var, None)
+            if (key is None) or (self.vars[var]['block_node_id'] not in required):
+                continue
+            if key not in self.checkpoints:
+                to_save[var] = key
+
+        if restored:
+            plan = self._get_restored_plan(required, restored)
+        return plan, restored, to_save
+
+    ############################################################################
+    def _fingerprint_vars(self, plan):
+        """computes the fingerprint of every variable in the plan from the
+        content of the input data and the blocks upstream of it
+
+        Args:
+            plan(:obj:`ExecutionPlan`): the plan to fingerprint
+
+        Returns:
+            dict: hex fingerprints keyed by variable name. None for variables
+                that depend on data or blocks that can't be hashed
+        """
+        fingerprints = {}
+        for step in plan:
+            if isinstance(step.block, Leaf):
+                continue
+
+            h = new_hash()
+            try:
+                if isinstance(step.block, Input):
+                    update_hash(h, step.block.data)
+                else:
+                    step.block._update_fingerprint(h)
+                    for edge in step.in_edges:
+                        upstream = fingerprints[ edge['var_name'] ]
+                        if upstream is None:
+                            raise Unhashable(edge['var_name'])
+                        update_hash(h, upstream)
+            except Unhashable:
+                for var in step.outputs:
+                    fingerprints[var] = None
+                continue
+
+            for idx,var in enumerate(step.outputs):
+                out_h = h.copy()
+                update_hash(out_h, idx)
+                fingerprints[var] = out_h.hexdigest()
+
+        return fingerprints
+
+    ############################################################################
+    def _load_checkpoint(self, step, fingerprints):
+        """loads the outputs of a task from its checkpoints
+
+        Returns:
+            tuple: the task outputs, or None if any of them don't have a
+                checkpoint
+        """
+        if isinstance(step.block, Input) or (not step.outputs):
+            return None
+
+        keys = [fingerprints.get(var, None) for var in step.outputs]
+        if not all(var in self.checkpoint_vars for var in step.outputs):
+            return None
+        if not all((key is not None) and (key in self.checkpoints) for key in keys):
+            return None
+
+        try:
+            outputs = tuple(self.checkpoints.load(key) for key in keys)
+        except KeyError:
+            # removed by the garbage collector in the meantime
+            return None
+
+        self.logger.debug("loaded {} from checkpoints".format(', '.join(step.outputs)))
+        return outputs
+
+    ############################################################################
+    def _save_checkpoints(self, results, to_save):
+        """saves computed variables to the checkpoint store
+
+        Args:
+            results(dict): the :obj:`Data` for the computed variables
+            to_save(dict): fingerprints of the variables to save
+        """
+        for var,key in to_save.items():
+            self.checkpoints.save(key, results[var].grab())
+            self.logger.debug("saved '{}' checkpoint".format(var))
+
+    ############################################################################
+    def _get_restored_plan(self, required, restored):
+        """fetches the plan that runs the required tasks, with restored tasks
+        as roots. Plans are cached per unique set of required and restored
+        tasks"""
+        key = (frozenset(required), frozenset(restored))
+        if key in self._pruned_plans:
+            return self._pruned_plans[key]
+
+        nodes = required.union(restored)
+        view = nx.subgraph_view(self.graph,
+                                filter_node=lambda n: n in nodes,
+                                # restored tasks don't need their inputs
+                                filter_edge=lambda a,b,k: b not in restored)
+        plan = ExecutionPlan(view)
+
+        self._pruned_plans[key] = plan
+        if len(self._pruned_plans) > MAX_CACHED_PLANS:
+            self._pruned_plans.popitem(last=False)
+        return plan
+
+    ############################################################################
+    def _n_leaves(self):
+        """returns the number of Leaf nodes in the graph"""
+        return sum(1 for step in self.execution_plan if isinstance(step.block, Leaf))
+
+    ############################################################################
+    def _run_node(self, node_id, skip_enforcement=False, profiler=None, tracer=None):
+        """processes a single node with the data on its incoming edges
+
+        Args:
+            node_id(str): id of the node in the graph to process
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in the block
+            profiler(:obj:`ProfileReport`,None): report to add measurements
+                for the node to, the node isn't profiled if None
+            tracer(:obj:`TraceRecorder`,None): recorder to add when the node
+                started and finished to, the node isn't traced if None
+
+        Returns:
+            (tuple): variable length tuple containing the block outputs
+        """
+        step = self.execution_plan.steps[node_id]
+        # incoming edges are already sorted by in_index
+        args = [e['data'] for e in step.in_edges]
+        kwargs = dict(logger=self.logger,
+                        force_skip=skip_enforcement,
+                        sample=self.enforcement_sample)
+
+        # Inputs and Leaves don't do any work worth measuring
+        if isinstance(step.block, (Input, Leaf)):
+            return step.block._pipeline_process(*args, **kwargs)
+
+        start = time.perf_counter()
+        if profiler is None:
+            outputs = step.block._pipeline_process(*args, **kwargs)
+        else:
+            outputs, stats = profile_node(step.block, args, **kwargs)
+            profiler.add(node_id, step.block, stats)
+
+        if tracer is not None:
+            n_items = args[0].n_items if args else 0
+            tracer.add(node_id, step.block, start, time.perf_counter(), n_items)
+        return outputs
+
+    ############################################################################
+    async def _arun_node(self, node_id, skip_enforcement=False):
+        """coroutine version of `_run_node` for coroutine blocks"""
+        step = self.execution_plan.steps[node_id]
+        args = [e['data'] for e in step.in_edges]
+        return await step.block._apipeline_process(*args,
+                                                    logger=self.logger,
+                                                    force_skip=skip_enforcement,
+                                                    sample=self.enforcement_sample)
+
+    ############################################################################
+    def _load_inputs(self, pos_data, kwdata):
+        """loads data into the Input blocks of the pipeline
+
+        Args:
+            pos_data(tuple): data for the indexed inputs
+            kwdata(dict): data for the keyword inputs
+        """
+        all_inputs = self.args
+        # store positonal arguments fed in
+        ## NOTE: need error checking here (number of inputs, etc)
+        for i,data in enumerate(pos_data):
+            inpt = self._inputs[ all_inputs[i] ]
+            # check if the data has already been loaded
+            if inpt.loaded:
+                msg = "'%s' has already been loaded" % self.indexed_inputs[i]
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            inpt.load(data)
+
+        # store keyword arguments fed in
+        ## NOTE: need error checking here (number of inputs, etc)
+        for key, val in kwdata.items():
+            inpt = self._inputs[key]
+            # check if the data has already been loaded
+            if inpt.loaded:
+                msg = "'%s' has already been loaded" % key
+                self.logger.error(msg)
+                raise PipelineError(msg)
+            inpt.load(val)
+
+        # check to make sure all inputs are loaded
+        data_loaded = True
+        for key,inpt in self._inputs.items():
+            if not inpt.loaded:
+                msg = "data for \"%s\" must be provided" % key
+                self.logger.error(msg)
+                data_loaded = False
+
+        if not data_loaded:
+            raise PipelineError("insufficient input data provided")
+
+    ############################################################################
+    def _get_process_executor(self, max_workers=None):
+        """fetches the persistent ProcessExecutor, starting a new one if it
+        doesn't exist yet or if it was started with a different max_workers"""
+        if self._process_executor is not None:
+            if self._process_executor.max_workers == max_workers:
+                return self._process_executor
+            self.shutdown()
+
+        self._process_executor = ProcessExecutor(self, max_workers)
+        return self._process_executor
+
+    ############################################################################
+    def _invalidate(self, nodes=None, vars=None):
+        """discards cached structures derived from the graph. Must be called
+        whenever the graph is modified
+
+        Args:
+            nodes(:obj:`iterable` of :obj:`str`,None): ids of the nodes which
+                were added, removed or replaced. Only the cached plans which
+                run one of them are discarded. If None, then everything
+                derived from the graph is discarded. defaults to None
+            vars(:obj:`iterable` of :obj:`str`,None): variables whose producer
+                or consumers changed, which have their cached compatibility
+                analysis discarded. Ignored if nodes is None. defaults to None
+        """
+        # the full plan and reachability always include every node
+        self._plan = None
+        self._reachability = None
+        if nodes is None:
+            self._pruned_plans = OrderedDict()
+            self._consumers = {}
+            self._compat_cache = {}
+        else:
+            nodes = set(nodes)
+            for key,plan in list(self._pruned_plans.items()):
+                if any(node in plan.steps for node in nodes):
+                    del self._pruned_plans[key]
+
+            for var in (vars or ()):
+                self._consumers.pop(var, None)
+                for kind in ('types', 'shapes', 'containers'):
+                    self._compat_cache.pop((kind,var), None)
+
+        # retained data may not match the new graph
+        self._retained = None
+        # workers have a copy of the old graph
+        self.shutdown()
+
+    ############################################################################
+    def _get_task_node(self, outputs):
+        """fetches the id of the node for the task that computes exactly the
+        given variables"""
+        if not isinstance(outputs, (tuple,list)):
+            outputs = (outputs,)
+        outputs = tuple(outputs)
+
+        if outputs and (outputs[0] in self.vars):
+            node = self.vars[ outputs[0] ]['block_node_id']
+            if tuple(self.graph.nodes[node]['outputs']) == outputs:
+                return node
+
+        msg = "no task computes exactly ({})".format(', '.join(outputs))
+        self.logger.error(msg)
+        raise PipelineError(msg)
+
+    ############################################################################
+    def _source_nodes(self, vars):
+        """returns the ids of the nodes that compute the given variables"""
+        return set(self.vars[var]['block_node_id'] for var in vars if var in self.vars)
+
+    ############################################################################
+    def _draw_in_edges(self, node_b):
+        """draws an edge into the node for each of its task's arguments
+
+        Args:
+            node_b(str): id of the node to draw the edges into
+        """
+        node_b_attrs = self.graph.nodes[node_b]
+        for in_index, arg_name in enumerate(node_b_attrs['args']):
+            # first we identify an upstream node by looking up what task
+            # created them
+            node_a = self.vars[arg_name]['block_node_id']
+            node_a_attrs = self.graph.nodes[ node_a ]
+
+            # draw the edge FOR THIS INPUT from node_a to node_b
+            block_arg_name = node_b_attrs['block'].args[in_index]
+            out_index = node_a_attrs['outputs'].index(arg_name)
+
+            # edge key is {var_name}:{out_index}-->{in_index}
+            edge_key = "{}:{}-->{}".format(arg_name, out_index, in_index)
+
+            # draw the edge if it doesn't already exist
+            if not self.graph.has_edge(node_a,node_b,edge_key):
+                self.graph.add_edge(node_a,
+                                    node_b,
+                                    # key
+                                    key=edge_key,
+                                    # attributes
+                                    var_name = arg_name, # name assigned in graph definition
+                                    out_index = out_index,
+                                    in_index = in_index,
+                                    name = block_arg_name, # name of node_b's process argument at the index
+                                    data = None, # none is a placeholder value. it will be populated
+                                    )
+
+    ############################################################################
+    def _draw_leaves(self, node):
+        """draws a leaf for each output of the node if it doesn't have any
+        outgoing edges, so that its outputs can still be computed
+
+        Args:
+            node(str): id of the node to check
+        """
+        node_attrs = self.graph.nodes[node]
+        # if the node already has outputs, we don't need a leaf out of it
+        # if the end node is a Leaf already, then we don't need another leaf
+        if (self.graph.out_degree(node) > 0) or isinstance(node_attrs['block'], Leaf):
+            return
+
+        # this is a final node of the pipeline, so we need to draw a
+        # leaf for each of its output edges
+        for i,end_name in enumerate(node_attrs['outputs']):
+            # add the leaf
+            leaf = Leaf(end_name)
+            leaf_uuid = leaf.name + uuid4().hex + '-node'
+            self.graph.add_node(leaf_uuid,
+                                block=leaf,
+                                args=(end_name,),
+                                outputs=(end_name,),
+                                **leaf.get_default_node_attrs()
+                                )
+
+            # edge key is {var_name}:{out_index}-->{in_index}
+            edge_key = "{}:{}-->{}".format(end_name, i, 0)
+            # draw the edge to the leaf
+            # no need to check if it exists, because we just created the Leaf
+            self.graph.add_edge(node,
+                                leaf_uuid,
+                                var_name=end_name, # name assigned in graph definition
+                                out_index=i,
+                                in_index=0,
+                                name=end_name, # name of node_b's process argument at the index
+                                data=None)
+
+    ############################################################################
+    def _sort_inputs(self):
+        """sorts the inputs into the indexed and keyword process arguments and
+        checks that the indices are valid"""
+        # reset old index tracking lists
+        self.indexed_inputs = []
+        self.keyword_inputs = []
+        # sort the inputs into keyword and indexed
+        for inpt_name, inpt in self._inputs.items():
+            # check if the input index is defined
+            if isinstance(inpt.index,int):
+                self.indexed_inputs.append(inpt_name)
+            else:
+                self.keyword_inputs.append(inpt_name)
+
+        # sort the positonal inputs by index
+        self.indexed_inputs.sort(key=lambda x: self._inputs[x].index)
+        # sort keyword only inputs alphabetically
+        self.keyword_inputs.sort()
+
+
+        # check to make sure an input index isn't defined twice
+        indices_used = [self._inputs[x].index for x in self.indexed_inputs]
+        if len(set(indices_used)) != len(indices_used):
+            # Note: add more verbose error message
+            msg = "Input indices cannot be reused"
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        # check to make sure input indexes are consecutive (don't skip)
+        if len(indices_used) > 0:
+            if max(indices_used) + 1 != len(indices_used):
+                # Note: add more verbose error message
+                msg = "Input indices must be consecutive"
+                self.logger.error(msg)
+                raise PipelineError(msg)
 
 
     ############################################################################
@@ -729,6 +1852,10 @@ class Pipeline(object):
         """fetches the names of the variables which must be computed/loaded
         before the given variable can be computed.
 
+        These are all of the variables consumed by the task that computes the
+        variable, or by any task upstream of it. The answer is looked up in a
+        cached reachability index, which is rebuilt when the graph changes
+
         Args:
             var(str): name of variable to find predecessors for
 
@@ -736,29 +1863,21 @@ class Pipeline(object):
             set: an unordered set of the variables that must be computed before
                 the given variable can be calculated.
         """
-        # NOTE: we could possibly speed this function up by using a depth
-        # finding algorithm instead?
-        # define a recursive function to get edges from all predecessor nodes
-        preds = set()
-        nodes_checked = set()
-        def _get_priors(node):
-            for node_a,node_b,var_name in self.graph.in_edges(node,'var_name'):
-                preds.add(var_name)
-                # recursively add edges from the source node
-                if node_a not in nodes_checked:
-                    _get_priors(node_a)
-
-            nodes_checked.add(node)
-
-        _get_priors(self.vars[var]['block_node_id'])
-
-        return preds
+        node = self.vars[var]['block_node_id']
+        return set( self.reachability.predecessors(node) )
 
     ############################################################################
     def get_successors(self, var):
         """fetches the names of the variables which depend on this variable
         before they can be computed
 
+        These are the variables on the graph edges downstream of the task that
+        computes the variable, which includes the other outputs of that task
+        when another task consumes them. An output of a multi-output task that
+        no task consumes has no edge, so it's never a successor even though
+        it's recomputed along with its task. The answer is looked up in a
+        cached reachability index, which is rebuilt when the graph changes
+
         Args:
             var(str): name of variable to find successors for
 
@@ -766,24 +1885,10 @@ class Pipeline(object):
             set: an unordered set of the variables that can only be computed
                 once the given variable has been
         """
-        # NOTE: we could possibly speed this function up by using a depth
-        # finding algorithm instead?
-        # define a recursive function to get edges from all successor nodes
-        succs = set()
-        nodes_checked = set()
-        def _get_latters(node):
-            for node_a,node_b,var_name in self.graph.out_edges(node,'var_name'):
-                succs.add(var_name)
-                # recursively add edges from the source node
-                if node_b not in nodes_checked:
-                    _get_latters(node_b)
-
-            nodes_checked.add(node)
-
-        _get_latters(self.vars[var]['block_node_id'])
-
+        node = self.vars[var]['block_node_id']
+        succs = set( self.reachability.successors(node) )
         # remove the name of the variable
-        succs.remove(var)
+        succs.discard(var)
         return succs
 
     ############################################################################
@@ -791,7 +1896,8 @@ class Pipeline(object):
         """fetches the enforced types for this variable of the pipeline.
 
         More specifically, these are the types that won't throw an error
-        within the block
+        within the block. The result is cached until the graph or the
+        enforcement settings of the consuming blocks change
 
         Args:
             var(str): the name of the variable
@@ -822,18 +1928,10 @@ class Pipeline(object):
                 return tuple( okay_types )
         # END INTERNAL HELPER FUNC
 
-        # Iterate through pipeline args and compute the dominant type
-        dom_types = None
-        # fetch the node that produced the variable
-        source_node = self.vars[var]['block_node_id']
-        # iterate through all nodes it's connected to and fetch their types
-        for _,node_b,edge in self.graph.out_edges(source_node, data=True):
-            # only if this out edge is for the given var
-            if (edge['var_name'] == var):
-                # fetch target block object
-                target = self.graph.nodes[node_b]['block']
-                # fetch the actual name of the argument in the target's process function
-                target_arg = target.args[ edge['in_index'] ]
+        def _compute(consumers):
+            # Iterate through the consumers and compute the dominant type
+            dom_types = None
+            for target,target_arg in consumers:
                 # skip updating this target if its enforcement is disabled
                 if target.skip_enforcement:
                     continue
@@ -843,102 +1941,103 @@ class Pipeline(object):
                                             target.types.get(target_arg, None),
                                             dom_types
                                             )
+            return dom_types
 
-        return dom_types
+        return self._get_compatibility('types', var, _compute)
 
     ############################################################################
     def get_shapes_for(self, var):
         """fetches the enforced shapes for the given variable
 
         More specifically, these are the shapes that won't throw an
-        error within the block
+        error within the block. The result is cached until the graph or the
+        enforcement settings of the consuming blocks change
 
         Args:
             var(str): the name of the variable
 
         Returns:
             (:obj:`tuple` of :obj:`tuple`): the shapes enforced for
-        the given variable
+        the given variable. None if no shapes are enforced, and an empty tuple
+        if there are no compatible shapes
         """
-        # INTERNAL HELPER FUNCTION
+        # INTERNAL HELPER FUNCTIONS
         def _dominant_shape(shape1, shape2):
-            """determines which shape is dominant between shapes, or calculates
-            the new compatible shape if it's required."""
-            # if either shape is None, then the other automatically supercedes
-            if shape1 is None:
-                return shape2
-            elif shape2 is None:
-                return shape1
-            # both must lists or tuples
-            else:
-                # if the ndim aren't the same, then there is no compatible shape
-                if len(shape1) != len(shape2):
-                    return tuple()
-
-                new_shape = []
-                # other we have to iterate through and find the dominant axes
-                for ax1,ax2 in zip(shape1,shape2):
-                    # if one axis is None, then the other is dominant
-                    if ax1 is None:
-                        new_shape.append(ax2)
-                    elif ax2 is None:
-                        new_shape.append(ax1)
-                    # both must be integers
-                    else:
-                        if ax1 == ax2:
-                            # if both axial lengths are identical, then we
-                            # can append either to the new shape
-                            new_shape.append(ax1)
-                        else:
-                            # if the axial lengths aren't identical, there is
-                            # no compatible axis and thus no compatible shape
-                            # so we return an empty shape
-                            return tuple()
-
-                return new_shape
-        # END INTERNAL HELPER FUNC
-
-        dom_shapes = (None,)
-        # fetch the node that produced the variable
-        source_node = self.vars[var]['block_node_id']
-        # iterate through all nodes it's connected to and fetch their types
-        for _,node_b,edge in self.graph.out_edges(source_node, data=True):
-            # only if this out edge is for the given var
-            if (edge['var_name'] == var):
-                # fetch target block object
-                target = self.graph.nodes[node_b]['block']
-                # fetch the actual name of the argument in the target's process function
-                target_arg = target.args[ edge['in_index'] ]
+            """calculates the most general shape compatible with both shapes,
+            or None if there is no compatible shape"""
+            # if the ndim aren't the same, then there is no compatible shape
+            if len(shape1) != len(shape2):
+                return None
+
+            new_shape = []
+            # other we have to iterate through and find the dominant axes
+            for ax1,ax2 in zip(shape1,shape2):
+                # if one axis is None, then the other is dominant
+                if ax1 is None:
+                    new_shape.append(ax2)
+                elif ax2 is None:
+                    new_shape.append(ax1)
+                # if the axial lengths aren't identical, there is no
+                # compatible axis and thus no compatible shape
+                elif ax1 != ax2:
+                    return None
+                else:
+                    new_shape.append(ax1)
+
+            return tuple(new_shape)
+
+        def _most_general(shapes):
+            """removes shapes that are already covered by a more general shape,
+            this keeps the set of dominant shapes from growing with every
+            consumer"""
+            def _covers(general, specific):
+                return (general != specific) \
+                        and (len(general) == len(specific)) \
+                        and all((g is None) or (g == s) for g,s in zip(general,specific))
+
+            return set(s for s in shapes \
+                        if not any(_covers(other, s) for other in shapes))
+        # END INTERNAL HELPER FUNCS
+
+        def _compute(consumers):
+            # None means that every shape is acceptable
+            dom_shapes = None
+            for target,target_arg in consumers:
                 # skip updating this target if its enforcement is disabled
                 if target.skip_enforcement:
                     continue
                 # fetch target shapes
                 target_shapes = target.shapes.get(target_arg, None)
-                # make target shapes an 1 elem iterable if it's None
-                target_shapes = (None,) if target_shapes is None else target_shapes
-                # calculate all possible shape permutations
-                all_possible = itertools.product(
-                                                set(target_shapes),
-                                                set(dom_shapes)
-                                                )
+                if (target_shapes is None) or any((s is None) for s in target_shapes):
+                    continue
+                target_shapes = set(tuple(s) for s in target_shapes)
+
+                if dom_shapes is None:
+                    dom_shapes = _most_general(target_shapes)
+                    continue
 
-                # check every possible combination
-                all_workable = []
-                for shape1,shape2 in all_possible:
-                    all_workable.append( _dominant_shape(shape1, shape2) )
+                # merge every dominant shape with the target's shapes
+                merged = set()
+                for shape1 in dom_shapes:
+                    for shape2 in target_shapes:
+                        shape = _dominant_shape(shape1, shape2)
+                        if shape is not None:
+                            merged.add(shape)
+                dom_shapes = _most_general(merged)
 
-                # remove empty tuples (i.e. incompatible shapes)
-                dom_shapes = tuple(s for s in all_workable if s != tuple())
-                #update the dominant type
+            if dom_shapes is None:
+                return None
+            return tuple( sorted(dom_shapes, key=repr) )
 
-            return dom_shapes
+        return self._get_compatibility('shapes', var, _compute)
 
     ############################################################################
     def get_containers_for(self, var):
         """fetches the enforced containers for this variable of the pipeline.
 
         More specifically, these are the containers that won't throw an error
-        within the block
+        within the block. The result is cached until the graph or the
+        enforcement settings of the consuming blocks change
 
         Args:
             var(str): the name of the variable
@@ -969,18 +2068,10 @@ class Pipeline(object):
                 return tuple( okay_containers )
         # END INTERNAL HELPER FUNC
 
-        # Iterate through pipeline args and compute the dominant container
-        dom_containers = None
-        # fetch the node that produced the variable
-        source_node = self.vars[var]['block_node_id']
-        # iterate through all nodes it's connected to and fetch their containers
-        for _,node_b,edge in self.graph.out_edges(source_node, data=True):
-            # only if this out edge is for the given var
-            if (edge['var_name'] == var):
-                # fetch target block object
-                target = self.graph.nodes[node_b]['block']
-                # fetch the actual name of the argument in the target's process function
-                target_arg = target.args[ edge['in_index'] ]
+        def _compute(consumers):
+            # Iterate through the consumers and compute the dominant container
+            dom_containers = None
+            for target,target_arg in consumers:
                 # skip updating this target if its enforcement is disabled
                 if target.skip_enforcement:
                     continue
@@ -990,8 +2081,61 @@ class Pipeline(object):
                                             target.containers.get(target_arg, None),
                                             dom_containers
                                             )
+            return dom_containers
 
-        return dom_containers
+        return self._get_compatibility('containers', var, _compute)
+
+    ############################################################################
+    def _get_compatibility(self, kind, var, compute):
+        """fetches a cached compatibility analysis for the variable, or computes
+        it if the consumers of the variable have changed their enforcement
+        since it was cached
+
+        Args:
+            kind(str): the kind of analysis, 'types', 'shapes' or 'containers'
+            var(str): the name of the variable
+            compute(function): function which takes the consumers of the
+                variable as (block, arg_name) pairs and returns the analysis
+
+        Returns:
+            the result of `compute`
+        """
+        consumers = self._get_consumers(var)
+        # enforcement changes in any consumer invalidate the cached result
+        stamp = tuple((block._enforcement_version, block.skip_enforcement) \
+                            for block,_ in consumers)
+
+        cached = self._compat_cache.get((kind,var), None)
+        if (cached is not None) and (cached[0] == stamp):
+            return cached[1]
+
+        result = compute(consumers)
+        self._compat_cache[(kind,var)] = (stamp, result)
+        return result
+
+    ############################################################################
+    def _get_consumers(self, var):
+        """fetches the blocks that consume the variable and the names of the
+        arguments it's passed to, as (block, arg_name) pairs. These are cached
+        until the graph changes"""
+        if var not in self.vars:
+            msg = "'%s' is not a variable in this pipeline" % var
+            self.logger.error(msg)
+            raise PipelineError(msg)
+
+        if var not in self._consumers:
+            consumers = []
+            node = self.vars[var]['block_node_id']
+            for _,node_b,edge in self.graph.out_edges(node, data=True):
+                if edge['var_name'] != var:
+                    continue
+                target = self.graph.nodes[node_b]['block']
+                # the actual name of the argument in the target's process function
+                target_arg = target.args[ edge['in_index'] ]
+                consumers.append( (target,target_arg) )
+            self._consumers[var] = tuple(consumers)
+
+        return self._consumers[var]
 
     ############################################################################
     def get_vis(self):
@@ -1022,13 +2166,14 @@ class Pipeline(object):
         vis['BLOCKS'] = {}
         for node_id,attrs in graph_copy.nodes(data=True):
             # add block summaries to the BLOCKS dict, with the node
-            vis['BLOCKS'][node_id] = attrs['block'].summary()
+            vis['BLOCKS'][node_id] = attrs['block']._summary()
             # delete the block from the copy bc it can't be jsonified
             del attrs['block']
 
-        # delete data in the edge dict
-        for _,_,edge_attrs in self.graph.edges(data=True):
-            del edge_attrs['data']
+        # delete data in the copy's edge dicts, the pipeline's own edges must
+        # keep their 'data' key
+        for _,_,edge_attrs in graph_copy.edges(data=True):
+            edge_attrs.pop('data', None)
 
         # jsonify the graph in node-link format. see:
         # https://networkx.github.io/documentation/stable/reference/readwrite/json_graph.html
@@ -1077,7 +2222,7 @@ class Pipeline(object):
         old_name = self.name
         self.name = name
         # reset the logger with the new id
-        self.logger = get_logger(self.id)
+        self.logger = track_logger(self, get_logger(self.id))
         # log the new name
         self.logger.warning("renamed from '%s' to '%s'" % (old_name, self.name))
         return self
@@ -1088,15 +2233,40 @@ class Pipeline(object):
     ############################################################################
     # COPYING & PICKLING
     def __getstate__(self):
-        return self.__dict__
+        state = self.__dict__.copy()
+        # plans hold references into the graph, so it's cheaper and safer
+        # to recompile them than to serialize them
+        state['_plan'] = None
+        state['_pruned_plans'] = OrderedDict()
+        state['_consumers'] = {}
+        state['_reachability'] = None
+        state['_compat_cache'] = {}
+        # worker processes belong to this pipeline only
+        state['_process_executor'] = None
+        # as does the data retained by reprocess
+        state['_retained'] = None
+        # locks can't be pickled, and copies are run independently
+        state['_aprocess_locks'] = None
+        # copies track the loggers they use themselves
+        state.pop('_logger_names', None)
+        return state
 
     ############################################################################
     def __setstate__(self, state):
         """resets the uuid in the event of a copy"""
         state['uuid'] = uuid4().hex
         self.__dict__.update(state)
+        # pipelines pickled before plans were cached won't have these
+        self._process_executor = None
+        self.__dict__.setdefault('checkpoints', None)
+        self.__dict__.setdefault('checkpoint_vars', frozenset())
+        self.__dict__.setdefault('enforcement_sample', None)
+        self.__dict__.setdefault('profile_report', None)
+        self.__dict__.setdefault('_n_profile_calls', 0)
+        self._aprocess_locks = weakref.WeakKeyDictionary()
+        self._invalidate()
         # updates the logger for the new state
-        self.logger = get_logger(self.id)
+        self.logger = track_logger(self, get_logger(self.id))
 
 
     ############################################################################
@@ -1113,11 +2283,51 @@ class Pipeline(object):
         """
         return "{}#{}".format(self.name,self.uuid[-UUID_ORDER:])
 
+    ############################################################################
+    @property
+    def execution_plan(self):
+        """:obj:`ExecutionPlan`: compiled execution plan for the graph. This is
+        built the first time it's needed and cached until the graph changes"""
+        if self._plan is None:
+            self._plan = ExecutionPlan(self.graph)
+        return self._plan
+
+    ############################################################################
+    @property
+    def reachability(self):
+        """:obj:`ReachabilityIndex`: index of which nodes and variables are
+        upstream or downstream of each other. This is built the first time
+        it's needed and cached until the graph changes"""
+        if self._reachability is None:
+            self._reachability = ReachabilityIndex(self.execution_plan)
+        return self._reachability
+
     ############################################################################
     @property
     def execution_order(self):
-        """:obj:`Generator`: topologically sorted edges of the pipeline"""
-        return nx.topological_sort( nx.line_graph(self.graph) )
+        """:obj:`tuple` of :obj:`tuple`: topologically sorted edges of the
+        pipeline in (node_a, node_b, key) form"""
+        return self.execution_plan.edges
+
+    ############################################################################
+    @property
+    def pool_stats(self):
+        """dict: seconds spent on serialization ('serialize', 'deserialize')
+        versus processing ('compute') by the "processes" executor since its
+        workers started, plus the total 'wall' time and number of tasks sent to
+        the workers ('n_tasks'). None if the workers aren't running"""
+        if self._process_executor is None:
+            return None
+        return dict(self._process_executor.stats)
+
+    ############################################################################
+    @property
+    def cache_stats(self):
+        """(obj:`dict` of str : dict): hit, miss and eviction statistics for
+        every block with caching enabled, keyed by block id. see
+        `Block.enable_cache`"""
+        return {block.id : block.cache.stats for block in self.blocks \
+                    if block.cache is not None}
 
     ############################################################################
     @property
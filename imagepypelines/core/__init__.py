@@ -29,6 +29,7 @@ from .Exceptions import BlockError
 
 # io_tools.py
 from .io_tools import passgen
+from .io_tools import clear_passgen_cache
 from .io_tools import prevent_overwrite
 from .io_tools import make_numbered_prefix
 from .io_tools import convert_to
@@ -76,3 +76,11 @@ HOMOGENUS_CONTAINERS = [np.ndarray]
 """a list of data containers that are "homogenus", meaning that every datum (row)
 will have the same shape and type. By default, [numpy.ndarray]
 """
+
+
+# sampled containers are sequences whose items may differ, but which are spot
+# checked instead of fully checked when enforcement sampling is enabled
+SAMPLED_CONTAINERS = [list, tuple]
+"""a list of data containers that are sampled rather than fully checked when
+a Block or Pipeline has an `enforcement_sample` size. By default, [list, tuple]
+"""
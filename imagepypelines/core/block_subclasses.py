@@ -12,6 +12,7 @@ import copy
 from types import FunctionType
 
 from .Block import Block
+from .caching import update_hash, update_code_hash
 
 this_module = sys.modules[__name__]
 
@@ -29,6 +30,9 @@ class PipelineBlock(Block):
     Batch Size:
         "each"
     """
+    # the internal pipeline is fingerprinted task by task
+    _RUNTIME_ATTRS = Block._RUNTIME_ATTRS.union(['pipeline'])
+
     def __init__(self, pipeline, fetch):
         """instantiates the PipelineBlock
 
@@ -60,6 +64,16 @@ class PipelineBlock(Block):
         # turn processed dict into a tuple of fetches
         return tuple(processed[fet] for fet in self.fetch)
 
+    ############################################################################
+    def _update_fingerprint(self, h):
+        """the outputs also depend on the fetches and every task in the
+        internal pipeline"""
+        super()._update_fingerprint(h)
+        update_hash(h, tuple(self.fetch))
+        for step in self.pipeline.execution_plan:
+            update_hash(h, (step.args, step.outputs))
+            step.block._update_fingerprint(h)
+
     ############################################################################
     @property
     def args(self):
@@ -81,6 +95,10 @@ class FuncBlock(Block):
     # def __new__(self, func, preset_kwargs):
     #     return type(func.__name__+"FuncBlock", (SimpleBlock,), {})
 
+    # the function is fingerprinted by its code, and the preset kwargs are
+    # hashed on every call because they're often modified in place
+    _RUNTIME_ATTRS = Block._RUNTIME_ATTRS.union(['func', 'preset_kwargs'])
+
     def __init__(self, func, preset_kwargs, **block_kwargs):
         """instantiates the function block
 
@@ -96,6 +114,9 @@ class FuncBlock(Block):
         # the source object be in top level of the module)
         if not hasattr(this_module, func.__name__):
             func_copy = FunctionType(func.__code__, globals(), func.__name__)
+            # the qualname must also be top level (it's taken from the code
+            # object in python3.11+, which includes enclosing scopes)
+            func_copy.__qualname__ = func.__name__
             setattr(this_module, func_copy.__name__, func_copy)
         else:
             raise ValueError("illegal blockified function name: {}".format(func.__name__))
@@ -123,6 +144,21 @@ class FuncBlock(Block):
         """
         return self.func(*args,**kwargs)
 
+    def _compute_fingerprint(self, h):
+        """the outputs also depend on the user function"""
+        super()._compute_fingerprint(h)
+        update_code_hash(h, self.func.__code__)
+
+    def _update_fingerprint(self, h):
+        """the outputs also depend on the current preset kwargs"""
+        super()._update_fingerprint(h)
+        update_hash(h, self.preset_kwargs)
+
+    @property
+    def is_coroutine(self):
+        """bool: whether or not the blockified function is a coroutine function"""
+        return inspect.iscoroutinefunction(self.func)
+
     @property
     def args(self):
         """:obj:`list` of :obj:`str`: arguments in the order they are expected"""
@@ -164,6 +200,13 @@ class Input(Block):
             raise RuntimeError(msg)
         return self.data
 
+    ############################################################################
+    def __getstate__(self):
+        """loaded data is never pickled with the Input"""
+        state = super().__getstate__().copy()
+        state['data'] = None
+        return state
+
     ############################################################################
     def load(self, data):
         """loads the given data for distribution into the pipeline"""
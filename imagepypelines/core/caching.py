@@ -0,0 +1,467 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+#
+from collections.abc import Mapping
+from types import CodeType
+import hashlib
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 256 * 1024**2
+"""default size limit of a BlockCache in bytes (256MB)"""
+
+DIGEST_SIZE = 16
+"""size of the content hashes in bytes, on python 3.6+"""
+
+
+################################################################################
+#                               hashing
+################################################################################
+class Unhashable(Exception):
+    """raised internally when an object's content can't be hashed"""
+    pass
+
+
+def new_hash():
+    """returns a new hashlib object used for content hashes. blake2b requires
+    python 3.6+, so sha256 is used on python 3.5"""
+    if hasattr(hashlib, 'blake2b'):
+        return hashlib.blake2b(digest_size=DIGEST_SIZE)
+    return hashlib.sha256()
+
+
+def update_hash(h, obj):
+    """updates the hash with the content of the given object. Arrays are hashed
+    directly from their buffers, containers are hashed recursively and
+    everything else is hashed from its pickled form. Sets are hashed
+    independently of their iteration order, so hashes are the same in every
+    process
+
+    Args:
+        h(:obj:`hashlib.blake2b`): the hash object to update
+        obj(any): the object to hash
+
+    Raises:
+        Unhashable: if the object can't be hashed
+    """
+    # the type is hashed with the value so that 1, 1.0 and '1' are distinct
+    h.update( type(obj).__qualname__.encode() )
+
+    if isinstance(obj, np.ndarray):
+        h.update( "{}{}".format(obj.dtype.str, obj.shape).encode() )
+        if obj.dtype.hasobject:
+            for item in obj.flat:
+                update_hash(h, item)
+        else:
+            h.update( np.ascontiguousarray(obj).data )
+
+    elif isinstance(obj, np.generic):
+        h.update( obj.dtype.str.encode() )
+        h.update( obj.tobytes() )
+
+    elif isinstance(obj, (str, bytes, int, float, complex, bool, type(None))):
+        h.update( repr(obj).encode() )
+
+    elif isinstance(obj, (list, tuple)):
+        h.update( str(len(obj)).encode() )
+        for item in obj:
+            update_hash(h, item)
+
+    elif isinstance(obj, (set, frozenset)):
+        # iteration order depends on the hash seed, so the items are hashed
+        # separately and combined in sorted order
+        digests = []
+        for item in obj:
+            item_h = new_hash()
+            update_hash(item_h, item)
+            digests.append( item_h.digest() )
+        h.update( str(len(obj)).encode() )
+        for digest in sorted(digests):
+            h.update(digest)
+
+    elif isinstance(obj, Mapping):
+        h.update( str(len(obj)).encode() )
+        for key,val in obj.items():
+            update_hash(h, key)
+            update_hash(h, val)
+
+    elif isinstance(obj, CodeType):
+        update_code_hash(h, obj)
+
+    else:
+        try:
+            h.update( pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL) )
+        except Exception as e:
+            raise Unhashable(str(e))
+
+
+def update_code_hash(h, code):
+    """updates the hash with a code object's bytecode, constants and names.
+    Nested code objects (ie inner functions) are hashed recursively"""
+    h.update( code.co_code )
+    h.update( repr(code.co_names).encode() )
+    h.update( repr(code.co_varnames).encode() )
+    for const in code.co_consts:
+        update_hash(h, const)
+
+
+def hash_data(*objs):
+    """returns a content hash of the given objects
+
+    Args:
+        *objs: objects to hash
+
+    Returns:
+        str: hex digest of the objects, or None if they can't be hashed
+    """
+    h = new_hash()
+    try:
+        for obj in objs:
+            update_hash(h, obj)
+    except Unhashable:
+        return None
+    return h.hexdigest()
+
+
+def sizeof(obj):
+    """estimates the size of an object in bytes, including the contents of
+    arrays and containers"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj, 0)
+    elif isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(sizeof(item) for item in obj)
+    elif isinstance(obj, dict):
+        return sys.getsizeof(obj) \
+                + sum(sizeof(k) + sizeof(v) for k,v in obj.items())
+    return sys.getsizeof(obj)
+
+
+################################################################################
+#                               caches
+################################################################################
+class BlockCache(object):
+    """in-memory cache of block outputs, bounded by their total size in bytes
+
+    Entries are evicted with the GreedyDual-Size policy. Every entry has a
+    priority of `L + cost / size`, where `cost` is the time it took to compute
+    the outputs and `L` is the priority of the last entry evicted. The entry
+    with the lowest priority is evicted first, so cheap and large outputs are
+    dropped before expensive and small ones. Hits reset an entry's priority
+    with the current `L`, so with uniform costs and sizes this is an LRU cache.
+
+    Note:
+        Cached outputs are returned as is, not copied. Blocks downstream of a
+        cached block must not modify their inputs in place.
+
+    Attributes:
+        max_bytes(int): maximum total size of the cached outputs
+        n_bytes(int): current total size of the cached outputs
+        hits(int): number of lookups which found cached outputs
+        misses(int): number of lookups which didn't find cached outputs
+        evictions(int): number of entries evicted to make room for others
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """instantiates the BlockCache
+
+        Args:
+            max_bytes(int): maximum total size of the cached outputs. defaults
+                to DEFAULT_CACHE_BYTES
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reset()
+
+    ############################################################################
+    def get(self, key):
+        """fetches the outputs stored under the given key
+
+        Args:
+            key(str): the cache key
+
+        Returns:
+            tuple: the cached outputs, or None if they aren't in the cache
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            # recently used entries are the last to be evicted
+            self._push(key, entry)
+            return entry['outputs']
+
+    ############################################################################
+    def put(self, key, outputs, cost):
+        """stores outputs in the cache, evicting entries to make room if
+        necessary. Outputs larger than the cache are not stored
+
+        Args:
+            key(str): the cache key
+            outputs(tuple): the outputs to store
+            cost(float): the number of seconds it took to compute the outputs
+        """
+        size = max(sizeof(outputs), 1)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            while self.n_bytes + size > self.max_bytes:
+                self._evict()
+
+            entry = {'outputs' : outputs, 'size' : size, 'cost' : cost}
+            self._entries[key] = entry
+            self.n_bytes += size
+            self._push(key, entry)
+
+    ############################################################################
+    def clear(self):
+        """removes all entries and resets the statistics"""
+        with self._lock:
+            self._reset()
+
+    ############################################################################
+    def _reset(self):
+        self._entries = {}
+        self._heap = []
+        self._counter = 0
+        self._inflation = 0.0
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ############################################################################
+    def _push(self, key, entry):
+        """(re)computes the priority of an entry and pushes it onto the heap.
+        Outdated heap items are skipped when they're popped"""
+        self._counter += 1
+        entry['priority'] = self._inflation + entry['cost'] / entry['size']
+        entry['counter'] = self._counter
+        heapq.heappush(self._heap, (entry['priority'], self._counter, key))
+
+    ############################################################################
+    def _evict(self):
+        """evicts the entry with the lowest priority"""
+        while self._heap:
+            priority, counter, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key, None)
+            # skip heap items for entries which were evicted or used again
+            if (entry is None) or (entry['counter'] != counter):
+                continue
+
+            self._inflation = priority
+            del self._entries[key]
+            self.n_bytes -= entry['size']
+            self.evictions += 1
+            return
+
+    ############################################################################
+    #                               special
+    ############################################################################
+    def __len__(self):
+        return len(self._entries)
+
+    ############################################################################
+    def __getstate__(self):
+        """only the size limit is pickled, copies start out empty"""
+        return {'max_bytes' : self.max_bytes}
+
+    ############################################################################
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    ############################################################################
+    #                               properties
+    ############################################################################
+    @property
+    def stats(self):
+        """dict: the number of 'hits', 'misses' and 'evictions', the number of
+        entries ('n_entries') and their total size ('n_bytes') and the size
+        limit ('max_bytes')"""
+        return {'hits' : self.hits,
+                'misses' : self.misses,
+                'evictions' : self.evictions,
+                'n_entries' : len(self._entries),
+                'n_bytes' : self.n_bytes,
+                'max_bytes' : self.max_bytes}
+
+
+################################################################################
+class CheckpointStore(object):
+    """directory of saved variable data, keyed by a fingerprint of everything
+    upstream of the variable
+
+    Arrays are saved as .npy files and loaded memory-mapped, everything else
+    is pickled. Files are written atomically, so several processes can share
+    a directory. Loading a checkpoint updates its modification time, so that
+    the garbage collector removes the least recently used checkpoints first.
+
+    Attributes:
+        directory(str): the directory checkpoints are stored in
+        max_bytes(int,None): maximum total size of the checkpoint files. the
+            oldest files are removed whenever this is exceeded. If None, then
+            the size is unlimited
+    """
+    NPY_EXT = ".npy"
+    PICKLE_EXT = ".pck"
+
+    def __init__(self, directory, max_bytes=None):
+        """instantiates the CheckpointStore, creating the directory if it
+        doesn't exist
+
+        Args:
+            directory(str): the directory to store checkpoints in
+            max_bytes(int,None): maximum total size of the checkpoint files.
+                defaults to None (unlimited)
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    ############################################################################
+    def load(self, key):
+        """loads the data saved under the given key
+
+        Args:
+            key(str): the checkpoint key
+
+        Returns:
+            any: the saved data. arrays are read-only memory maps
+
+        Raises:
+            KeyError: if there is no checkpoint for the key
+        """
+        path = self.path_for(key)
+        if path is None:
+            raise KeyError(key)
+
+        if path.endswith(self.NPY_EXT):
+            data = np.load(path, mmap_mode='r')
+        else:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+
+        # mark this checkpoint as recently used
+        os.utime(path)
+        return data
+
+    ############################################################################
+    def save(self, key, data):
+        """saves data under the given key, then removes old checkpoints if
+        the size limit is exceeded
+
+        Args:
+            key(str): the checkpoint key
+            data(any): the data to save. must be an array or picklable
+        """
+        if isinstance(data, np.ndarray) and (not data.dtype.hasobject):
+            ext = self.NPY_EXT
+            write = lambda f: np.save(f, data, allow_pickle=False)
+        else:
+            ext = self.PICKLE_EXT
+            write = lambda f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # write to a temporary file first so a partial file is never loaded
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, os.path.join(self.directory, key + ext))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        if self.max_bytes is not None:
+            self.gc()
+
+    ############################################################################
+    def path_for(self, key):
+        """returns the path of the checkpoint for the given key, or None if
+        it doesn't exist"""
+        for ext in (self.NPY_EXT, self.PICKLE_EXT):
+            path = os.path.join(self.directory, key + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    ############################################################################
+    def gc(self, max_bytes=None):
+        """removes the least recently used checkpoints until their total size
+        is below the limit
+
+        Args:
+            max_bytes(int,None): the size limit in bytes. defaults to
+                `self.max_bytes`
+
+        Returns:
+            int: the number of checkpoints removed
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return 0
+
+        files = self._files()
+        total = sum(f.stat().st_size for f in files)
+        # oldest first
+        files.sort(key=lambda f: f.stat().st_mtime)
+
+        n_removed = 0
+        for f in files:
+            if total <= max_bytes:
+                break
+            total -= f.stat().st_size
+            try:
+                os.remove(f.path)
+                n_removed += 1
+            except FileNotFoundError:
+                # removed by another process
+                pass
+        return n_removed
+
+    ############################################################################
+    def clear(self):
+        """removes every checkpoint"""
+        self.gc(max_bytes=0)
+
+    ############################################################################
+    def _files(self):
+        """returns the directory entries of every checkpoint file"""
+        exts = (self.NPY_EXT, self.PICKLE_EXT)
+        return [f for f in os.scandir(self.directory) \
+                    if f.is_file() and f.name.endswith(exts)]
+
+    ############################################################################
+    #                               special
+    ############################################################################
+    def __contains__(self, key):
+        return self.path_for(key) is not None
+
+    ############################################################################
+    def __len__(self):
+        return len( self._files() )
+
+    ############################################################################
+    #                               properties
+    ############################################################################
+    @property
+    def n_bytes(self):
+        """int: total size of the checkpoint files in bytes"""
+        return sum(f.stat().st_size for f in self._files())
+
+# END
@@ -0,0 +1,461 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+#
+from ..Logger import MASTER_LOGGER
+from .Data import Data
+from .Exceptions import PipelineError
+from .block_subclasses import Input, Leaf
+from .profiling import profile_node
+from .util import get_running_loop
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+import asyncio
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+
+_WORKER_PIPELINE = None
+"""the copy of the pipeline owned by a ProcessExecutor worker process"""
+
+_POOL_INITIALIZERS = sys.version_info >= (3, 7)
+"""whether or not ProcessPoolExecutor accepts an initializer and mp_context"""
+
+_FORKED_PIPELINES = {}
+"""pickled pipelines keyed by ProcessExecutor, which forked workers inherit
+and unpickle on their first task if pool initializers aren't available"""
+
+_POOL_KEYS = itertools.count()
+
+
+################################################################################
+class SerialExecutor(object):
+    """runs ready nodes one at a time in the calling thread"""
+    name = "serial"
+
+    ############################################################################
+    def run(self, scheduler, run_node, skip_enforcement=False, sample=None,
+                profiler=None, tracer=None):
+        """runs every node in the scheduler's plan
+
+        Args:
+            scheduler(:obj:`Scheduler`): bookkeeping object for this run
+            run_node(function): function which takes a node id, processes it
+                and returns its outputs
+            skip_enforcement(bool): unused, enforcement is handled by run_node
+            sample(int,None): unused, enforcement is handled by run_node
+            profiler(:obj:`ProfileReport`,None): unused, profiling is handled
+                by run_node
+            tracer(:obj:`TraceRecorder`,None): unused, tracing is handled by
+                run_node
+        """
+        ready = deque( scheduler.start() )
+        while ready:
+            node_id = ready.popleft()
+            ready.extend( scheduler.finish(node_id, run_node(node_id)) )
+
+
+################################################################################
+class ThreadExecutor(object):
+    """dispatches ready nodes to a thread pool, so that independent branches of
+    the graph run at the same time.
+
+    This is most effective for blocks which release the GIL, i.e. most NumPy or
+    OpenCV operations. Outputs are scattered and downstream nodes are released
+    in the calling thread, so results are identical to the SerialExecutor.
+
+    Warning:
+        A block used in more than one task may be run in several threads at
+        once, so its process function must be thread-safe
+
+    Attributes:
+        max_workers(int,None): maximum number of threads to use. If None,
+            then the default of :obj:`concurrent.futures.ThreadPoolExecutor`
+            is used
+    """
+    name = "threads"
+
+    def __init__(self, max_workers=None):
+        """instantiates the ThreadExecutor
+
+        Args:
+            max_workers(int,None): maximum number of threads to use
+        """
+        self.max_workers = max_workers
+
+    ############################################################################
+    def run(self, scheduler, run_node, skip_enforcement=False, sample=None,
+                profiler=None, tracer=None):
+        """runs every node in the scheduler's plan
+
+        Args:
+            scheduler(:obj:`Scheduler`): bookkeeping object for this run
+            run_node(function): function which takes a node id, processes it
+                and returns its outputs
+            skip_enforcement(bool): unused, enforcement is handled by run_node
+            sample(int,None): unused, enforcement is handled by run_node
+            profiler(:obj:`ProfileReport`,None): unused, profiling is handled
+                by run_node
+            tracer(:obj:`TraceRecorder`,None): unused, tracing is handled by
+                run_node
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            def _submit(node_ids):
+                for node_id in node_ids:
+                    running[ pool.submit(run_node, node_id) ] = node_id
+
+            _submit( scheduler.start() )
+            try:
+                while running:
+                    finished,_ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        node_id = running.pop(future)
+                        _submit( scheduler.finish(node_id, future.result()) )
+            except BaseException:
+                # don't start anything else if a node failed
+                for future in running:
+                    future.cancel()
+                raise
+
+
+################################################################################
+def _init_worker(pipeline_bytes):
+    """unpickles the pipeline once when a ProcessExecutor worker starts"""
+    global _WORKER_PIPELINE
+    _WORKER_PIPELINE = pickle.loads(pipeline_bytes)
+
+
+def _run_in_worker(pool_key, payload):
+    """runs a single node on the worker's copy of the pipeline
+
+    Args:
+        pool_key(int,None): key of the pipeline in `_FORKED_PIPELINES` to load
+            if the worker wasn't initialized when it started
+        payload(bytes): pickled (node_id, arg_data, skip_enforcement, sample,
+            profile, trace) tuple
+
+    Returns:
+        (tuple): tuple containing:
+
+            bytes: the pickled block outputs
+            float: seconds spent unpickling the payload
+            float: seconds spent processing the node
+            float: seconds spent pickling the outputs
+            dict: measurements from `profile_node` if profiling, otherwise None
+            tuple: the (start, end, n_items, pid, tid) of the node if tracing,
+                otherwise None
+    """
+    if _WORKER_PIPELINE is None:
+        _init_worker( _FORKED_PIPELINES[pool_key] )
+
+    start = time.perf_counter()
+    node_id, arg_data, skip_enforcement, sample, profile, trace = pickle.loads(payload)
+    loaded = time.perf_counter()
+
+    step = _WORKER_PIPELINE.execution_plan.steps[node_id]
+    data = tuple(Data(d) for d in arg_data)
+    kwargs = dict(logger=_WORKER_PIPELINE.logger,
+                    force_skip=skip_enforcement,
+                    sample=sample)
+    if profile:
+        outputs, node_stats = profile_node(step.block, data, **kwargs)
+    else:
+        outputs, node_stats = step.block._pipeline_process(*data, **kwargs), None
+    computed = time.perf_counter()
+
+    span = None
+    if trace:
+        n_items = data[0].n_items if data else 0
+        span = (loaded, computed, n_items, os.getpid(), threading.get_ident())
+
+    result = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+    dumped = time.perf_counter()
+
+    return result, (loaded - start), (computed - loaded), (dumped - computed), node_stats, span
+
+
+################################################################################
+class ProcessExecutor(object):
+    """dispatches ready nodes to a pool of long-lived worker processes, for
+    blocks that hold the GIL.
+
+    The pipeline is pickled and shipped to every worker once when the pool
+    starts. After that only the input data for a node and its id are sent to a
+    worker, and only its outputs are sent back. On python < 3.7, workers
+    unpickle the copy they inherit when they're forked on their first task
+    instead, so the executor is only available on platforms that fork. Input and Leaf nodes are
+    trivial, so they are run in the calling process.
+
+    Warning:
+        Workers own a copy of the pipeline made when the pool started. Changes
+        made to blocks afterwards aren't seen by the workers until the pool is
+        restarted with `Pipeline.shutdown()`. Changes to the graph restart the
+        pool automatically.
+
+    Attributes:
+        max_workers(int,None): number of worker processes. If None, then the
+            default of :obj:`concurrent.futures.ProcessPoolExecutor` is used
+        stats(dict): seconds spent on 'serialize', 'deserialize' and
+            'compute', 'wall' time and the number of tasks ('n_tasks') sent
+            to the workers since the pool started. Serialization and
+            deserialization include the time spent in both the calling and
+            worker processes
+        last_stats(dict): the same statistics for the most recent run only
+    """
+    name = "processes"
+
+    def __init__(self, pipeline, max_workers=None):
+        """instantiates the ProcessExecutor and starts its workers
+
+        Args:
+            pipeline(:obj:`Pipeline`): pipeline the workers will process
+            max_workers(int,None): number of worker processes
+        """
+        self.max_workers = max_workers
+        self.stats = self._empty_stats()
+        self.last_stats = self._empty_stats()
+
+        pipeline_bytes = pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL)
+        self._key = None
+        if _POOL_INITIALIZERS:
+            # blockified functions are registered at runtime, so forked
+            # workers are the only ones guaranteed to be able to unpickle them
+            if 'fork' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('fork')
+            else:
+                context = multiprocessing.get_context()
+
+            self._pool = ProcessPoolExecutor(max_workers=max_workers,
+                                                mp_context=context,
+                                                initializer=_init_worker,
+                                                initargs=(pipeline_bytes,))
+        else:
+            # python < 3.7 always uses the default start method, so workers
+            # can only load the pipeline from the memory they're forked with
+            if multiprocessing.get_start_method() != 'fork':
+                msg = "the processes executor requires python 3.7+ on" \
+                        + " platforms which don't fork worker processes"
+                MASTER_LOGGER.error(msg)
+                raise PipelineError(msg)
+
+            self._key = next(_POOL_KEYS)
+            _FORKED_PIPELINES[self._key] = pipeline_bytes
+            self._pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    ############################################################################
+    def run(self, scheduler, run_node, skip_enforcement=False, sample=None,
+                profiler=None, tracer=None):
+        """runs every node in the scheduler's plan
+
+        Args:
+            scheduler(:obj:`Scheduler`): bookkeeping object for this run
+            run_node(function): function which takes a node id, processes it
+                and returns its outputs. Only used for Input and Leaf nodes
+            skip_enforcement(bool): whether or not to skip type and shape
+                checking in the workers
+            sample(int,None): the pipeline's enforcement sample size
+            profiler(:obj:`ProfileReport`,None): report to add measurements
+                from the workers to, nodes aren't profiled if None
+            tracer(:obj:`TraceRecorder`,None): recorder to add the time spent
+                in the workers to, nodes aren't traced if None
+        """
+        stats = self._empty_stats()
+        start = time.perf_counter()
+
+        steps = scheduler.plan.steps
+        ready = deque( scheduler.start() )
+        running = {}
+        try:
+            while ready or running:
+                # dispatch everything that is ready
+                while ready:
+                    node_id = ready.popleft()
+                    step = steps[node_id]
+                    if isinstance(step.block, (Input, Leaf)):
+                        ready.extend( scheduler.finish(node_id, run_node(node_id)) )
+                        continue
+
+                    t0 = time.perf_counter()
+                    payload = pickle.dumps(
+                                (node_id,
+                                    [e['data'].grab() for e in step.in_edges],
+                                    skip_enforcement,
+                                    sample,
+                                    profiler is not None,
+                                    tracer is not None),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                    stats['serialize'] += time.perf_counter() - t0
+                    running[ self._pool.submit(_run_in_worker, self._key, payload) ] = node_id
+
+                if not running:
+                    break
+
+                # collect the outputs of finished nodes
+                finished,_ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node_id = running.pop(future)
+                    result, w_load, w_compute, w_dump, node_stats, span = future.result()
+
+                    t0 = time.perf_counter()
+                    outputs = pickle.loads(result)
+                    stats['deserialize'] += time.perf_counter() - t0 + w_load
+                    stats['serialize'] += w_dump
+                    stats['compute'] += w_compute
+                    stats['n_tasks'] += 1
+                    if node_stats is not None:
+                        profiler.add(node_id, steps[node_id].block, node_stats)
+                    if span is not None:
+                        tracer.add(node_id, steps[node_id].block, *span)
+
+                    ready.extend( scheduler.finish(node_id, outputs) )
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+        finally:
+            stats['wall'] = time.perf_counter() - start
+            self.last_stats = stats
+            for key,val in stats.items():
+                self.stats[key] += val
+
+    ############################################################################
+    def shutdown(self, wait=True):
+        """stops all worker processes
+
+        Args:
+            wait(bool): whether or not to wait for the workers to exit
+        """
+        self._pool.shutdown(wait=wait)
+        _FORKED_PIPELINES.pop(self._key, None)
+
+    ############################################################################
+    @staticmethod
+    def _empty_stats():
+        return {'serialize' : 0.0,
+                'deserialize' : 0.0,
+                'compute' : 0.0,
+                'wall' : 0.0,
+                'n_tasks' : 0}
+
+
+################################################################################
+class AsyncExecutor(object):
+    """runs the graph in an asyncio event loop. Used by `Pipeline.aprocess`
+
+    Ready nodes are wrapped in tasks so that independent branches run
+    concurrently. Coroutine blocks are awaited directly in the event loop,
+    Input and Leaf nodes are run inline, and every other block is offloaded to
+    a thread pool so it doesn't block the loop.
+
+    Attributes:
+        max_workers(int,None): number of threads for non-coroutine blocks. If
+            None, then the event loop's default executor is used
+    """
+    name = "async"
+
+    def __init__(self, max_workers=None):
+        """instantiates the AsyncExecutor
+
+        Args:
+            max_workers(int,None): number of threads for non-coroutine blocks
+        """
+        self.max_workers = max_workers
+
+    ############################################################################
+    async def run(self, scheduler, run_node, arun_node):
+        """coroutine which runs every node in the scheduler's plan
+
+        Args:
+            scheduler(:obj:`Scheduler`): bookkeeping object for this run
+            run_node(function): function which takes a node id, processes it
+                and returns its outputs
+            arun_node(function): coroutine function which takes the node id of
+                a coroutine block, processes it and returns its outputs
+        """
+        loop = get_running_loop()
+        pool = None
+        if self.max_workers is not None:
+            pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        steps = scheduler.plan.steps
+        ready = deque( scheduler.start() )
+        running = {}
+        try:
+            while ready or running:
+                while ready:
+                    node_id = ready.popleft()
+                    block = steps[node_id].block
+                    if isinstance(block, (Input, Leaf)):
+                        ready.extend( scheduler.finish(node_id, run_node(node_id)) )
+                        continue
+
+                    if block.is_coroutine:
+                        task = asyncio.ensure_future( arun_node(node_id) )
+                    else:
+                        task = loop.run_in_executor(pool, run_node, node_id)
+                    running[task] = node_id
+
+                if not running:
+                    break
+
+                finished,_ = await asyncio.wait(running,
+                                                return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    node_id = running.pop(task)
+                    ready.extend( scheduler.finish(node_id, task.result()) )
+        except BaseException:
+            for task in running:
+                task.cancel()
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False)
+
+
+################################################################################
+EXECUTORS = {SerialExecutor.name : SerialExecutor,
+                ThreadExecutor.name : ThreadExecutor,
+                ProcessExecutor.name : ProcessExecutor,
+                }
+"""executors available to Pipeline.process, keyed by name"""
+
+
+def get_executor(name, max_workers=None, logger=MASTER_LOGGER):
+    """instantiates the executor with the given name
+
+    Note:
+        ProcessExecutors are persistent, so they are managed by the Pipeline
+        and can't be created by this function
+
+    Args:
+        name(str): name of the executor, one of the keys in EXECUTORS
+        max_workers(int,None): maximum number of workers for parallel executors,
+            ignored by the serial executor
+        logger(:obj:`ImagepypelinesLogger`): logger to report errors with,
+            usually the calling pipeline's logger. defaults to MASTER_LOGGER
+
+    Returns:
+        object: executor with a
+            `run(scheduler, run_node, skip_enforcement, sample, profiler,
+            tracer)` method
+    """
+    if (name not in EXECUTORS) or (name == ProcessExecutor.name):
+        msg = "executor must be one of {}, not '{}'".format(list(EXECUTORS), name)
+        logger.error(msg)
+        raise PipelineError(msg)
+
+    if name == SerialExecutor.name:
+        return SerialExecutor()
+    return EXECUTORS[name](max_workers=max_workers)
+
+# END
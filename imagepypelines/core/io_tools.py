@@ -11,6 +11,10 @@ import sys
 from types import FunctionType, SimpleNamespace
 import numpy as np
 from functools import partial
+from collections import OrderedDict
+import hashlib
+import hmac
+import threading
 
 import base64
 from cryptography import fernet
@@ -22,32 +26,70 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 ################################################################################
 #                                   Constants
 ################################################################################
+KDF_ITERATIONS = 100000
+"""default number of PBKDF2 iterations used by `passgen`"""
 
+PASSGEN_CACHE_SIZE = 32
+"""maximum number of derived keys cached by `passgen`"""
+
+_PASSGEN_CACHE = OrderedDict()
+_PASSGEN_LOCK = threading.Lock()
+# passwords are only kept in the cache as an HMAC under a per-process secret
+_PASSGEN_SECRET = os.urandom(32)
 
 
 ################################################################################
 #                                   Functions
 ################################################################################
 
-def passgen(passwd, salt=''):
+def passgen(passwd, salt='', iterations=KDF_ITERATIONS):
     """generate a hashed key from a password
 
+    Derived keys are cached, so deriving the same key again is nearly free.
+    The cache holds the most recently used `PASSGEN_CACHE_SIZE` keys and can
+    be emptied with `clear_passgen_cache`
+
     Args:
         passwd (None,str): password to hash
-        salt (str): optional, salt for your password
+        salt (str,bytes): optional, salt for your password
+        iterations (int): optional, number of PBKDF2 iterations
 
     Returns:
         bytes: hashed passkey safe string
     """
+    if isinstance(passwd, str):
+        passwd = passwd.encode()
+    if isinstance(salt, str):
+        salt = salt.encode()
+
+    digest = hmac.new(_PASSGEN_SECRET, passwd, hashlib.sha256).digest()
+    cache_key = (salt, iterations, digest)
+    with _PASSGEN_LOCK:
+        if cache_key in _PASSGEN_CACHE:
+            _PASSGEN_CACHE.move_to_end(cache_key)
+            return _PASSGEN_CACHE[cache_key]
+
     # generate a proper key using Fernet library
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=salt.encode(),
-        iterations=100000,
+        salt=salt,
+        iterations=iterations,
         backend=default_backend()
     )
-    return base64.urlsafe_b64encode( kdf.derive( passwd.encode() ) )
+    key = base64.urlsafe_b64encode( kdf.derive(passwd) )
+
+    with _PASSGEN_LOCK:
+        _PASSGEN_CACHE[cache_key] = key
+        while len(_PASSGEN_CACHE) > PASSGEN_CACHE_SIZE:
+            _PASSGEN_CACHE.popitem(last=False)
+    return key
+
+
+def clear_passgen_cache():
+    """removes every key cached by `passgen`"""
+    with _PASSGEN_LOCK:
+        _PASSGEN_CACHE.clear()
 
 
 # -------------------------------- Input/Output --------------------------------
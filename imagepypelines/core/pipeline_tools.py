@@ -41,6 +41,10 @@ def blockify(kwargs={},
             `each` means that each argument datum will be passed in
             individually
 
+    Note:
+        coroutine functions (`async def`) can also be blockified. They are
+        awaited concurrently by `Pipeline.aprocess`
+
     Example:
         >>> import imagepypelines as ip
         >>>
@@ -0,0 +1,285 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+#
+from .caching import sizeof
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+"""clock for the CPU time of profiled blocks. `time.thread_time` requires
+python 3.7+, so older versions measure the CPU time of the whole process"""
+
+
+################################################################################
+def profile_node(block, data, **kwargs):
+    """processes data through a block and measures it
+
+    CPU time is measured for the thread running the block, so work done by
+    threads the block starts itself isn't included. On python < 3.7 it's
+    measured for the whole process instead, which includes other threads
+
+    Args:
+        block(:obj:`Block`): the block to run
+        data(:obj:`tuple` of :obj:`Data`): the input data for the block
+        **kwargs: keyword arguments for `Block._pipeline_process`
+
+    Returns:
+        (tuple): tuple containing:
+
+            tuple: the block outputs
+            dict: 'wall', 'cpu' and 'enforcement' time in seconds, the number
+                of items processed ('n_items') and the size of the inputs and
+                outputs in bytes ('in_bytes', 'out_bytes')
+    """
+    stats = {'enforcement' : 0.0}
+    wall = time.perf_counter()
+    cpu = _cpu_time()
+    outputs = block._pipeline_process(*data, stats=stats, **kwargs)
+    stats['cpu'] = _cpu_time() - cpu
+    stats['wall'] = time.perf_counter() - wall
+
+    stats['n_items'] = data[0].n_items if data else 0
+    stats['in_bytes'] = sum(sizeof(d.data) for d in data)
+    stats['out_bytes'] = sizeof(outputs)
+    return outputs, stats
+
+
+################################################################################
+class NodeProfile(object):
+    """measurements for a single node in the graph, summed over every profiled
+    run
+
+    Attributes:
+        node_id(str): id of the node in `Pipeline.graph`
+        block_id(str): id of the node's block
+        n_calls(int): number of times the node was profiled
+        wall(float): seconds between the start and end of processing
+        cpu(float): seconds of CPU time used by the thread processing the node
+            (by the whole process on python < 3.7)
+        enforcement(float): seconds spent checking types and shapes
+        n_items(int): number of items processed
+        in_bytes(int): estimated size of the inputs in bytes
+        out_bytes(int): estimated size of the outputs in bytes
+    """
+    FIELDS = ('n_calls',
+                'wall',
+                'cpu',
+                'enforcement',
+                'n_items',
+                'in_bytes',
+                'out_bytes')
+
+    def __init__(self, node_id, block_id):
+        self.node_id = node_id
+        self.block_id = block_id
+        self.n_calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.enforcement = 0.0
+        self.n_items = 0
+        self.in_bytes = 0
+        self.out_bytes = 0
+
+    ############################################################################
+    def add(self, stats):
+        """adds the measurements from a single call
+
+        Args:
+            stats(dict): measurements returned by `profile_node`
+        """
+        self.n_calls += 1
+        for key in self.FIELDS[1:]:
+            setattr(self, key, getattr(self, key) + stats[key])
+
+    ############################################################################
+    def as_dict(self):
+        """returns the measurements as a dictionary"""
+        out = {key : getattr(self, key) for key in self.FIELDS}
+        out['block_id'] = self.block_id
+        out['items_per_sec'] = self.items_per_sec
+        return out
+
+    ############################################################################
+    @property
+    def items_per_sec(self):
+        """float: number of items processed per second of wall time"""
+        if self.wall == 0:
+            return 0.0
+        return self.n_items / self.wall
+
+
+################################################################################
+class ProfileReport(object):
+    """per-node measurements collected by `Pipeline.process(profile=...)`
+
+    Printing the report shows a table of every profiled node, sorted by the
+    time spent in it.
+
+    Attributes:
+        nodes(:obj:`OrderedDict` of str : :obj:`NodeProfile`): measurements for
+            every profiled node, keyed by node id in `Pipeline.graph`
+        n_runs(int): number of profiled `Pipeline.process` calls
+        wall(float): total seconds spent in the profiled calls
+    """
+    def __init__(self):
+        self.nodes = OrderedDict()
+        self.n_runs = 0
+        self.wall = 0.0
+        self._lock = threading.Lock()
+
+    ############################################################################
+    def add(self, node_id, block, stats):
+        """adds the measurements for a single call of a node. This is
+        thread-safe
+
+        Args:
+            node_id(str): id of the node in the graph
+            block(:obj:`Block`): the node's block
+            stats(dict): measurements returned by `profile_node`
+        """
+        with self._lock:
+            if node_id not in self.nodes:
+                self.nodes[node_id] = NodeProfile(node_id, block.id)
+            self.nodes[node_id].add(stats)
+
+    ############################################################################
+    def as_dict(self):
+        """returns the measurements for every node as a dictionary keyed by node
+        id"""
+        return {node_id : node.as_dict() for node_id,node in self.nodes.items()}
+
+    ############################################################################
+    def __str__(self):
+        header = "{:<32} | {:>6} | {:>10} | {:>10} | {:>12} | {:>6} | {:>12} | {:>10} | {:>10}"
+        lines = ["profile of {} run(s), {} ms total".format(self.n_runs,
+                                                        round(self.wall * 1e3, 3)),
+                    header.format('block', 'calls', 'wall (ms)', 'cpu (ms)',
+                                    'enforce (ms)', 'wall %', 'items/sec',
+                                    'in (kB)', 'out (kB)')]
+
+        nodes = sorted(self.nodes.values(), key=lambda n: n.wall, reverse=True)
+        for node in nodes:
+            percent = (100 * node.wall / self.wall) if self.wall else 0.0
+            lines.append( header.format(node.block_id,
+                                        node.n_calls,
+                                        round(node.wall * 1e3, 3),
+                                        round(node.cpu * 1e3, 3),
+                                        round(node.enforcement * 1e3, 3),
+                                        round(percent, 1),
+                                        round(node.items_per_sec, 1),
+                                        round(node.in_bytes / 1e3, 1),
+                                        round(node.out_bytes / 1e3, 1)) )
+        return '\n'.join(lines)
+
+    ############################################################################
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    ############################################################################
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+################################################################################
+class TraceRecorder(object):
+    """records when every node starts and finishes, so the timeline of a run
+    can be inspected in `chrome://tracing` or https://ui.perfetto.dev. Used by
+    `Pipeline.process(trace=...)`
+
+    Every node is a pair of begin ('B') and end ('E') events in the Chrome
+    Trace Event Format, on the process and thread it ran in. Event names are
+    block ids and every begin event includes the node id from `Pipeline.graph`
+    and `Pipeline.get_vis()`, along with the number of items processed.
+
+    Attributes:
+        events(:obj:`list` of dict): the recorded trace events
+    """
+    def __init__(self, name):
+        """instantiates the TraceRecorder
+
+        Args:
+            name(str): name of the calling process in the trace, usually the
+                pipeline id
+        """
+        self.name = name
+        self.events = []
+        self._pids = set()
+        self._lock = threading.Lock()
+
+    ############################################################################
+    def add(self, node_id, block, start, end, n_items, pid=None, tid=None):
+        """records a node that was processed. This is thread-safe
+
+        Args:
+            node_id(str): id of the node in the graph
+            block(:obj:`Block`): the node's block
+            start(float): `time.perf_counter()` when the node started
+            end(float): `time.perf_counter()` when the node finished
+            n_items(int): the number of items processed
+            pid(int,None): id of the process the node ran in, defaults to the
+                current process
+            tid(int,None): id of the thread the node ran in, defaults to the
+                current thread
+        """
+        if pid is None:
+            pid = os.getpid()
+        if tid is None:
+            tid = threading.get_ident()
+
+        begin_event = {'name' : block.id,
+                        'cat' : 'block',
+                        'ph' : 'B',
+                        'ts' : start * 1e6,
+                        'pid' : pid,
+                        'tid' : tid,
+                        'args' : {'node_id' : node_id, 'n_items' : n_items}}
+        end_event = {'name' : block.id,
+                        'cat' : 'block',
+                        'ph' : 'E',
+                        'ts' : end * 1e6,
+                        'pid' : pid,
+                        'tid' : tid}
+
+        with self._lock:
+            self._pids.add(pid)
+            self.events.append(begin_event)
+            self.events.append(end_event)
+
+    ############################################################################
+    def as_dict(self):
+        """returns the trace as a Chrome Trace Event Format dictionary"""
+        with self._lock:
+            # name the processes so workers can be told apart
+            metadata = []
+            for pid in sorted(self._pids):
+                name = self.name if (pid == os.getpid()) else "worker {}".format(pid)
+                metadata.append({'name' : 'process_name',
+                                    'ph' : 'M',
+                                    'pid' : pid,
+                                    'args' : {'name' : name}})
+
+            events = sorted(self.events, key=lambda e: e['ts'])
+        return {'traceEvents' : metadata + events, 'displayTimeUnit' : 'ms'}
+
+    ############################################################################
+    def save(self, filename):
+        """writes the trace to a JSON file
+
+        Args:
+            filename(str): path of the file to write
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f)
+
+# END
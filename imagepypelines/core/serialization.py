@@ -0,0 +1,383 @@
+# @Email: jmaggio14@gmail.com
+# @Website: https://www.imagepypelines.org/
+# @License: https://github.com/jmaggio14/imagepypelines/blob/master/LICENSE
+# @github: https://github.com/jmaggio14/imagepypelines
+#
+# Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
+#
+"""framed file format used by `Pipeline.save` and `Pipeline.load`
+
+The pickled pipeline is split into frames as it's written, so it never has to
+be held in memory as a single buffer. A file is laid out as::
+
+    MAGIC | version (1 byte) | flags (1 byte) | [KDF parameters | nonce prefix]
+    frame 0 | frame 1 | ... | final frame
+
+and every frame is::
+
+    length of payload (4 bytes) | final flag (1 byte) | payload
+
+Encrypted files seal every frame with AES-GCM, using a key derived from the
+password by `passgen`. The KDF parameters are stored in the header as::
+
+    KDF id (1 byte) | iterations (4 bytes) | salt length (1 byte) | salt
+
+with a random salt for every file. Version 1 files don't store them, and were
+written with an empty salt and 100,000 iterations. The nonce is the random
+8 byte per-file prefix followed by the frame index, and the header, frame
+index and final flag are authenticated with every frame, so frames can't be
+reordered, dropped or moved between files, and truncated files are detected.
+"""
+from .Exceptions import PipelineError
+from .io_tools import passgen, KDF_ITERATIONS
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import base64
+import hashlib
+import os
+import struct
+
+MAGIC = b'\x89IPPIPE'
+"""prefix of every framed file. Legacy files are either a raw pickle, which
+starts with 0x80, or a Fernet token, which starts with 'g'"""
+
+FORMAT_VERSION = 2
+"""version of the framed file format written by `FrameWriter`"""
+
+SALT_SIZE = 16
+"""bytes of random salt for the key of every encrypted file"""
+
+KDF_PBKDF2_SHA256 = 1
+"""header id of PBKDF2-HMAC-SHA256 key derivation, the only KDF so far"""
+
+FRAME_SIZE = 1024 * 1024
+"""payload bytes in every frame but the last"""
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+"""largest payload a frame may have. Frame lengths are read before the frame
+is authenticated, so larger lengths are rejected before anything is read"""
+
+ENCRYPTED = 0x01
+"""header flag for encrypted files"""
+
+_HEADER = struct.Struct('>BB')
+_FRAME = struct.Struct('>IB')
+_KDF = struct.Struct('>BIB')
+_AAD = struct.Struct('>QB')
+_NONCE_PREFIX_SIZE = 8
+_TAG_SIZE = 16
+_LEGACY_KDF = (b'', 100000)
+
+
+################################################################################
+def is_framed(prefix):
+    """checks whether the first bytes of a file belong to a framed file
+
+    Args:
+        prefix(bytes): at least the first `len(MAGIC)` bytes of the file
+
+    Returns:
+        bool: True if the file is in the framed format, False for legacy files
+    """
+    return prefix[:len(MAGIC)] == MAGIC
+
+
+################################################################################
+def derive_key(passwd, salt, iterations):
+    """derives the raw 32 byte AES key for a password
+
+    Args:
+        passwd(str): the password
+        salt(bytes): the salt stored in the file header
+        iterations(int): the PBKDF2 iterations stored in the file header
+
+    Returns:
+        bytes: the 32 byte key
+    """
+    return base64.urlsafe_b64decode( passgen(passwd, salt, iterations) )
+
+
+################################################################################
+def file_checksum(filename, chunk_size=FRAME_SIZE):
+    """computes the sha256 checksum of a file without reading it into memory
+    all at once
+
+    Args:
+        filename(str): the file to hash
+        chunk_size(int): number of bytes to read at a time
+
+    Returns:
+        str: the sha256 hexdigest of the file
+    """
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+################################################################################
+class FrameWriter(object):
+    """file-like object that frames, optionally encrypts and hashes everything
+    written to it before passing it on to the underlying file. Meant to be
+    passed to `pickle.dump`
+
+    Attributes:
+        checksum(str): sha256 hexdigest of every byte written to the underlying
+            file. Only available after `close()`
+    """
+    def __init__(self, f, passwd=None, frame_size=FRAME_SIZE, iterations=KDF_ITERATIONS):
+        """instantiates the FrameWriter and writes the header
+
+        Args:
+            f(file): binary file object to write to
+            passwd(str,None): password to encrypt with, or None to write the
+                file unencrypted
+            frame_size(int): payload bytes in every frame but the last, at
+                most `MAX_FRAME_SIZE`
+            iterations(int): number of PBKDF2 iterations to derive the key with
+        """
+        if not (0 < frame_size <= MAX_FRAME_SIZE):
+            raise ValueError("frame_size must be between 1 and %s" % MAX_FRAME_SIZE)
+
+        self.checksum = None
+        self._file = f
+        self._frame_size = frame_size
+        self._buffer = bytearray()
+        self._index = 0
+        self._sha256 = hashlib.sha256()
+
+        flags = 0
+        params = b''
+        nonce_prefix = b''
+        self._aesgcm = None
+        if passwd:
+            flags |= ENCRYPTED
+            salt = os.urandom(SALT_SIZE)
+            params = _KDF.pack(KDF_PBKDF2_SHA256, iterations, len(salt)) + salt
+            nonce_prefix = os.urandom(_NONCE_PREFIX_SIZE)
+            self._aesgcm = AESGCM( derive_key(passwd, salt, iterations) )
+
+        self._header = (MAGIC + _HEADER.pack(FORMAT_VERSION, flags)
+                            + params + nonce_prefix)
+        self._nonce_prefix = nonce_prefix
+        self._write(self._header)
+
+    ############################################################################
+    def write(self, data):
+        """buffers data and writes every full frame
+
+        Args:
+            data(bytes-like): the data to write
+
+        Returns:
+            int: the number of bytes written
+        """
+        view = memoryview(data).cast('B')
+        n_bytes = len(view)
+
+        # top up the partially filled frame
+        if self._buffer:
+            n_fill = min(self._frame_size - len(self._buffer), len(view))
+            self._buffer += view[:n_fill]
+            view = view[n_fill:]
+            # keep the last frame in the buffer so close() can mark it final
+            if view and (len(self._buffer) == self._frame_size):
+                self._write_frame(self._buffer, final=False)
+                self._buffer = bytearray()
+
+        # full frames are written straight from the caller's data
+        while len(view) > self._frame_size:
+            self._write_frame(view[:self._frame_size], final=False)
+            view = view[self._frame_size:]
+
+        self._buffer += view
+        return n_bytes
+
+    ############################################################################
+    def close(self):
+        """writes the final frame. The underlying file isn't closed"""
+        if self.checksum is None:
+            self._write_frame(self._buffer, final=True)
+            self._buffer = bytearray()
+            self.checksum = self._sha256.hexdigest()
+
+    ############################################################################
+    def _write_frame(self, payload, final):
+        if self._aesgcm is not None:
+            aad = self._header + _AAD.pack(self._index, final)
+            nonce = self._nonce_prefix + struct.pack('>I', self._index)
+            payload = self._aesgcm.encrypt(nonce, bytes(payload), aad)
+
+        self._write( _FRAME.pack(len(payload), final) )
+        self._write(payload)
+        self._index += 1
+
+    ############################################################################
+    def _write(self, data):
+        self._sha256.update(data)
+        self._file.write(data)
+
+
+################################################################################
+class FrameReader(object):
+    """file-like object that reads, authenticates and decrypts the frames in a
+    file written by `FrameWriter`. Only one frame is held in memory at a time.
+    Meant to be passed to `pickle.load`
+    """
+    def __init__(self, f, passwd=None):
+        """instantiates the FrameReader and reads the header
+
+        Args:
+            f(file): binary file object to read from, positioned at the start
+                of the framed data
+            passwd(str,None): password to decrypt with. Required if the file
+                is encrypted
+
+        Raises:
+            PipelineError: if the header is invalid, or the file is encrypted
+                and no password is given
+        """
+        self._file = f
+        self._frame = b''
+        self._offset = 0
+        self._index = 0
+        self._done = False
+
+        magic = f.read(len(MAGIC))
+        if not is_framed(magic):
+            raise PipelineError("not a framed pipeline file")
+
+        version, flags = _HEADER.unpack( self._read_exactly(_HEADER.size) )
+        if version not in (1, FORMAT_VERSION):
+            raise PipelineError("unsupported pipeline file version %s" % version)
+
+        self.encrypted = bool(flags & ENCRYPTED)
+        self._header = magic + _HEADER.pack(version, flags)
+        self._nonce_prefix = b''
+        self._aesgcm = None
+        if self.encrypted:
+            if not passwd:
+                raise PipelineError("pipeline file is encrypted, a password is required")
+
+            salt, iterations = _LEGACY_KDF
+            if version > 1:
+                params = self._read_exactly(_KDF.size)
+                kdf, iterations, salt_size = _KDF.unpack(params)
+                if kdf != KDF_PBKDF2_SHA256:
+                    raise PipelineError("unsupported key derivation function %s" % kdf)
+                salt = self._read_exactly(salt_size)
+                self._header += params + salt
+
+            self._nonce_prefix = self._read_exactly(_NONCE_PREFIX_SIZE)
+            self._header += self._nonce_prefix
+            self._aesgcm = AESGCM( derive_key(passwd, salt, iterations) )
+
+    ############################################################################
+    def read(self, n=-1):
+        """reads up to n bytes of the decoded data, or everything that's left
+        if n is negative"""
+        if n is None or n < 0:
+            chunks = []
+            while self._fill():
+                chunks.append( self._frame[self._offset:] )
+                self._offset = len(self._frame)
+            return b''.join(chunks)
+
+        # data within the current frame is sliced out directly
+        if self._fill() and (len(self._frame) - self._offset) >= n:
+            out = self._frame[self._offset:self._offset + n]
+            self._offset += n
+            return out
+
+        out = bytearray(n)
+        n_read = self.readinto(out)
+        return bytes( memoryview(out)[:n_read] )
+
+    ############################################################################
+    def readinto(self, buf):
+        """reads decoded data into a preallocated buffer
+
+        Returns:
+            int: the number of bytes read
+        """
+        view = memoryview(buf).cast('B')
+        n_read = 0
+        while n_read < len(view) and self._fill():
+            n_copy = min(len(view) - n_read, len(self._frame) - self._offset)
+            view[n_read:n_read + n_copy] = self._frame[self._offset:self._offset + n_copy]
+            self._offset += n_copy
+            n_read += n_copy
+        return n_read
+
+    ############################################################################
+    def readline(self):
+        """reads up to and including the next newline"""
+        chunks = []
+        while self._fill():
+            end = self._frame.find(b'\n', self._offset)
+            if end >= 0:
+                chunks.append( self._frame[self._offset:end + 1] )
+                self._offset = end + 1
+                break
+            chunks.append( self._frame[self._offset:] )
+            self._offset = len(self._frame)
+        return b''.join(chunks)
+
+    ############################################################################
+    def close(self):
+        """checks that the file ends with its final frame
+
+        Raises:
+            PipelineError: if the final frame is missing or followed by
+                trailing data
+        """
+        self.read()
+        if self._file.read(1):
+            raise PipelineError("unexpected data after the final frame")
+
+    ############################################################################
+    def _fill(self):
+        """loads the next frame if the current one is exhausted
+
+        Returns:
+            bool: whether or not there's unread data in the current frame
+        """
+        while self._offset >= len(self._frame):
+            if self._done:
+                return False
+            self._frame = self._read_frame()
+            self._offset = 0
+        return True
+
+    ############################################################################
+    def _read_frame(self):
+        length, final = _FRAME.unpack( self._read_exactly(_FRAME.size) )
+        # the length isn't authenticated yet, so bound it before reading
+        if length > MAX_FRAME_SIZE + _TAG_SIZE:
+            raise PipelineError("pipeline file is corrupted, a frame is "
+                                + "larger than %s bytes" % MAX_FRAME_SIZE)
+        payload = self._read_exactly(length)
+
+        if self._aesgcm is not None:
+            aad = self._header + _AAD.pack(self._index, final)
+            nonce = self._nonce_prefix + struct.pack('>I', self._index)
+            try:
+                payload = self._aesgcm.decrypt(nonce, payload, aad)
+            except InvalidTag:
+                raise PipelineError("unable to decrypt pipeline file, the "
+                                    + "password is wrong or the file is corrupted")
+
+        self._index += 1
+        self._done = bool(final)
+        return payload
+
+    ############################################################################
+    def _read_exactly(self, n):
+        data = self._file.read(n)
+        if len(data) != n:
+            raise PipelineError("pipeline file is truncated")
+        return data
+
+# END
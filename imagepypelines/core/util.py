@@ -5,6 +5,7 @@
 #
 # Copyright (c) 2018-2020 Jeff Maggio, Ryan Hartzell, and collaborators
 from ..Logger import get_logger
+import asyncio
 import inspect
 import collections
 import time
@@ -212,6 +213,43 @@ class Summarizer(dict):
         return str(self)
 
 
+################################################################################
+#                                 ASYNCIO
+################################################################################
+
+def run_coroutine(coro):
+    """runs a coroutine to completion in a new event loop and returns its
+    result. Equivalent to `asyncio.run`, which requires python 3.7+
+
+    Args:
+        coro(coroutine): the coroutine to run
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        # asynchronous generators were added in python 3.6
+        if hasattr(loop, 'shutdown_asyncgens'):
+            loop.run_until_complete( loop.shutdown_asyncgens() )
+        loop.close()
+
+def get_running_loop():
+    """returns the event loop running in this thread, or None if there isn't
+    one. `asyncio.get_running_loop` requires python 3.7+"""
+    if hasattr(asyncio, 'get_running_loop'):
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    # threads without an event loop raise an error
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        return None
+    return loop if loop.is_running() else None
+
+
 ################################################################################
 #                                 TIMING
 ################################################################################
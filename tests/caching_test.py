@@ -0,0 +1,260 @@
+import imagepypelines as ip
+from imagepypelines.core.caching import BlockCache, hash_data
+import numpy as np
+
+
+class Expensive(ip.Block):
+    """counts how many times each datum is processed"""
+    _RUNTIME_ATTRS = ip.Block._RUNTIME_ATTRS.union(['n_calls'])
+
+    def __init__(self):
+        self.n_calls = 0
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        self.n_calls += 1
+        return a * 2
+
+
+################################################################################
+def test_hash_data():
+    x = np.arange(10)
+    assert hash_data(x) == hash_data(x.copy())
+    assert hash_data(x) != hash_data(x.astype(np.float64))
+    assert hash_data(x) != hash_data(x.reshape(2,5))
+    # non-contiguous arrays are hashed by their content
+    assert hash_data(x[::2]) == hash_data(np.array([0,2,4,6,8]))
+    assert hash_data([1,2]) != hash_data((1,2))
+    assert hash_data(1) != hash_data(1.0)
+    assert hash_data({'a' : [1]}) == hash_data({'a' : [1]})
+
+
+################################################################################
+def test_hash_data_is_independent_of_hash_seed():
+    import os
+    import subprocess
+    import sys
+    code = ("import imagepypelines as ip;"
+            + "from imagepypelines.core.caching import hash_data;"
+            + "f = lambda a: a in {'a', 'b', 'c', 'd'};"
+            + "print(hash_data({'x', 'y', 'z'}, f.__code__))")
+
+    digests = set()
+    for seed in ('1', '2', '3'):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        digests.add( out.decode().strip().split('\n')[-1] )
+    assert len(digests) == 1
+
+    assert hash_data({1,2}) == hash_data({2,1})
+    assert hash_data({1,2}) != hash_data(frozenset([1,2]))
+    assert hash_data({1,2}) != hash_data({1,3})
+
+
+################################################################################
+def test_block_cache():
+    block = Expensive().enable_cache()
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (block, 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Cached')
+
+    x = np.arange(100)
+    assert np.array_equal(pipeline.process(x)['y'], x * 2)
+    # an equal input is served from the cache
+    assert np.array_equal(pipeline.process(x.copy())['y'], x * 2)
+    assert block.n_calls == 1
+    # a different input is not
+    pipeline.process(x + 1)
+    assert block.n_calls == 2
+
+    stats = pipeline.cache_stats[block.id]
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['n_entries'] == 2
+
+    # caching is opt-in
+    block.disable_cache()
+    assert pipeline.cache_stats == {}
+    pipeline.process(x)
+    assert block.n_calls == 3
+
+
+################################################################################
+def test_func_block_fingerprint():
+    @ip.blockify(kwargs=dict(value=1))
+    def cached_add_value(a, value):
+        return a + value
+
+    cached_add_value.enable_cache()
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (cached_add_value, 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='CachedFunc')
+    assert pipeline.process([1,2])['y'] == (2,3)
+
+    # changing the preset kwargs must change the cache key
+    cached_add_value.preset_kwargs['value'] = 10
+    assert pipeline.process([1,2])['y'] == (11,12)
+    assert cached_add_value.cache.stats['hits'] == 0
+
+
+################################################################################
+class Scale(ip.Block):
+    """multiplies by a factor"""
+    def __init__(self, factor):
+        self.factor = factor
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        return a * self.factor
+
+
+def test_block_parameters_fingerprint(tmp_path):
+    x = np.arange(3)
+    for factor in (2, 100):
+        tasks = {'x' : ip.Input(0), 'y' : (Scale(factor), 'x')}
+        pipeline = ip.Pipeline(tasks, name='Scaled')
+        pipeline.enable_checkpoints(str(tmp_path))
+        assert np.array_equal(pipeline.process(x)['y'], x * factor)
+
+    assert len(pipeline.checkpoints) == 2
+
+    # the in-memory cache is keyed by the parameters too
+    block = Scale(2).enable_cache()
+    pipeline = ip.Pipeline({'x' : ip.Input(0), 'y' : (block, 'x')}, name='Scaled')
+    pipeline.process(x)
+    block.factor = 3
+    assert np.array_equal(pipeline.process(x)['y'], x * 3)
+    assert block.cache.stats['hits'] == 0
+
+
+################################################################################
+class Counter(Scale):
+    """keeps a counter that isn't declared in _RUNTIME_ATTRS"""
+    def process(self, a):
+        self.n_calls = getattr(self, 'n_calls', 0) + 1
+        return a * self.factor
+
+
+def test_fingerprint_is_cached():
+    x = np.arange(3)
+    block = Counter(2).enable_cache()
+    pipeline = ip.Pipeline({'x' : ip.Input(0), 'y' : (block, 'x')}, name='Counter')
+    pipeline.process(x)
+    fingerprint = block._fingerprint
+    assert isinstance(fingerprint, bytes)
+
+    # attributes assigned while processing don't change the fingerprint
+    pipeline.process(x)
+    assert block._fingerprint is fingerprint
+    assert block.cache.stats['hits'] == 1
+
+    # parameters assigned outside of processing do
+    block.factor = 3
+    assert block._fingerprint is None
+    assert np.array_equal(pipeline.process(x)['y'], x * 3)
+    assert block._fingerprint != fingerprint
+
+
+################################################################################
+def test_cache_eviction():
+    cache = BlockCache(max_bytes=4000)
+    cheap = (np.zeros(100),)
+    cache.put('cheap', cheap, cost=0.001)
+    cache.put('expensive', (np.zeros(100),), cost=1.0)
+    # there isn't room for all three, the cheapest entry is evicted first
+    cache.put('new', (np.zeros(100),), cost=0.5)
+
+    assert cache.get('cheap') is None
+    assert cache.get('expensive') is not None
+    assert cache.get('new') is not None
+    assert cache.evictions == 1
+    assert cache.n_bytes <= cache.max_bytes
+
+    # outputs larger than the cache are never stored
+    cache.put('huge', (np.zeros(1000),), cost=10.0)
+    assert cache.get('huge') is None
+    assert len(cache) == 2
+
+
+################################################################################
+class Labels(ip.Block):
+    """returns a non-array output"""
+    _RUNTIME_ATTRS = ip.Block._RUNTIME_ATTRS.union(['n_calls'])
+
+    def __init__(self):
+        self.n_calls = 0
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        self.n_calls += 1
+        return ["label%s" % i for i in a]
+
+
+def make_checkpointed(directory, **kwargs):
+    expensive = Expensive()
+    labels = Labels()
+    tasks = {
+            'x' : ip.Input(0),
+            'doubled' : (expensive, 'x'),
+            'labels' : (labels, 'doubled'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Checkpointed')
+    pipeline.enable_checkpoints(directory, **kwargs)
+    return pipeline, expensive, labels
+
+
+def test_checkpoints(tmp_path):
+    x = np.arange(5)
+    pipeline, expensive, labels = make_checkpointed(str(tmp_path), vars=['doubled'])
+    processed = pipeline.process(x)
+    assert expensive.n_calls == 1
+    assert len(pipeline.checkpoints) == 1
+
+    # a new pipeline with the same blocks loads the checkpoint
+    pipeline, expensive, labels = make_checkpointed(str(tmp_path), vars=['doubled'])
+    processed = pipeline.process(x)
+    assert expensive.n_calls == 0
+    assert labels.n_calls == 1
+    # arrays are memory mapped
+    assert isinstance(processed['doubled'], np.memmap)
+    assert np.array_equal(processed['doubled'], x * 2)
+    assert processed['labels'] == ['label0','label2','label4','label6','label8']
+
+    # different input data has a different fingerprint
+    pipeline.process(x + 1)
+    assert expensive.n_calls == 1
+    assert len(pipeline.checkpoints) == 2
+
+
+def test_checkpoints_prune_upstream(tmp_path):
+    x = np.arange(5)
+    pipeline, expensive, labels = make_checkpointed(str(tmp_path))
+    pipeline.process(x)
+    # non-array variables are pickled
+    assert len(pipeline.checkpoints) == 2
+
+    pipeline, expensive, labels = make_checkpointed(str(tmp_path))
+    processed = pipeline.process(x, fetch=['labels'])
+    # nothing upstream of a checkpoint runs
+    assert expensive.n_calls == 0
+    assert labels.n_calls == 0
+    assert processed['labels'][-1] == 'label8'
+
+
+def test_checkpoint_gc(tmp_path):
+    pipeline, expensive, labels = make_checkpointed(str(tmp_path),
+                                                    vars=['doubled'],
+                                                    max_bytes=2000)
+    # every checkpoint is 928 bytes, so only 2 fit
+    for i in range(4):
+        pipeline.process(np.arange(100) + i, fetch=['doubled'])
+
+    assert len(pipeline.checkpoints) == 2
+    assert pipeline.checkpoints.n_bytes <= 2000
+
+    pipeline.checkpoints.clear()
+    assert len(pipeline.checkpoints) == 0
@@ -0,0 +1,167 @@
+import imagepypelines as ip
+import numpy as np
+
+
+class Identity(ip.Block):
+    """returns its input"""
+    def __init__(self, batch_type="each"):
+        super().__init__(batch_type=batch_type)
+
+    def process(self, a):
+        return a
+
+
+def run(block, data):
+    pipeline = ip.Pipeline({'x' : ip.Input(0), 'y' : (block, 'x')},
+                            name='Enforcement')
+    return pipeline.process(data, fetch=['y'])['y']
+
+
+def raises_block_error(block, data):
+    try:
+        run(block, data)
+    except ip.BlockError:
+        return True
+    return False
+
+
+################################################################################
+def test_type_enforcement():
+    block = Identity().enforce('a', types=(int,))
+    assert run(block, [1,2,3]) == (1,2,3)
+    # subclasses are accepted
+    assert run(block, [True, 2]) == (True, 2)
+    assert raises_block_error(block, [1, 2.0])
+
+
+################################################################################
+def test_shape_enforcement():
+    block = Identity(batch_type="all").enforce('a', shapes=((None,3), (2,2)))
+    # datums pass if they match any of the acceptable shapes
+    assert len(run(block, [np.ones((5,3)), np.ones((2,2))])) == 2
+    assert raises_block_error(block, [np.ones((5,3)), np.ones((3,2))])
+    assert raises_block_error(block, [np.ones(3)])
+
+    # array subclasses use the ndarray shape function
+    mapped = np.ones((2,4,3)).view(np.memmap)
+    assert len(run(block, mapped)) == 2
+    assert raises_block_error(block, np.ones((2,4,4)).view(np.memmap))
+
+    # scalars don't have a shape to check
+    assert run(block, [1, 2]) == [1, 2]
+
+
+################################################################################
+def test_container_enforcement():
+    block = Identity(batch_type="all").enforce('a', containers=(np.ndarray,))
+    assert np.array_equal(run(block, np.arange(3)), np.arange(3))
+    assert raises_block_error(block, [1,2,3])
+
+    # containers are irrelevant for "each" blocks
+    block = Identity().enforce('a', containers=(np.ndarray,))
+    assert run(block, [1,2,3]) == (1,2,3)
+
+
+################################################################################
+def test_validators_are_recompiled():
+    block = Identity().enforce('a', types=(int,))
+    assert raises_block_error(block, ['a'])
+
+    block.enforce('a', types=(int,str))
+    assert run(block, ['a']) == ('a',)
+
+    # copies compile their own validators
+    copied = block.deepcopy()
+    assert copied._validators is None
+    assert run(copied, ['a']) == ('a',)
+
+
+################################################################################
+def test_enforcement_sampling():
+    n_checked = []
+    def counted_shape(datum):
+        n_checked.append(1)
+        return (len(datum),)
+
+    block = Identity().enforce('a', shapes=((2,),))
+    block.shape_fns[list] = counted_shape
+    block._compile_validators()
+
+    pipeline = ip.Pipeline({'x' : ip.Input(0), 'y' : (block, 'x')},
+                            name='Sampling')
+    data = [[1,2]] * 1000
+    # every item is checked by default
+    pipeline.process(data)
+    assert len(n_checked) == 1000
+
+    # only the first 5 and 5 random items are checked
+    del n_checked[:]
+    pipeline.enforcement_sample = 5
+    pipeline.process(data)
+    assert len(n_checked) == 10
+    assert block._sampling_logged
+
+    # the first items are always checked
+    try:
+        pipeline.process([[1,2,3]] + data)
+        assert False, "the first item must always be checked"
+    except ip.BlockError:
+        pass
+
+    # blocks can override the pipeline
+    del n_checked[:]
+    block.enforcement_sample = 0
+    pipeline.process(data)
+    assert len(n_checked) == 1000
+
+
+################################################################################
+def test_compatibility_analysis():
+    a = Identity().enforce('a', types=(int,float), shapes=((None,3), (2,None)))
+    b = Identity().enforce('a', types=(int,), shapes=((2,3), (4,3), (None,None,3)))
+    c = Identity().enforce('a', containers=(list,))
+    tasks = {
+            'x' : ip.Input(0),
+            'ya' : (a, 'x'),
+            'yb' : (b, 'x'),
+            'yc' : (c, 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Compatibility')
+
+    assert pipeline.get_types_for('x') == (int,)
+    assert pipeline.get_shapes_for('x') == ((2,3), (4,3))
+    assert pipeline.get_containers_for('x') == (list,)
+    assert pipeline.shapes == {'x' : ((2,3), (4,3))}
+    # nothing consumes the outputs
+    assert pipeline.get_shapes_for('ya') is None
+
+    # results are cached
+    assert pipeline.get_shapes_for('x') is pipeline.get_shapes_for('x')
+
+    # and invalidated by enforcement changes
+    b.enforce('a', types=(float,), shapes=((5,4),))
+    assert pipeline.get_types_for('x') == (float,)
+    assert pipeline.get_shapes_for('x') == tuple()
+
+    b.skip_enforcement = True
+    assert pipeline.get_shapes_for('x') == ((2,None), (None,3))
+
+    # and by graph changes
+    pipeline.update({'yd' : (Identity().enforce('a', shapes=((2,2),)), 'x')})
+    assert pipeline.get_shapes_for('x') == ((2,2),)
+
+
+################################################################################
+def test_compatibility_analysis_is_linear():
+    import time
+    # every consumer accepts several shapes, which used to grow the
+    # candidate shapes combinatorially
+    tasks = {'x' : ip.Input(0)}
+    for i in range(40):
+        block = Identity().enforce('a', shapes=((None,3), (2,None), (None,None)))
+        tasks['y%s' % i] = (block, 'x')
+
+    start = time.perf_counter()
+    pipeline = ip.Pipeline(tasks, name='ManyConsumers')
+    assert pipeline.get_shapes_for('x') == ((None,None),)
+    assert (time.perf_counter() - start) < 5
@@ -0,0 +1,823 @@
+import imagepypelines as ip
+from imagepypelines.core.util import run_coroutine
+
+
+class Add(ip.Block):
+    """adds two batches together"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+
+    def process(self, a, b):
+        return a + b
+
+
+class Double(ip.Block):
+    """doubles a batch"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+
+    def process(self, a):
+        return a * 2
+
+
+def make_tasks():
+    return {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            'x2' : (Double(), 'x'),
+            'sum' : (Add(), 'x2', 'y'),
+            }
+
+
+################################################################################
+def test_execution_plan_is_cached():
+    pipeline = ip.Pipeline(make_tasks(), name='PlanCache')
+
+    plan = pipeline.execution_plan
+    # the plan must be reused between process calls
+    pipeline.process([1,2], [3,4])
+    pipeline.process([1,2], [3,4])
+    assert pipeline.execution_plan is plan
+    assert pipeline.execution_order == plan.edges
+
+    # every edge in the graph is in the plan
+    assert len(plan.edges) == pipeline.graph.number_of_edges()
+    assert len(plan) == pipeline.graph.number_of_nodes()
+
+
+################################################################################
+def test_execution_plan_invalidation():
+    pipeline = ip.Pipeline(make_tasks(), name='PlanInvalidation')
+    plan = pipeline.execution_plan
+
+    # adding tasks must recompile the plan
+    pipeline.update({'sum2' : (Double(), 'sum')})
+    assert pipeline.execution_plan is not plan
+    assert pipeline.process([1,2], [3,4])['sum2'] == (10, 16)
+
+    # so must reassigning input indices
+    plan = pipeline.execution_plan
+    pipeline.assign_input_index('y', None)
+    assert pipeline.execution_plan is not plan
+    assert pipeline.args == ['x', 'y']
+    assert pipeline.process([1,2], y=[3,4])['sum2'] == (10, 16)
+
+
+################################################################################
+def test_execution_plan_is_immutable():
+    pipeline = ip.Pipeline(make_tasks(), name='PlanImmutable')
+    plan = pipeline.execution_plan
+
+    try:
+        plan.order = ()
+        assert False, "ExecutionPlan attributes must be read-only"
+    except AttributeError:
+        pass
+
+    try:
+        plan.steps['foo'] = None
+        assert False, "ExecutionPlan steps must be read-only"
+    except TypeError:
+        pass
+
+
+################################################################################
+class Counted(ip.Block):
+    """adds two batches together and counts how many times it's run"""
+    def __init__(self):
+        self.n_calls = 0
+        super().__init__(batch_type="all")
+
+    def process(self, a, b):
+        self.n_calls += 1
+        return [i + j for i,j in zip(a,b)]
+
+
+class Constants(ip.Block):
+    """a root block with multiple outputs"""
+    def __init__(self):
+        self.n_calls = 0
+        super().__init__(batch_type="all")
+
+    def process(self):
+        self.n_calls += 1
+        return [1,1], [2,2]
+
+
+def test_every_block_runs_once():
+    constants = Constants()
+    blocks = [Counted() for _ in range(4)]
+    tasks = {
+            'x' : ip.Input(0),
+            ('one','two') : (constants,),
+            'a' : (blocks[0], 'x', 'one'),
+            'b' : (blocks[1], 'x', 'two'),
+            # fan-in from both branches and the multi-output root
+            'c' : (blocks[2], 'a', 'b'),
+            'd' : (blocks[3], 'c', 'one'),
+            }
+    pipeline = ip.Pipeline(tasks, name='RunOnce')
+    processed = pipeline.process([10,20])
+
+    assert constants.n_calls == 1
+    assert all(b.n_calls == 1 for b in blocks)
+    assert processed['one'] == [1,1]
+    assert processed['two'] == [2,2]
+    assert processed['d'] == [24,44]
+
+
+def test_output_count_mismatch():
+    tasks = {
+            'x' : ip.Input(0),
+            ('one','two','three') : (Constants(),),
+            'a' : (Counted(), 'one', 'three'),
+            }
+    pipeline = ip.Pipeline(tasks, name='OutputMismatch')
+    try:
+        pipeline.process([0])
+        assert False, "a block returning too few outputs must raise an error"
+    except ip.PipelineError:
+        pass
+
+
+################################################################################
+class Rendezvous(ip.Block):
+    """waits until every other Rendezvous block is running at the same time"""
+    def __init__(self, barrier):
+        self.barrier = barrier
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        self.barrier.wait()
+        return a
+
+
+def docstring_tasks():
+    add = Counted()
+    return {
+            'zero' : ip.Input(0),
+            'one' : ip.Input(1),
+            'two' : (add, 'one', 'one'),
+            'three' : (add, 'one', 'two'),
+            'five' : (add, 'two', 'three'),
+            'eight' : (add, 'three', 'five'),
+            'neg' : (add, 'zero', 'zero'),
+            }
+
+
+def test_thread_executor_matches_serial():
+    pipeline = ip.Pipeline(docstring_tasks(), name='ThreadsMatch')
+    serial = pipeline.process([0,0], [1,2])
+    threaded = pipeline.process([0,0], [1,2], executor='threads', max_workers=4)
+    assert serial == threaded
+    assert threaded['eight'] == [8,16]
+
+
+def test_thread_executor_runs_branches_concurrently():
+    import threading
+    barrier = threading.Barrier(3, timeout=10)
+    tasks = {
+            'x' : ip.Input(0),
+            'a' : (Rendezvous(barrier), 'x'),
+            'b' : (Rendezvous(barrier), 'x'),
+            'c' : (Rendezvous(barrier), 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='ThreadsConcurrent')
+    # this would raise a BrokenBarrierError if the branches ran serially
+    processed = pipeline.process([1], executor='threads', max_workers=3)
+    assert processed['a'] == processed['b'] == processed['c'] == [1]
+
+
+def test_invalid_executor():
+    pipeline = ip.Pipeline(make_tasks(), name='BadExecutor')
+    try:
+        pipeline.process([1], [2], executor='gpu')
+        assert False, "unknown executors must raise an error"
+    except ip.PipelineError:
+        pass
+
+
+################################################################################
+class Pid(ip.Block):
+    """returns the id of the process it was run in"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        import os
+        return [os.getpid()] * len(a)
+
+
+def test_process_executor_matches_serial():
+    pipeline = ip.Pipeline(docstring_tasks(), name='ProcessesMatch')
+    try:
+        serial = pipeline.process([0,0], [1,2])
+        processed = pipeline.process([0,0], [1,2], executor='processes', max_workers=2)
+        assert serial == processed
+
+        stats = pipeline.pool_stats
+        # 5 Counted tasks were sent to the workers
+        assert stats['n_tasks'] == 5
+        assert stats['compute'] > 0
+        assert stats['serialize'] > 0
+        assert stats['deserialize'] > 0
+    finally:
+        pipeline.shutdown()
+
+    assert pipeline.pool_stats is None
+
+
+def test_process_executor_workers_persist():
+    import os
+    tasks = {
+            'x' : ip.Input(0),
+            'pid' : (Pid(), 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='ProcessesPersist')
+    try:
+        first = pipeline.process([0], executor='processes', max_workers=1)['pid']
+        second = pipeline.process([0], executor='processes', max_workers=1)['pid']
+        # the block ran in the same, separate worker process both times
+        assert first == second
+        assert first[0] != os.getpid()
+
+        # changing the graph must restart the workers
+        pipeline.update({'pid2' : (Pid(), 'pid')})
+        assert pipeline.pool_stats is None
+        third = pipeline.process([0], executor='processes', max_workers=1)['pid2']
+        assert third != first
+    finally:
+        pipeline.shutdown()
+
+
+def test_process_executor_without_initializers(monkeypatch):
+    from imagepypelines.core import executors
+    # python < 3.7 can't initialize workers when the pool starts
+    monkeypatch.setattr(executors, '_POOL_INITIALIZERS', False)
+    pipeline = ip.Pipeline(docstring_tasks(), name='ProcessesForked')
+    try:
+        serial = pipeline.process([0,0], [1,2])
+        assert pipeline.process([0,0], [1,2], executor='processes', max_workers=2) == serial
+        assert len(executors._FORKED_PIPELINES) == 1
+    finally:
+        pipeline.shutdown()
+    assert len(executors._FORKED_PIPELINES) == 0
+
+
+################################################################################
+def test_fetch_prunes_the_graph():
+    blocks = [Counted() for _ in range(4)]
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            'a' : (blocks[0], 'x', 'y'),
+            'b' : (blocks[1], 'a', 'y'),
+            # expensive tail we don't want to pay for
+            'c' : (blocks[2], 'b', 'b'),
+            # unrelated branch
+            'd' : (blocks[3], 'y', 'y'),
+            }
+    pipeline = ip.Pipeline(tasks, name='FetchPruning')
+
+    processed = pipeline.process([1], [2], fetch=['b'])
+    assert processed == {'b' : [5]}
+    assert [b.n_calls for b in blocks] == [1, 1, 0, 0]
+
+    # the pruned plan is cached for this fetch set, regardless of order
+    plan = pipeline._get_plan(['b', 'a'])
+    assert pipeline._get_plan(('a', 'b')) is plan
+    assert len(plan) == 4 # x, y, a, b
+
+    # fetching everything runs everything
+    processed = pipeline.process([1], [2])
+    assert processed['c'] == [10]
+    assert [b.n_calls for b in blocks] == [2, 2, 1, 1]
+
+
+def test_fetch_unknown_variable():
+    pipeline = ip.Pipeline(make_tasks(), name='FetchUnknown')
+    try:
+        pipeline.process([1], [2], fetch=['nope'])
+        assert False, "fetching an unknown variable must raise an error"
+    except ip.PipelineError:
+        pass
+
+
+################################################################################
+class AddOne(ip.Block):
+    """returns a new array one greater than the input"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        return a + 1
+
+
+def test_intermediates_are_released():
+    import tracemalloc
+    import numpy as np
+
+    n_blocks = 12
+    tasks = {'v0' : ip.Input(0)}
+    for i in range(1, n_blocks + 1):
+        tasks['v%s' % i] = (AddOne(), 'v%s' % (i-1))
+    pipeline = ip.Pipeline(tasks, name='EagerRelease')
+
+    data = np.zeros((1000,1000)) # 8MB
+    nbytes = data.nbytes
+
+    tracemalloc.start()
+    try:
+        processed = pipeline.process(data, fetch=['v%s' % n_blocks])
+        _,peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert processed['v%s' % n_blocks][0,0] == n_blocks
+    # only the fetch and a couple of live intermediates should ever exist
+    # at once. Without releasing, this would be n_blocks arrays
+    assert peak < 4 * nbytes
+
+    # fetched intermediates are kept
+    processed = pipeline.process(data, fetch=['v3', 'v%s' % n_blocks])
+    assert processed['v3'][0,0] == 3
+
+
+################################################################################
+def test_process_stream():
+    pulled = []
+    def numbers(n):
+        for i in range(n):
+            pulled.append(i)
+            yield i
+
+    pipeline = ip.Pipeline(make_tasks(), name='Stream')
+    stream = pipeline.process_stream(numbers(10), y=iter([1] * 10),
+                                        chunk_size=4,
+                                        fetch=['sum'])
+
+    # chunks are pulled lazily, one at a time
+    first = next(stream)
+    assert first == {'sum' : (1, 3, 5, 7)}
+    assert len(pulled) == 4
+
+    rest = list(stream)
+    assert rest == [{'sum' : (9, 11, 13, 15)}, {'sum' : (17, 19)}]
+    assert len(pulled) == 10
+
+
+def test_process_stream_uneven_inputs():
+    pipeline = ip.Pipeline(make_tasks(), name='StreamUneven')
+    stream = pipeline.process_stream(range(5), range(3), chunk_size=2)
+    try:
+        list(stream)
+        assert False, "inputs of different lengths must raise an error"
+    except ip.PipelineError:
+        pass
+
+
+def test_process_stream_validates_eagerly():
+    pipeline = ip.Pipeline(make_tasks(), name='StreamArgs')
+    invalid = [
+            ((range(5), range(5)), dict(chunk_size=0)),
+            ((range(5), range(5)), dict(fetch=['unknown'])),
+            # the second input is missing
+            ((range(5),), {}),
+            ]
+    # errors are raised without pulling from the stream
+    for args,kwargs in invalid:
+        try:
+            pipeline.process_stream(*args, **kwargs)
+            assert False, "invalid arguments must raise immediately"
+        except ip.PipelineError:
+            pass
+
+
+################################################################################
+class AsyncRendezvous(ip.Block):
+    """coroutine block which waits until `n` of them are running at once"""
+    def __init__(self, started, n):
+        self.started = started
+        self.n = n
+        super().__init__(batch_type="all")
+
+    async def process(self, a):
+        import asyncio
+        self.started.append(a)
+        while len(self.started) < self.n:
+            await asyncio.sleep(0.001)
+        return a
+
+
+def test_aprocess_overlaps_coroutine_blocks():
+    import asyncio
+    started = []
+    tasks = {
+            'x' : ip.Input(0),
+            'a' : (AsyncRendezvous(started, 2), 'x'),
+            'b' : (AsyncRendezvous(started, 2), 'x'),
+            # regular blocks are offloaded to an executor
+            'c' : (Counted(), 'a', 'b'),
+            }
+    pipeline = ip.Pipeline(tasks, name='AsyncOverlap')
+    assert tasks['a'][0].is_coroutine and not tasks['c'][0].is_coroutine
+
+    # this would time out if the coroutine blocks ran one after another
+    coro = pipeline.aprocess([1,2], fetch=['c'])
+    processed = run_coroutine( asyncio.wait_for(coro, timeout=10) )
+    assert processed == {'c' : [2,4]}
+
+
+def test_blockified_coroutines():
+    import asyncio
+    started = []
+
+    # blockified functions can't use closures, so state is passed as a preset
+    @ip.blockify(batch_type="each", kwargs=dict(started=started))
+    async def async_rendezvous_each(a, started):
+        import asyncio
+        # every datum is processed concurrently
+        started.append(a)
+        while len(started) < 3:
+            await asyncio.sleep(0.001)
+        return a * 10
+
+    assert async_rendezvous_each.is_coroutine
+
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (async_rendezvous_each, 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='AsyncEach')
+    coro = pipeline.aprocess([1,2,3], fetch=['y'])
+    processed = run_coroutine( asyncio.wait_for(coro, timeout=10) )
+    assert processed == {'y' : (10,20,30)}
+
+    # coroutine blocks also work in the synchronous engine
+    del started[:]
+    assert pipeline.process([1,2,3], fetch=['y']) == {'y' : (10,20,30)}
+
+
+class AsyncDouble(ip.Block):
+    """doubles a batch after yielding to the event loop"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    async def process(self, a):
+        import asyncio
+        await asyncio.sleep(0.01)
+        return [i * 2 for i in a]
+
+
+def test_concurrent_aprocess_calls():
+    import asyncio
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (AsyncDouble(), 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='ConcurrentAsync')
+
+    async def main():
+        return await asyncio.gather(pipeline.aprocess([1,2]),
+                                    pipeline.aprocess([3,4]))
+
+    # concurrent calls are serialized, so they don't share inputs
+    first, second = run_coroutine(main())
+    assert first == {'x' : [1,2], 'y' : [2,4]}
+    assert second == {'x' : [3,4], 'y' : [6,8]}
+    # and a new event loop gets its own lock
+    assert run_coroutine(main())[1]['y'] == [6,8]
+
+
+def test_process_inside_event_loop():
+    import asyncio
+    import warnings
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : (AsyncRendezvous([], 1), 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='InsideLoop')
+
+    async def main():
+        try:
+            pipeline.process([1,2])
+            assert False, "process must not run coroutine blocks in a running loop"
+        except ip.PipelineError as e:
+            assert 'aprocess' in str(e)
+        return await pipeline.aprocess([1,2])
+
+    # no coroutine is left un-awaited
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        assert run_coroutine(main())['y'] == [1,2]
+
+
+################################################################################
+class MiniBatched(ip.Block):
+    """records the batches it receives and returns two outputs"""
+    def __init__(self, batch_size):
+        self.seen = []
+        super().__init__(batch_type=batch_size)
+
+    def process(self, a, b):
+        self.seen.append( (a, b) )
+        return a + b, list(range(len(a)))
+
+
+def test_integer_batch_type():
+    import numpy as np
+    block = MiniBatched(4)
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            ('sum','idx') : (block, 'x', 'y'),
+            }
+    pipeline = ip.Pipeline(tasks, name='MiniBatch')
+
+    x = np.arange(10)
+    y = np.arange(10) * 10
+    processed = pipeline.process(x, y)
+
+    # consecutive batches of 4, the last batch has the remainder
+    assert [len(a) for a,_ in block.seen] == [4,4,2]
+    # batches are slices of the original array, not copies
+    assert all(isinstance(a, np.ndarray) and a.base is x for a,_ in block.seen)
+
+    # outputs are concatenated back together per output index
+    assert isinstance(processed['sum'], np.ndarray)
+    assert np.array_equal(processed['sum'], x + y)
+    assert processed['idx'] == [0,1,2,3, 0,1,2,3, 0,1]
+
+    # lists are batched into lists
+    block.seen = []
+    processed = pipeline.process([1,2,3], [4,5,6])
+    assert block.seen[0] == ([1,2,3], [4,5,6])
+    assert processed['idx'] == [0,1,2]
+
+
+################################################################################
+class BatchSum(ip.Block):
+    """reduces every batch to its sum and its length"""
+    def __init__(self, batch_size):
+        super().__init__(batch_type=batch_size)
+
+    def process(self, a):
+        return a.sum(), len(a)
+
+
+def test_reducing_integer_batch_type():
+    import numpy as np
+    tasks = {
+            'x' : ip.Input(0),
+            ('sums','lengths') : (BatchSum(4), 'x'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Reducing')
+
+    # every batch contributes one item
+    processed = pipeline.process(np.arange(10))
+    assert isinstance(processed['sums'], np.ndarray)
+    assert np.array_equal(processed['sums'], [6, 22, 17])
+    assert processed['lengths'] == [4,4,2]
+
+    # including when there's only a single batch
+    processed = pipeline.process(np.arange(3))
+    assert np.array_equal(processed['sums'], [3])
+    assert processed['lengths'] == [3]
+
+
+################################################################################
+class Normalize(ip.Block):
+    """normalizes every datum to unit sum, fails on ragged datums"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+
+    def process(self, a):
+        return a / a.sum(), a.sum(), str(a.shape)
+
+
+def test_each_outputs_are_stacked():
+    import numpy as np
+    tasks = {
+            'x' : ip.Input(0),
+            ('norm','total','desc') : (Normalize(), 'x'),
+            'total2' : (Double(), 'total'),
+            }
+    pipeline = ip.Pipeline(tasks, name='StackEach')
+
+    x = np.arange(1, 13, dtype=np.float32).reshape(4,3)
+    processed = pipeline.process(x)
+
+    # array and numpy scalar outputs are stacked into contiguous arrays
+    assert isinstance(processed['norm'], np.ndarray)
+    assert processed['norm'].shape == (4,3)
+    assert processed['norm'].dtype == np.float32
+    assert np.allclose(processed['norm'], x / x.sum(axis=1, keepdims=True))
+    assert isinstance(processed['total2'], np.ndarray)
+    assert np.array_equal(processed['total2'], x.sum(axis=1) * 2)
+
+    # other outputs are still tuples
+    assert processed['desc'] == ('(3,)',) * 4
+
+    # datums whose outputs don't match the first fall back to a tuple
+    ragged = np.empty(2, dtype=object)
+    ragged[0] = np.ones(2)
+    ragged[1] = np.ones(3)
+    processed = pipeline.process(ragged, fetch=['norm'])
+    assert isinstance(processed['norm'], tuple)
+    assert [n.shape for n in processed['norm']] == [(2,), (3,)]
+
+
+################################################################################
+class CountedDouble(ip.Block):
+    """doubles a batch and counts how many times it's run"""
+    def __init__(self):
+        self.n_calls = 0
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        self.n_calls += 1
+        return [i * 2 for i in a]
+
+
+def test_reprocess_only_runs_dependents():
+    x2 = CountedDouble()
+    y2 = CountedDouble()
+    total = Counted()
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            'x2' : (x2, 'x'),
+            'y2' : (y2, 'y'),
+            'sum' : (total, 'x2', 'y2'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Reprocess')
+
+    # every input is required the first time
+    try:
+        pipeline.reprocess(x=[1,2])
+        assert False, "reprocess must require every input the first time"
+    except ip.PipelineError:
+        pass
+
+    assert pipeline.reprocess(x=[1,2], y=[10,20])['sum'] == [22,44]
+    assert (x2.n_calls, y2.n_calls, total.n_calls) == (1,1,1)
+
+    # only the tasks downstream of 'y' run again
+    assert pipeline.reprocess(y=[30,40], fetch=['sum']) == {'sum' : [62,84]}
+    assert (x2.n_calls, y2.n_calls, total.n_calls) == (1,2,2)
+
+    # nothing changed, so nothing runs
+    processed = pipeline.reprocess()
+    assert processed['x2'] == [2,4]
+    assert processed['y'] == [30,40]
+    assert (x2.n_calls, y2.n_calls, total.n_calls) == (1,2,2)
+
+    # the retained data is discarded when the graph changes
+    pipeline.update({'sum2' : (Double(), 'sum')})
+    try:
+        pipeline.reprocess(y=[1,1])
+        assert False, "the graph changed, so every input is required again"
+    except ip.PipelineError:
+        pass
+
+
+@ip.blockify()
+def add_and_subtract(a, b):
+    return a + b, a - b
+
+
+def test_reprocess_recomputes_unconsumed_outputs():
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            ('plus','minus') : (add_and_subtract, 'x', 'y'),
+            'plus2' : (Double(), 'plus'),
+            }
+    pipeline = ip.Pipeline(tasks, name='ReprocessUnconsumed')
+
+    # 'minus' isn't consumed by any task, so it has no leaf
+    pipeline.reprocess(x=[5,5], y=[1,1])
+    processed = pipeline.reprocess(y=[3,3])
+    assert processed == pipeline.process([5,5], [3,3])
+    assert processed['minus'] == (2,2)
+
+
+################################################################################
+def test_incremental_update():
+    pipeline = ip.Pipeline({'x1' : ip.Input(0)}, name='Incremental')
+    for i in range(2, 6):
+        pipeline.update({'x%s' % i : (Double(), 'x%s' % (i-1))})
+    assert pipeline.process([1], fetch=['x5'])['x5'] == (16,)
+
+    # plans which don't run the new tasks are kept
+    plan = pipeline._get_plan(['x2'])
+    pipeline.update({'other' : (Double(), 'x1')})
+    assert pipeline._get_plan(['x2']) is plan
+    assert pipeline.process([1])['other'] == (2,)
+
+
+################################################################################
+def test_replace_task():
+    pipeline = ip.Pipeline(make_tasks(), name='Replace')
+    assert pipeline.process([1,2], [3,4])['sum'] == (5,8)
+    plan = pipeline._get_plan(['sum'])
+
+    pipeline.replace_task('x2', (Add(), 'x', 'y'))
+    assert pipeline.process([1,2], [3,4])['sum'] == (7,10)
+    # plans that ran the old task are discarded
+    assert pipeline._get_plan(['sum']) is not plan
+
+    # 'sum' depends on 'x2'
+    try:
+        pipeline.replace_task('x2', (Double(), 'sum'))
+        assert False, "replace_task must not create cycles"
+    except ip.PipelineError:
+        pass
+
+    try:
+        pipeline.replace_task(('x2','extra'), (Double(), 'x'))
+        assert False, "the outputs must match an existing task"
+    except ip.PipelineError:
+        pass
+
+
+################################################################################
+def test_remove_task():
+    pipeline = ip.Pipeline(make_tasks(), name='Remove')
+    try:
+        pipeline.remove_task('x2')
+        assert False, "'sum' depends on 'x2'"
+    except ip.PipelineError:
+        pass
+
+    pipeline.remove_task('sum')
+    assert 'sum' not in pipeline.vars
+    # x2 has a leaf again so it's still computed
+    assert pipeline.process([1,2], [3,4])['x2'] == (2,4)
+
+    # removing an input shifts the other indices down
+    pipeline.remove_task('x2')
+    pipeline.remove_task('x')
+    assert pipeline.args == ['y']
+    assert pipeline.process([3,4]) == {'y' : [3,4]}
+
+
+################################################################################
+@ip.blockify()
+def split_in_two(a):
+    return a, a
+
+
+def test_predecessors_and_successors():
+    tasks = {
+            'x' : ip.Input(0),
+            'y' : ip.Input(1),
+            ('a','b') : (split_in_two, 'x'),
+            'a2' : (Double(), 'a'),
+            'sum' : (Add(), 'a2', 'y'),
+            'b2' : (Double(), 'b'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Reachability')
+
+    assert pipeline.get_predecessors('sum') == {'x', 'a', 'a2', 'y'}
+    assert pipeline.get_predecessors('b') == {'x'}
+    assert pipeline.get_predecessors('x') == set()
+    # the other outputs of the same task are successors too
+    assert pipeline.get_successors('a') == {'b', 'a2', 'sum', 'b2'}
+    assert pipeline.get_successors('y') == {'sum'}
+    assert pipeline.get_successors('sum') == set()
+
+    # the index is rebuilt when the graph changes
+    index = pipeline.reachability
+    pipeline.update({'sum2' : (Add(), 'sum', 'b2')})
+    assert pipeline.reachability is not index
+    assert pipeline.get_successors('y') == {'sum', 'sum2'}
+
+
+def test_successors_skip_unconsumed_outputs():
+    tasks = {
+            'x' : ip.Input(0),
+            ('a','b') : (split_in_two, 'x'),
+            'a2' : (Double(), 'a'),
+            }
+    pipeline = ip.Pipeline(tasks, name='Unconsumed')
+
+    # 'b' isn't consumed, so it has no edge and no leaf
+    assert pipeline.get_successors('x') == {'a', 'a2'}
+    assert pipeline.get_successors('a') == {'a2'}
+    assert pipeline.get_predecessors('b') == {'x'}
+
+
+def test_reachability_deep_graph():
+    import sys
+    n = sys.getrecursionlimit() + 100
+    tasks = {'x0' : ip.Input(0)}
+    for i in range(1, n):
+        tasks['x%s' % i] = (Double(), 'x%s' % (i-1))
+    pipeline = ip.Pipeline(tasks, name='Deep')
+
+    last = 'x%s' % (n-1)
+    assert len(pipeline.get_predecessors(last)) == n - 1
+    assert len(pipeline.get_successors('x0')) == n - 1
+    assert pipeline.reachability.is_ancestor(pipeline.vars['x0']['block_node_id'],
+                                                pipeline.vars[last]['block_node_id'])
@@ -0,0 +1,125 @@
+import imagepypelines as ip
+import logging
+
+
+class Chatty(ip.Block):
+    """logs a warning every time it processes"""
+    def __init__(self):
+        super().__init__(batch_type="all")
+
+    def process(self, a):
+        self.logger.warning("processing")
+        return a
+
+
+class Collector(logging.Handler):
+    """stores every record it receives"""
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_chatty():
+    block = Chatty()
+    pipeline = ip.Pipeline({'x' : ip.Input(0), 'y' : (block, 'x')},
+                            name='Chatty')
+    return pipeline, block
+
+
+################################################################################
+def test_handlers_dont_accumulate():
+    pipeline, block = make_chatty()
+    pipeline.process([1])
+    logger = block.logger
+    n_handlers = len(logger.handlers) + len(pipeline.logger.handlers)
+
+    for _ in range(5):
+        pipeline.process([1])
+
+    # the block keeps the same logger and no handlers are added
+    assert block.logger is logger
+    assert len(logger.handlers) + len(pipeline.logger.handlers) == n_handlers
+    # records are written once by the pipeline logger's handler
+    assert len(logger.handlers) == 0
+    assert len(pipeline.logger.handlers) == 1
+
+
+################################################################################
+def test_log_queue():
+    pipeline, block = make_chatty()
+    collector = Collector()
+    listener = ip.enable_log_queue()
+    try:
+        listener.handlers = listener.handlers + (collector,)
+        for _ in range(3):
+            pipeline.process([1])
+        # enabling twice reuses the listener
+        assert ip.enable_log_queue() is listener
+    finally:
+        ip.disable_log_queue()
+
+    warnings = [r for r in collector.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 3
+    # the original handlers are restored
+    assert isinstance(pipeline.logger.handlers[0], logging.StreamHandler)
+
+
+################################################################################
+def build_and_process(i):
+    pipeline, block = make_chatty()
+    pipeline.rename('Chatty%s' % i)
+    pipeline.process([1])
+
+
+def test_loggers_are_released():
+    import gc
+    manager = logging.Logger.manager
+    build_and_process(0)
+    gc.collect()
+    n_loggers = len(manager.loggerDict)
+
+    for i in range(200):
+        build_and_process(i)
+    gc.collect()
+    # loggers for blocks, leaves and pipelines are released with them
+    assert len(manager.loggerDict) == n_loggers
+
+
+def test_released_loggers_are_usable():
+    import gc
+    import pickle
+    pipeline, block = make_chatty()
+    pipeline.process([1])
+    logger = block.logger
+    del pipeline, block
+    gc.collect()
+
+    assert logger.name not in logging.Logger.manager.loggerDict
+    # unpickling a released logger recreates and configures it
+    restored = pickle.loads( pickle.dumps(logger) )
+    assert restored is not logger
+    assert restored.name == logger.name
+    assert restored._configured
+
+
+def test_copies_share_loggers_safely():
+    import copy
+    import gc
+    manager = logging.Logger.manager
+    block = Chatty()
+    # copies are restored with the original's logger
+    copied = copy.deepcopy(block)
+    assert copied.logger.name == block.logger.name
+    name = block.logger.name
+
+    # the survivor keeps the logger registered
+    del copied
+    gc.collect()
+    assert manager.loggerDict.get(name) is block.logger
+
+    del block
+    gc.collect()
+    assert name not in manager.loggerDict
@@ -0,0 +1,148 @@
+import imagepypelines as ip
+import numpy as np
+
+
+class Slow(ip.Block):
+    """sleeps for every item"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+
+    def process(self, a):
+        import time
+        time.sleep(0.005)
+        return a
+
+
+class Fast(ip.Block):
+    """returns its input"""
+    def __init__(self):
+        super().__init__(batch_type="each")
+
+    def process(self, a):
+        return a
+
+
+def make_pipeline():
+    slow = Slow().enforce('a', types=(np.ndarray,))
+    fast = Fast()
+    tasks = {
+            'x' : ip.Input(0),
+            'slowed' : (slow, 'x'),
+            'y' : (fast, 'slowed'),
+            }
+    return ip.Pipeline(tasks, name='Profiled'), slow, fast
+
+
+def node_of(pipeline, var):
+    return pipeline.vars[var]['block_node_id']
+
+
+################################################################################
+def test_profile_report():
+    pipeline, slow, fast = make_pipeline()
+    data = [np.ones(10) for _ in range(4)]
+    pipeline.process(data)
+    assert pipeline.profile_report is None
+
+    pipeline.process(data, profile=True)
+    report = pipeline.profile_report
+    assert report.n_runs == 1
+    # only blocks are profiled, not inputs and leaves
+    assert set(report.nodes) == {node_of(pipeline,'slowed'), node_of(pipeline,'y')}
+
+    slowed = report.nodes[ node_of(pipeline,'slowed') ]
+    assert slowed.block_id == slow.id
+    assert slowed.n_calls == 1
+    assert slowed.n_items == 4
+    assert slowed.wall >= 0.02
+    assert slowed.enforcement > 0
+    assert slowed.in_bytes > 4 * 80
+    assert slowed.out_bytes > 4 * 80
+    assert slowed.items_per_sec > 0
+    assert slowed.wall > report.nodes[ node_of(pipeline,'y') ].wall
+
+    # the slowest block is listed first
+    text = str(report)
+    assert text.index(slow.id) < text.index(fast.id)
+    assert report.as_dict()[ node_of(pipeline,'slowed') ]['n_calls'] == 1
+
+    pipeline.clear_profile()
+    assert pipeline.profile_report is None
+
+
+################################################################################
+def test_profile_sampling():
+    pipeline, slow, fast = make_pipeline()
+    for _ in range(10):
+        pipeline.process([np.ones(2)], profile=4)
+
+    # calls 1, 5 and 9 are profiled
+    report = pipeline.profile_report
+    assert report.n_runs == 3
+    assert report.nodes[ node_of(pipeline,'slowed') ].n_calls == 3
+
+
+################################################################################
+def test_profile_executors():
+    pipeline, slow, fast = make_pipeline()
+    try:
+        for executor in ('threads', 'processes'):
+            pipeline.clear_profile()
+            pipeline.process([np.ones(2)], executor=executor, profile=True)
+            slowed = pipeline.profile_report.nodes[ node_of(pipeline,'slowed') ]
+            assert slowed.n_calls == 1
+            assert slowed.wall >= 0.005
+    finally:
+        pipeline.shutdown()
+
+
+################################################################################
+def read_trace(filename):
+    import json
+    with open(filename) as f:
+        trace = json.load(f)
+    begins = [e for e in trace['traceEvents'] if e['ph'] == 'B']
+    ends = [e for e in trace['traceEvents'] if e['ph'] == 'E']
+    return trace, begins, ends
+
+
+def test_trace(tmp_path):
+    import os
+    pipeline, slow, fast = make_pipeline()
+    filename = str(tmp_path / 'trace.json')
+    pipeline.process([np.ones(2)] * 3, trace=filename)
+
+    trace, begins, ends = read_trace(filename)
+    assert len(begins) == len(ends) == 2
+    # events use the same node ids as the graph and get_vis
+    vis = pipeline.get_vis()
+    for event in begins:
+        assert event['args']['node_id'] in vis['BLOCKS']
+        assert event['args']['node_id'] in pipeline.graph.nodes
+        assert event['args']['n_items'] == 3
+        assert event['pid'] == os.getpid()
+
+    slowed = [e for e in begins if e['name'] == slow.id][0]
+    slowed_end = [e for e in ends if e['name'] == slow.id][0]
+    assert slowed_end['ts'] - slowed['ts'] >= 15000
+
+    # get_vis doesn't remove the data from the pipeline's edges
+    for _,_,edge in pipeline.graph.edges(data=True):
+        assert 'data' in edge
+    pipeline.process([np.ones(2)])
+
+
+def test_trace_workers(tmp_path):
+    import os
+    pipeline, slow, fast = make_pipeline()
+    filename = str(tmp_path / 'trace.json')
+    try:
+        pipeline.process([np.ones(2)], executor='processes', trace=filename)
+    finally:
+        pipeline.shutdown()
+
+    trace, begins, ends = read_trace(filename)
+    assert len(begins) == 2
+    assert all(e['pid'] != os.getpid() for e in begins)
+    names = [e['args']['name'] for e in trace['traceEvents'] if e['ph'] == 'M']
+    assert all(name.startswith('worker') for name in names)
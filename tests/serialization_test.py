@@ -0,0 +1,198 @@
+import imagepypelines as ip
+from imagepypelines.core.serialization import FrameReader, FrameWriter, MAGIC
+from imagepypelines.core.serialization import MAX_FRAME_SIZE
+import io
+import os
+import pickle
+import numpy as np
+
+
+class Offset(ip.Block):
+    """adds a stored array to its input"""
+    def __init__(self, size=16):
+        super().__init__(batch_type="each")
+        self.offset = np.arange(size)
+
+    def process(self, a):
+        return a + self.offset
+
+
+def make_pipeline(size=16):
+    return ip.Pipeline({'x' : ip.Input(0), 'y' : (Offset(size), 'x')},
+                        name='Serialized')
+
+
+def raises_pipeline_error(fn, *args):
+    try:
+        fn(*args)
+    except ip.PipelineError:
+        return True
+    return False
+
+
+def roundtrip(obj, passwd=None, frame_size=64):
+    buffer = io.BytesIO()
+    writer = FrameWriter(buffer, passwd, frame_size=frame_size, iterations=1000)
+    pickle.dump(obj, writer, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.close()
+
+    buffer.seek(0)
+    reader = FrameReader(buffer, passwd)
+    loaded = pickle.load(reader)
+    reader.close()
+    return loaded, buffer.getvalue()
+
+
+################################################################################
+def test_frames():
+    obj = {'array' : np.random.rand(50,7), 'text' : 'a\nb\n' * 100}
+    for passwd in (None, 'password'):
+        loaded, raw = roundtrip(obj, passwd)
+        assert np.array_equal(loaded['array'], obj['array'])
+        assert loaded['text'] == obj['text']
+
+    # every frame is authenticated
+    loaded, raw = roundtrip(obj, 'password')
+    def read(raw_bytes, passwd):
+        reader = FrameReader(io.BytesIO(raw_bytes), passwd)
+        pickle.load(reader)
+        reader.close()
+
+    tampered = bytearray(raw)
+    tampered[len(raw) // 2] ^= 1
+    assert raises_pipeline_error(read, bytes(tampered), 'password')
+    assert raises_pipeline_error(read, raw[:-100], 'password')
+    assert raises_pipeline_error(read, raw + b'extra', 'password')
+    assert raises_pipeline_error(read, raw, 'wrong')
+    assert raises_pipeline_error(read, raw, None)
+
+    # the KDF parameters are authenticated too
+    tampered = bytearray(raw)
+    tampered[len(MAGIC) + 3] ^= 1
+    assert raises_pipeline_error(read, bytes(tampered), 'password')
+
+
+class SizeChecked(io.BytesIO):
+    """fails if more than the maximum frame is requested at once"""
+    def read(self, n=-1):
+        assert 0 <= n <= MAX_FRAME_SIZE + 16, "read %s bytes" % n
+        return super().read(n)
+
+
+def test_frame_length_is_bounded():
+    import struct
+    raw = MAGIC + struct.pack('>BB', 2, 0) + struct.pack('>IB', 2**32 - 1, 1)
+    assert raises_pipeline_error(lambda: FrameReader(SizeChecked(raw)).read())
+
+    try:
+        FrameWriter(io.BytesIO(), frame_size=MAX_FRAME_SIZE + 1)
+        assert False, "frames larger than MAX_FRAME_SIZE can't be read"
+    except ValueError:
+        pass
+
+
+################################################################################
+def test_save_and_load(tmp_path):
+    pipeline = make_pipeline(size=300000)
+    filename = str(tmp_path / 'pipeline.pck')
+    for passwd in (None, 'password'):
+        checksum = pipeline.save(filename, passwd)
+        loaded = ip.Pipeline.load(filename, passwd, checksum, name='Loaded')
+        assert loaded.name == 'Loaded'
+        assert np.array_equal(loaded.process([1], fetch=['y'])['y'][0],
+                                np.arange(300000) + 1)
+        assert not os.path.exists(filename + '.partial')
+
+        # to_bytes writes the same format
+        raw, raw_checksum = pipeline.to_bytes(passwd)
+        loaded = ip.Pipeline.from_bytes(raw, passwd, raw_checksum)
+        assert len(loaded.blocks) == len(pipeline.blocks)
+
+    assert raises_pipeline_error(ip.Pipeline.load, filename, 'wrong')
+    assert raises_pipeline_error(ip.Pipeline.load, filename, 'password', 'bad')
+    assert raises_pipeline_error(ip.Pipeline.from_bytes, raw, 'password', 'bad')
+
+
+################################################################################
+def test_legacy_files(tmp_path):
+    from cryptography.fernet import Fernet
+    pipeline = make_pipeline()
+    legacy = pickle.dumps(pipeline.copy())
+    encrypted = Fernet( ip.passgen('password') ).encrypt(legacy)
+
+    assert len(ip.Pipeline.from_bytes(legacy).blocks) == len(pipeline.blocks)
+    loaded = ip.Pipeline.from_bytes(encrypted, 'password')
+    assert len(loaded.blocks) == len(pipeline.blocks)
+
+    filename = str(tmp_path / 'legacy.pck')
+    with open(filename, 'wb') as f:
+        f.write(encrypted)
+    loaded = ip.Pipeline.load(filename, 'password')
+    assert len(loaded.blocks) == len(pipeline.blocks)
+
+
+################################################################################
+def test_version_1_files():
+    # version 1 files were encrypted with a key from an empty salt
+    import base64
+    import struct
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    pipeline = make_pipeline()
+    payload = pickle.dumps(pipeline.copy())
+
+    nonce_prefix = os.urandom(8)
+    header = MAGIC + struct.pack('>BB', 1, 1) + nonce_prefix
+    key = base64.urlsafe_b64decode( ip.passgen('password') )
+    sealed = AESGCM(key).encrypt(nonce_prefix + struct.pack('>I', 0),
+                                    payload,
+                                    header + struct.pack('>QB', 0, 1))
+    raw = header + struct.pack('>IB', len(sealed), 1) + sealed
+
+    loaded = ip.Pipeline.from_bytes(raw, 'password')
+    assert len(loaded.blocks) == len(pipeline.blocks)
+
+
+################################################################################
+def test_passgen_cache():
+    import time
+    from imagepypelines.core import io_tools
+    ip.clear_passgen_cache()
+    start = time.perf_counter()
+    key = ip.passgen('password', 'salt')
+    derived = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert ip.passgen('password', 'salt') == key
+    assert (time.perf_counter() - start) < derived
+
+    # the salt, iterations and password are all part of the cache key
+    assert ip.passgen('password', b'salt') == key
+    assert ip.passgen('password', 'other') != key
+    assert ip.passgen('password', 'salt', iterations=1000) != key
+    assert ip.passgen('other', 'salt') != key
+    # passwords aren't stored in plain text
+    assert not any(b'password' in d for _,_,d in io_tools._PASSGEN_CACHE)
+
+    # the cache is bounded
+    for i in range(io_tools.PASSGEN_CACHE_SIZE + 5):
+        ip.passgen(str(i), iterations=1000)
+    assert len(io_tools._PASSGEN_CACHE) == io_tools.PASSGEN_CACHE_SIZE
+
+    ip.clear_passgen_cache()
+    assert len(io_tools._PASSGEN_CACHE) == 0
+
+
+################################################################################
+def test_files_use_random_salts():
+    pipeline = make_pipeline()
+    raw1, _ = pipeline.to_bytes('password')
+    raw2, _ = pipeline.to_bytes('password')
+    assert raw1[:len(MAGIC) + 6] == raw2[:len(MAGIC) + 6]
+    assert raw1[len(MAGIC) + 6:len(MAGIC) + 22] != raw2[len(MAGIC) + 6:len(MAGIC) + 22]
+
+    # repeated loads of the same file only derive the key once
+    ip.clear_passgen_cache()
+    ip.Pipeline.from_bytes(raw1, 'password')
+    ip.Pipeline.from_bytes(raw1, 'password')
+    from imagepypelines.core import io_tools
+    assert len(io_tools._PASSGEN_CACHE) == 1